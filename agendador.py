@@ -0,0 +1,95 @@
+"""
+Agendador de etapas do pipeline em um pool de threads.
+
+Cada etapa declara de quais outras depende e começa assim que todas elas
+terminam, de modo que ramos independentes (PIB e população) rodam em paralelo e
+a latência total passa a ser a do ramo mais longo.
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+
+AGENDADOR_THREADS = int(os.getenv('AGENDADOR_THREADS', '4'))
+
+
+class AgendadorEtapas:
+    """
+    Executa um grafo de etapas com dependências em um pool de threads.
+
+    Parâmetros:
+        max_threads (int): Quantidade máxima de etapas executadas ao mesmo tempo.
+        instrumentacao (Instrumentacao, opcional): Se informada, cada etapa é medida com `instrumentacao.medir`.
+
+    Funcionalidade:
+        - `adicionar` registra uma etapa, as etapas cujos resultados ela recebe (`entradas`)
+          e as etapas que apenas precisam terminar antes dela (`apos`).
+        - `executar` submete cada etapa assim que suas dependências terminam e devolve os resultados.
+
+    Exceções:
+        - Se uma etapa falhar, nenhuma etapa nova é iniciada; as que estão em andamento terminam
+          e a primeira exceção é propagada.
+    """
+
+    def __init__(self, max_threads=AGENDADOR_THREADS, instrumentacao=None):
+        self.max_threads = max_threads
+        self.instrumentacao = instrumentacao
+        self._etapas = {}
+
+    def adicionar(self, nome, funcao, entradas=(), apos=()):
+        """
+        Registra uma etapa.
+
+        Parâmetros:
+            nome (str): Nome único da etapa; também é a chave do seu resultado.
+            funcao (callable): Chamada como `funcao(*resultados_das_entradas)`.
+            entradas (tuple): Etapas cujos resultados são passados, na ordem, para `funcao`.
+            apos (tuple): Etapas que devem terminar antes, sem que seus resultados sejam passados.
+        """
+        if nome in self._etapas:
+            raise ValueError(f'Etapa duplicada: {nome}')
+        self._etapas[nome] = (funcao, tuple(entradas), tuple(entradas) + tuple(apos))
+
+    def executar(self):
+        """
+        Executa todas as etapas respeitando as dependências.
+
+        Retorno:
+            dict: Resultado de cada etapa, indexado pelo nome.
+        """
+        for nome, (_, _, dependencias) in self._etapas.items():
+            desconhecidas = [dependencia for dependencia in dependencias if dependencia not in self._etapas]
+            if desconhecidas:
+                raise ValueError(f"Etapa '{nome}' depende de etapas inexistentes: {', '.join(desconhecidas)}")
+
+        resultados = {}
+        pendentes = dict(self._etapas)
+        em_execucao = {}
+        erro = None
+        with ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix='etapa') as executor:
+            while True:
+                if erro is None:
+                    prontas = [nome for nome, (_, _, dependencias) in pendentes.items()
+                               if all(dependencia in resultados for dependencia in dependencias)]
+                    for nome in prontas:
+                        funcao, entradas, _ = pendentes.pop(nome)
+                        argumentos = [resultados[entrada] for entrada in entradas]
+                        if self.instrumentacao is not None:
+                            funcao = partial(self.instrumentacao.medir, nome, funcao)
+                        em_execucao[executor.submit(funcao, *argumentos)] = nome
+
+                if not em_execucao:
+                    break
+
+                concluidas, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+                for futuro in concluidas:
+                    nome = em_execucao.pop(futuro)
+                    try:
+                        resultados[nome] = futuro.result()
+                    except Exception as e:
+                        erro = erro or e
+
+        if erro is not None:
+            raise erro
+        if pendentes:
+            raise ValueError(f"Dependência circular entre as etapas: {', '.join(pendentes)}")
+        return resultados
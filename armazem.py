@@ -0,0 +1,102 @@
+"""
+Armazém local colunar com os resultados intermediários do pipeline.
+
+Cada etapa é salva como um conjunto de arquivos Parquet particionado por ano
+(`<etapa>/ANO=<ano>/dados.parquet`). As etapas seguintes leem apenas as
+partições de que precisam, com mapeamento de memória, o que permite executar a
+carga ou os gráficos sem repetir a extração e lidar com séries longas sem ler
+tudo para a memória.
+"""
+import os
+import shutil
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+ARMAZEM_DIR = os.getenv('ARMAZEM_DIR', 'data/armazem')
+ARQUIVO_PARTICAO = 'dados.parquet'
+
+
+class EtapaAusente(FileNotFoundError):
+    """A etapa pedida nunca foi salva no armazém; `etapa` é o seu nome."""
+
+    def __init__(self, etapa, raiz):
+        self.etapa = etapa
+        super().__init__(f"Etapa '{etapa}' não encontrada no armazém ({raiz})")
+
+
+def salvar_etapa(nome, df, diretorio=ARMAZEM_DIR, substituir=True):
+    """
+    Salva o resultado de uma etapa no armazém, uma partição por ano.
+
+    Parâmetros:
+        nome (str): Nome da etapa (por exemplo 'pib', 'populacao' ou 'pib_per_capta').
+        df (pd.DataFrame): Resultado da etapa, com a coluna 'ANO'.
+        diretorio (str): Diretório raiz do armazém (padrão `data/armazem`).
+        substituir (bool): Se True, remove as partições de anos que não estão em `df`;
+                           se False, apenas sobrescreve as partições dos anos presentes.
+
+    Funcionalidade:
+        - Grava cada partição em um arquivo temporário e o renomeia com `os.replace`, de modo que uma
+          leitura concorrente nunca vê uma partição pela metade.
+
+    Retorno:
+        list: Anos gravados.
+    """
+    raiz = os.path.join(diretorio, nome)
+    os.makedirs(raiz, exist_ok=True)
+    anos = []
+    for ano, parte in df.groupby('ANO', sort=True, observed=True):
+        pasta = os.path.join(raiz, f'ANO={int(ano)}')
+        os.makedirs(pasta, exist_ok=True)
+        destino = os.path.join(pasta, ARQUIVO_PARTICAO)
+        # Arquivos iniciados por '.' são ignorados pelo pyarrow.dataset durante a leitura
+        temporario = os.path.join(pasta, f'.{ARQUIVO_PARTICAO}.tmp')
+        tabela = pa.Table.from_pandas(parte.drop(columns=['ANO']), preserve_index=False)
+        pq.write_table(tabela, temporario)
+        os.replace(temporario, destino)
+        anos.append(int(ano))
+
+    if substituir:
+        gravadas = {f'ANO={ano}' for ano in anos}
+        for pasta in os.listdir(raiz):
+            if pasta.startswith('ANO=') and pasta not in gravadas:
+                shutil.rmtree(os.path.join(raiz, pasta))
+    return anos
+
+
+def ler_etapa(nome, anos=None, colunas=None, diretorio=ARMAZEM_DIR):
+    """
+    Lê o resultado de uma etapa do armazém, apenas com as partições e colunas pedidas.
+
+    Parâmetros:
+        nome (str): Nome da etapa.
+        anos (list, opcional): Anos lidos. Se omitido, lê todas as partições.
+        colunas (list, opcional): Colunas lidas. Se omitido, lê todas (incluindo 'ANO').
+        diretorio (str): Diretório raiz do armazém.
+
+    Funcionalidade:
+        - Usa `pyarrow.dataset` com particionamento hive: partições fora de `anos` não são abertas.
+        - Os arquivos são mapeados em memória e a conversão para pandas evita cópias sempre que possível.
+
+    Retorno:
+        pd.DataFrame: Dados da etapa, com a coluna 'ANO'.
+
+    Exceções:
+        - `EtapaAusente` (subclasse de `FileNotFoundError`) se a etapa nunca foi salva.
+    """
+    tabela = ler_tabela_arrow(nome, anos, colunas, diretorio)
+    return tabela.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def ler_tabela_arrow(nome, anos=None, colunas=None, diretorio=ARMAZEM_DIR):
+    """Como `ler_etapa`, mas retorna a `pyarrow.Table` sem converter para pandas."""
+    raiz = os.path.join(diretorio, nome)
+    if not os.path.isdir(raiz):
+        raise EtapaAusente(nome, raiz)
+    dataset = ds.dataset(os.path.abspath(raiz), format='parquet', partitioning='hive',
+                         filesystem=fs.LocalFileSystem(use_mmap=True))
+    filtro = ds.field('ANO').isin([int(ano) for ano in anos]) if anos is not None else None
+    return dataset.to_table(columns=colunas, filter=filtro)
@@ -0,0 +1,487 @@
+"""
+Sessão de banco de dados compartilhada pelas etapas de carga.
+
+Mantém um pool de conexões criado uma única vez por `main()`, garante o esquema
+uma vez por processo e executa todas as cargas em uma única transação ou, se
+configurado, em savepoints independentes.
+
+O `GravadorBanco` executa essa transação em uma thread própria, alimentada por uma
+fila limitada: o pipeline enfileira as cargas e segue com as previsões e os
+gráficos, e só espera o banco em uma barreira final (ou quando precisa ler dele).
+"""
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool, sql
+
+db_user = os.getenv('DB_USER', 'user')
+db_password = os.getenv('DB_PASSWORD', 'password')
+db_name = os.getenv('DB_NAME', 'meu_banco')
+db_port = os.getenv('DB_PORT', '5432')
+db_host = os.getenv('DB_HOST', 'localhost')
+db_pool_max = int(os.getenv('DB_POOL_MAX', '4'))
+# 'unica': todas as cargas na mesma transação; 'savepoint': um savepoint por etapa
+db_modo_transacao = os.getenv('DB_MODO_TRANSACAO', 'unica')
+# Etapas aguardando o gravador em segundo plano; com a fila cheia, quem enfileira espera
+db_fila_gravacao = int(os.getenv('DB_FILA_GRAVACAO', '8'))
+
+# 'pandas': PIB per capita calculado em pandas e gravado em tabela_pib_per_capta;
+# 'banco': lido da visão materializada de indicadores derivados, atualizada após as cargas
+pib_per_capta_modo = os.getenv('PIB_PER_CAPTA_MODO', 'pandas')
+
+MODOS_TRANSACAO = ('unica', 'savepoint')
+MODOS_PIB_PER_CAPTA = ('pandas', 'banco')
+# Canal do LISTEN/NOTIFY avisado a cada commit que alterou dados (ver `servico_consulta.py`)
+CANAL_ATUALIZACAO = 'etl_dados_atualizados'
+
+# Níveis territoriais de `fato_indicador`; `localidade` é a sigla da UF, o código IBGE do município
+# ou a sigla da grande região / do Brasil ('BR') nos agregados do módulo `regioes`
+NIVEL_ESTADO = 'estado'
+NIVEL_MUNICIPIO = 'municipio'
+NIVEL_REGIAO = 'regiao'
+NIVEL_PAIS = 'pais'
+# Indicadores com partição própria em `fato_indicador`; os demais vão para a partição padrão
+INDICADORES_PARTICIONADOS = ('pib', 'populacao', 'pib_per_capta')
+# Tabelas anteriores a `fato_indicador`, mantidas como visões de compatibilidade no nível estadual
+VISOES_COMPATIBILIDADE = {
+    'tabela_pib': 'pib',
+    'tabela_pop': 'populacao',
+    'tabela_pib_per_capta': 'pib_per_capta',
+}
+_TABELAS_ANTIGAS = ', '.join(f"('{tabela}', '{indicador}')" for tabela, indicador in VISOES_COMPATIBILIDADE.items())
+
+ESQUEMA = [
+    # Tabela de fatos genérica, particionada por indicador. A chave primária (B-tree) atende às séries
+    # de uma localidade; o índice (nivel_territorial, ano) e o BRIN em ano atendem aos intervalos de anos.
+    """
+    CREATE TABLE IF NOT EXISTS fato_indicador (
+        indicador VARCHAR(32) NOT NULL,
+        nivel_territorial VARCHAR(16) NOT NULL,
+        localidade VARCHAR(16) NOT NULL,
+        ano INT NOT NULL,
+        valor NUMERIC,
+        PRIMARY KEY (indicador, nivel_territorial, localidade, ano)
+    ) PARTITION BY LIST (indicador);
+    """,
+    *(f"""
+    CREATE TABLE IF NOT EXISTS fato_indicador_{indicador}
+        PARTITION OF fato_indicador FOR VALUES IN ('{indicador}');
+    """ for indicador in INDICADORES_PARTICIONADOS),
+    """
+    CREATE TABLE IF NOT EXISTS fato_indicador_outros PARTITION OF fato_indicador DEFAULT;
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS fato_indicador_nivel_ano ON fato_indicador (nivel_territorial, ano);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS fato_indicador_ano_brin ON fato_indicador USING BRIN (ano);
+    """,
+    # Bancos criados antes de `fato_indicador`: copia as tabelas antigas para a tabela de fatos e as
+    # remove (junto com a visão materializada que depende delas) para dar lugar às visões abaixo
+    f"""
+    DO $$
+    DECLARE
+        antiga RECORD;
+    BEGIN
+        FOR antiga IN SELECT * FROM (VALUES {_TABELAS_ANTIGAS}) AS t(tabela, indicador) LOOP
+            IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass(antiga.tabela) AND relkind = 'r') THEN
+                DROP MATERIALIZED VIEW IF EXISTS mv_indicadores_derivados;
+                EXECUTE format(
+                    'INSERT INTO fato_indicador (indicador, nivel_territorial, localidade, ano, valor) '
+                    'SELECT %L, %L, sigla, ano, valor FROM %I ON CONFLICT DO NOTHING',
+                    antiga.indicador, '{NIVEL_ESTADO}', antiga.tabela);
+                EXECUTE format('DROP TABLE %I', antiga.tabela);
+            END IF;
+        END LOOP;
+    END $$;
+    """,
+    *(f"""
+    CREATE OR REPLACE VIEW {tabela} AS
+    SELECT localidade AS sigla, ano, valor
+    FROM fato_indicador
+    WHERE indicador = '{indicador}' AND nivel_territorial = '{NIVEL_ESTADO}';
+    """ for tabela, indicador in VISOES_COMPATIBILIDADE.items()),
+    # Agregados regionais e nacional (módulo `regioes`), com os três indicadores lado a lado
+    f"""
+    CREATE OR REPLACE VIEW tabela_agregados AS
+    SELECT
+        nivel_territorial,
+        localidade AS sigla,
+        ano,
+        max(valor) FILTER (WHERE indicador = 'pib') AS pib,
+        max(valor) FILTER (WHERE indicador = 'populacao') AS populacao,
+        max(valor) FILTER (WHERE indicador = 'pib_per_capta') AS pib_per_capta
+    FROM fato_indicador
+    WHERE nivel_territorial IN ('{NIVEL_REGIAO}', '{NIVEL_PAIS}')
+    GROUP BY nivel_territorial, localidade, ano;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tabela_previsao_pib_per_capta (
+        sigla VARCHAR(2),
+        ano INT,
+        modelo VARCHAR(16),
+        valor NUMERIC,
+        PRIMARY KEY (sigla, ano, modelo)
+    );
+    """,
+    # Razões derivadas de PIB e população; a participação é em relação à soma dos estados no ano e o
+    # crescimento, em relação ao ano anterior disponível. O índice único permite o REFRESH CONCURRENTLY.
+    """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS mv_indicadores_derivados AS
+    SELECT
+        p.sigla,
+        p.ano,
+        p.valor AS pib,
+        pop.valor AS populacao,
+        p.valor / NULLIF(pop.valor, 0) AS pib_per_capta,
+        p.valor / NULLIF(SUM(p.valor) OVER (PARTITION BY p.ano), 0) AS participacao_pib,
+        pop.valor / NULLIF(SUM(pop.valor) OVER (PARTITION BY p.ano), 0) AS participacao_populacao,
+        p.valor / NULLIF(LAG(p.valor) OVER (PARTITION BY p.sigla ORDER BY p.ano), 0) - 1 AS crescimento_pib
+    FROM tabela_pib p
+    JOIN tabela_pop pop ON pop.sigla = p.sigla AND pop.ano = p.ano;
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS mv_indicadores_derivados_sigla_ano
+        ON mv_indicadores_derivados (sigla, ano);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS etl_marca_dagua (
+        fonte VARCHAR(32),
+        sigla VARCHAR(2),
+        ano INT,
+        hash_valor BIGINT,
+        carregado_em TIMESTAMPTZ DEFAULT now(),
+        PRIMARY KEY (fonte, sigla, ano)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS etl_fonte (
+        fonte VARCHAR(32) PRIMARY KEY,
+        versao VARCHAR(64),
+        atualizado_em TIMESTAMPTZ DEFAULT now()
+    );
+    """,
+]
+
+_esquema_garantido = False
+_trava_esquema = threading.Lock()
+
+
+def parametros_conexao():
+    """Parâmetros de conexão com o PostgreSQL, a partir das variáveis de ambiente."""
+    return dict(dbname=db_name, user=db_user, password=db_password, host=db_host, port=db_port)
+
+
+def conectar():
+    """Abre uma conexão avulsa, fora do pool (por exemplo, para um `LISTEN` de longa duração)."""
+    return psycopg2.connect(**parametros_conexao())
+
+
+def atualizar_indicadores_derivados(cursor):
+    """
+    Atualiza a visão materializada `mv_indicadores_derivados` a partir de `tabela_pib` e `tabela_pop`.
+
+    Funcionalidade:
+        - Usa `REFRESH MATERIALIZED VIEW CONCURRENTLY`: o PostgreSQL recalcula a consulta e aplica apenas
+          as linhas que mudaram, sem bloquear as leituras da visão (por exemplo, do serviço de consulta).
+        - Dentro da transação de carga, a visão enxerga os dados recém-carregados e só é publicada no commit.
+    """
+    cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY mv_indicadores_derivados")
+
+
+class ErroCarga(Exception):
+    """Uma ou mais etapas de carga falharam; `falhas` mapeia o nome da etapa para a exceção."""
+
+    def __init__(self, falhas):
+        self.falhas = falhas
+        detalhes = '; '.join(f'{etapa}: {erro}' for etapa, erro in falhas.items())
+        super().__init__(f'Falha na carga das etapas: {detalhes}')
+
+
+def garantir_esquema(conn):
+    """
+    Cria as tabelas do projeto caso não existam, apenas uma vez por processo.
+
+    Parâmetros:
+        conn (psycopg2.extensions.connection): Conexão usada para executar o DDL.
+
+    Funcionalidade:
+        - Executa os comandos de `ESQUEMA` em uma transação própria e faz o commit.
+        - Chamadas seguintes no mesmo processo não acessam o banco.
+    """
+    global _esquema_garantido
+    with _trava_esquema:
+        if _esquema_garantido:
+            return
+        with conn.cursor() as cursor:
+            for comando in ESQUEMA:
+                cursor.execute(comando)
+        conn.commit()
+        _esquema_garantido = True
+
+
+class Transacao:
+    """
+    Transação em andamento, com o cursor compartilhado pelas etapas de carga.
+
+    Funcionalidade:
+        - No modo 'unica', uma falha em qualquer etapa desfaz a transação inteira.
+        - No modo 'savepoint', cada etapa roda em um savepoint próprio: uma falha desfaz apenas
+          aquela etapa, as etapas que dependem dela são puladas e as demais são confirmadas.
+          Ao final, `ErroCarga` é levantada com as etapas que falharam.
+        - `etapas_concluidas` lista as etapas executadas com sucesso; se houver alguma, o commit
+          avisa o canal `CANAL_ATUALIZACAO`.
+    """
+
+    def __init__(self, cursor, modo):
+        self.cursor = cursor
+        self.modo = modo
+        self.falhas = {}
+        self.etapas_concluidas = []
+
+    def executar_etapa(self, nome, funcao, *args, depende_de=()):
+        """
+        Executa uma etapa de carga chamando `funcao(*args, cursor)`.
+
+        Parâmetros:
+            nome (str): Nome da etapa, usado no savepoint e no relatório de falhas.
+            funcao (callable): Função de carga que recebe o cursor como último argumento.
+            depende_de (tuple): Etapas cuja falha impede a execução desta.
+
+        Retorno:
+            O valor retornado por `funcao`, ou None se a etapa foi pulada ou falhou.
+        """
+        if self.modo != 'savepoint':
+            resultado = funcao(*args, self.cursor)
+            self.etapas_concluidas.append(nome)
+            return resultado
+
+        dependencias_com_falha = [etapa for etapa in depende_de if etapa in self.falhas]
+        if dependencias_com_falha:
+            self.falhas[nome] = RuntimeError(f"etapa pulada, dependências com falha: {', '.join(dependencias_com_falha)}")
+            return None
+
+        savepoint = sql.Identifier(f'etapa_{nome}')
+        self.cursor.execute(sql.SQL("SAVEPOINT {}").format(savepoint))
+        try:
+            resultado = funcao(*args, self.cursor)
+        except Exception as e:
+            self.cursor.execute(sql.SQL("ROLLBACK TO SAVEPOINT {}").format(savepoint))
+            print(f"Erro na etapa de carga '{nome}': {e}")
+            self.falhas[nome] = e
+            return None
+        self.cursor.execute(sql.SQL("RELEASE SAVEPOINT {}").format(savepoint))
+        self.etapas_concluidas.append(nome)
+        return resultado
+
+
+class SessaoBanco:
+    """
+    Pool de conexões com o PostgreSQL compartilhado por todas as etapas de carga.
+
+    Parâmetros:
+        minimo (int): Quantidade mínima de conexões mantidas no pool.
+        maximo (int): Quantidade máxima de conexões do pool.
+        modo_transacao (str): 'unica' ou 'savepoint' (ver `Transacao`).
+        criar_esquema (bool): Se False, não executa o DDL de `ESQUEMA` (para clientes somente leitura,
+                              como o serviço de consulta, que não podem recriar nem migrar tabelas).
+
+    Funcionalidade:
+        - Abre o pool uma única vez e garante o esquema na criação (com `criar_esquema`).
+        - `transacao()` entrega uma `Transacao` e faz commit ao final ou rollback em caso de erro.
+        - Pode ser usada como gerenciador de contexto para fechar o pool ao final.
+
+    Dependências:
+        - Biblioteca `psycopg2`.
+        - As variáveis globais `db_name`, `db_user`, `db_password`, `db_host` e `db_port`.
+    """
+
+    def __init__(self, minimo=1, maximo=db_pool_max, modo_transacao=db_modo_transacao, criar_esquema=True):
+        if modo_transacao not in MODOS_TRANSACAO:
+            raise ValueError(f"Modo de transação inválido: {modo_transacao!r} (use {' ou '.join(MODOS_TRANSACAO)})")
+        self.modo_transacao = modo_transacao
+        self.maximo = maximo
+        self._pool = pool.ThreadedConnectionPool(minimo, maximo, **parametros_conexao())
+        if criar_esquema:
+            with self.conexao() as conn:
+                garantir_esquema(conn)
+
+    @contextmanager
+    def conexao(self):
+        """Empresta uma conexão do pool e a devolve ao final."""
+        conn = self._pool.getconn()
+        try:
+            yield conn
+        finally:
+            self._pool.putconn(conn)
+
+    @contextmanager
+    def transacao(self):
+        """
+        Abre uma transação e entrega uma `Transacao`.
+
+        Funcionalidade:
+            - Se alguma etapa foi concluída, emite `NOTIFY` no canal `CANAL_ATUALIZACAO` antes do commit;
+              o PostgreSQL só entrega o aviso se o commit acontecer.
+
+        Exceções:
+            - Qualquer erro dentro do bloco desfaz a transação e é propagado.
+            - No modo 'savepoint', as etapas bem-sucedidas são confirmadas e `ErroCarga`
+              é levantada se alguma etapa falhou.
+        """
+        with self.conexao() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    transacao = Transacao(cursor, self.modo_transacao)
+                    yield transacao
+                    if transacao.etapas_concluidas:
+                        cursor.execute("SELECT pg_notify(%s, %s)",
+                                       (CANAL_ATUALIZACAO, ','.join(transacao.etapas_concluidas)))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        if transacao.falhas:
+            raise ErroCarga(transacao.falhas)
+
+    def fechar(self):
+        """Fecha todas as conexões do pool."""
+        self._pool.closeall()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+class GravadorBanco:
+    """
+    Transação da `SessaoBanco` executada por uma thread em segundo plano, alimentada por uma fila limitada.
+
+    Parâmetros:
+        banco (SessaoBanco): Sessão que fornece a conexão e a transação.
+        tamanho_fila (int): Etapas aguardando a thread (padrão `DB_FILA_GRAVACAO`); com a fila cheia,
+                            `enviar` e `consultar` esperam, o que limita os DataFrames retidos em memória.
+        instrumentacao (Instrumentacao, opcional): Se informada, cada etapa é medida na thread do gravador
+                                                   como `gravacao_<nome>`.
+
+    Funcionalidade:
+        - A thread abre `banco.transacao()` e executa as etapas na ordem em que foram enfileiradas, com o
+          cursor da transação, de modo que as cargas continuam encadeadas, como no cursor compartilhado.
+        - `enviar` enfileira uma etapa de carga (`Transacao.executar_etapa`) e volta imediatamente.
+        - `consultar` enfileira uma leitura e espera o resultado, que já enxerga as cargas anteriores.
+        - `concluir` é a barreira final: espera as etapas pendentes, faz o commit e propaga a falha, se houver.
+        - Como gerenciador de contexto, conclui ao sair do bloco; se o bloco terminar com uma exceção,
+          a transação é desfeita e a exceção original é propagada.
+
+    Exceções:
+        - Uma exceção em qualquer etapa interrompe o gravador: as etapas seguintes falham com a mesma
+          exceção, a transação é desfeita e `concluir` a levanta. No modo 'savepoint', as falhas das
+          cargas são registradas pela `Transacao` e `concluir` levanta `ErroCarga` após o commit.
+    """
+
+    _FIM = object()
+
+    def __init__(self, banco, tamanho_fila=db_fila_gravacao, instrumentacao=None):
+        self.instrumentacao = instrumentacao
+        self.erro = None
+        self._transacao = None
+        self._fila = queue.Queue(maxsize=tamanho_fila)
+        self._encerrado = False
+        self._thread = threading.Thread(target=self._executar, args=(banco,), name='gravador-banco', daemon=True)
+        self._thread.start()
+
+    def enviar(self, nome, funcao, *args, depende_de=()):
+        """
+        Enfileira a etapa de carga `nome`, executada como `transacao.executar_etapa(nome, funcao, *args)`.
+
+        Retorno:
+            concurrent.futures.Future: Resultado da etapa, para quem precisar esperá-la.
+        """
+        return self._enfileirar(nome, lambda transacao: transacao.executar_etapa(nome, funcao, *args,
+                                                                                 depende_de=depende_de))
+
+    def consultar(self, funcao, *args, **kwargs):
+        """
+        Executa `funcao(cursor, *args, **kwargs)` na thread do gravador, depois das etapas já enfileiradas.
+
+        Retorno:
+            O retorno de `funcao`.
+        """
+        nome = getattr(funcao, '__name__', 'consulta')
+        return self._enfileirar(nome, lambda transacao: funcao(transacao.cursor, *args, **kwargs)).result()
+
+    @property
+    def falhas(self):
+        """Etapas que falharam até agora no modo 'savepoint' (ver `Transacao.falhas`)."""
+        return dict(self._transacao.falhas) if self._transacao is not None else {}
+
+    def concluir(self):
+        """
+        Barreira final: espera todas as etapas enfileiradas e a confirmação da transação.
+
+        Exceções:
+            - A exceção da etapa que falhou, ou `ErroCarga` no modo 'savepoint'.
+        """
+        self._encerrar(confirmar=True)
+        if self.erro is not None:
+            raise self.erro
+
+    def _enfileirar(self, nome, tarefa):
+        if self._encerrado:
+            raise RuntimeError('Gravador já encerrado')
+        futuro = Future()
+        self._fila.put((nome, tarefa, futuro))
+        return futuro
+
+    def _encerrar(self, confirmar):
+        if not self._encerrado:
+            self._encerrado = True
+            self._fila.put((self._FIM, confirmar, None))
+        self._thread.join()
+
+    def _executar(self, banco):
+        fim = False
+        try:
+            with banco.transacao() as transacao:
+                self._transacao = transacao
+                while True:
+                    nome, tarefa, futuro = self._fila.get()
+                    if nome is self._FIM:
+                        fim = True
+                        if not tarefa:
+                            raise RuntimeError('Gravação cancelada: o pipeline falhou')
+                        break
+                    try:
+                        if self.instrumentacao is not None:
+                            resultado = self.instrumentacao.medir(f'gravacao_{nome}', tarefa, transacao)
+                        else:
+                            resultado = tarefa(transacao)
+                    except BaseException as e:
+                        futuro.set_exception(e)
+                        raise
+                    futuro.set_result(resultado)
+        except BaseException as e:
+            self.erro = e
+            # Sem transação, as etapas restantes falham até a barreira, para que ninguém fique esperando
+            while not fim:
+                nome, _, futuro = self._fila.get()
+                if nome is self._FIM:
+                    fim = True
+                else:
+                    futuro.set_exception(e)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, *exc):
+        if tipo is None:
+            self.concluir()
+        else:
+            self._encerrar(confirmar=False)
+        return False
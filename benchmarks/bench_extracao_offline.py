@@ -0,0 +1,81 @@
+"""
+Benchmark da extração contra o servidor local de `servidor_ibge.py`, sem rede.
+
+Gera fixtures sintéticas (ou usa as de `--fixtures`), inicia o servidor em uma
+thread e mede, com um cache HTTP vazio a cada repetição, o tempo de:
+
+- `pib_N3`: `obter_dados_pib` dos estados (uma requisição);
+- `pib_N6`: `obter_dados_pib(nivel='N6')` consumido por inteiro (um bloco por UF e período);
+- `populacao`: `obtem_dados_populacao` (download em fluxo do arquivo de população).
+
+Cada cenário fixa a latência por requisição e a vazão por conexão do servidor,
+de modo que os tempos são reproduzíveis entre execuções e máquinas. O limitador de
+taxa do cliente (`IBGE_REQUISICOES_POR_SEGUNDO`) continua valendo no nível N6.
+
+Execução, a partir da raiz do projeto:
+    python -m benchmarks.bench_extracao_offline --municipios 5570
+"""
+import argparse
+import tempfile
+import threading
+import time
+
+import ibge
+import main as pipeline
+from cache_http import CacheHTTP
+from servidor_ibge import criar_servidor, gerar_fixtures_sinteticas
+
+REPETICOES = 3
+# (latência em segundos, bytes por segundo por conexão; 0 = sem limite)
+CENARIOS = [(0.0, 0), (0.05, 0), (0.2, 2_000_000)]
+
+
+def medir(funcao):
+    """Menor tempo, em segundos, entre `REPETICOES` execuções de `funcao(cache)` com um cache vazio."""
+    tempos = []
+    for _ in range(REPETICOES):
+        with tempfile.TemporaryDirectory() as diretorio:
+            cache = CacheHTTP(diretorio, ttl=0)
+            inicio = time.perf_counter()
+            funcao(cache)
+            tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--fixtures', help='Diretório de fixtures já gravado (padrão: sintéticas temporárias).')
+    parser.add_argument('--municipios', type=int, default=5_570)
+    parser.add_argument('--localidades', type=int, default=27)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporario:
+        diretorio = args.fixtures
+        if diretorio is None:
+            diretorio = temporario
+            gerar_fixtures_sinteticas(diretorio, args.municipios, args.localidades)
+
+        print(f"{'latência (s)':>12} {'vazão (B/s)':>12} {'etapa':<10} {'tempo (s)':>10} {'requisições':>12}")
+        for latencia, vazao in CENARIOS:
+            servidor = criar_servidor(diretorio, porta=0, latencia=latencia, bytes_por_segundo=vazao)
+            threading.Thread(target=servidor.serve_forever, daemon=True).start()
+            # As URLs são lidas em tempo de chamada, então basta apontar os módulos para o servidor
+            ibge.IBGE_API_URL = servidor.variaveis_ambiente['IBGE_API_URL']
+            pipeline.POPULACAO_URL = servidor.variaveis_ambiente['POPULACAO_URL']
+            try:
+                for etapa, funcao in (
+                    ('pib_N3', pipeline.obter_dados_pib),
+                    ('pib_N6', lambda cache: [bloco for bloco in pipeline.obter_dados_pib(cache, nivel='N6')]),
+                    ('populacao', pipeline.obtem_dados_populacao),
+                ):
+                    antes = servidor.requisicoes
+                    tempo = medir(funcao)
+                    requisicoes = (servidor.requisicoes - antes) // REPETICOES
+                    print(f'{latencia:>12.2f} {vazao or "-":>12} {etapa:<10} {tempo:>10.3f} {requisicoes:>12}')
+            finally:
+                servidor.shutdown()
+                servidor.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark dos gráficos: modelos de figura reaproveitados contra uma figura seaborn por gráfico.
+
+Gera, em um único processo e sem o manifesto, os três tipos de gráfico do pipeline
+com fatias sintéticas de 27 estados:
+
+- `barras_hue`: comparação entre estados com uma barra por ano (`desenhar_barras` com `hue`);
+- `barras`: comparação entre estados em um ano;
+- `previsao`: dados reais, reta ajustada e previsão de um estado.
+
+A implementação anterior monta a figura, o estilo, os eixos e o layout a cada
+gráfico; a atual reaproveita o modelo do tipo de gráfico e só atualiza os dados.
+O resultado é dado em gráficos por segundo.
+
+Execução, a partir da raiz do projeto:
+    python -m benchmarks.bench_graficos_modelos --graficos 50
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import graficos
+from graficos import desenhar_barras, desenhar_previsao
+from main import SIGLAS_ESTADOS, ULTIMOS_ANOS
+
+import matplotlib.pyplot as plt  # noqa: E402  (depois de `graficos`, que escolhe o backend Agg)
+import seaborn as sns  # noqa: E402
+from matplotlib import ticker  # noqa: E402
+
+REPETICOES = 3
+
+
+def desenhar_barras_anterior(dados, caminho, x, y, titulo, rotulo_x, rotulo_y, tamanho, hue=None):
+    """Implementação anterior: uma figura seaborn nova e `tight_layout` por gráfico."""
+    sns.set_style(style="whitegrid")
+    plt.figure(figsize=tamanho)
+    sns.barplot(x=x, y=y, hue=hue, data=dados)
+    plt.xlabel(rotulo_x)
+    plt.ylabel(rotulo_y)
+    plt.title(titulo)
+    plt.tight_layout()
+    plt.savefig(caminho)
+    plt.close()
+
+
+def desenhar_previsao_anterior(dados, caminho, anos_futuros, previsoes, rotulo_ajuste, rotulo_previsao, titulo):
+    """Implementação anterior: uma figura nova por estado."""
+    plt.figure(figsize=(10, 6))
+    plt.scatter(dados['ANO'], dados['PIB_PER_CAPTA'], color='blue', label='Dados reais')
+    plt.plot(dados['ANO'], dados['AJUSTADO'], color='orange', label=rotulo_ajuste)
+    plt.plot(anos_futuros, previsoes, color='green', linestyle='--', marker='o', label=rotulo_previsao)
+    plt.gca().xaxis.set_major_locator(ticker.MaxNLocator(integer=True))
+    plt.xlabel('Ano')
+    plt.ylabel('PIB per capita')
+    plt.title(titulo)
+    plt.legend()
+    plt.grid(True)
+    plt.savefig(caminho)
+    plt.close()
+
+
+def gerar_fatias(quantidade, semente=0):
+    """Gera `quantidade` fatias de cada tipo de gráfico, com os parâmetros usados em `main.py`."""
+    gerador = np.random.default_rng(semente)
+    siglas = list(SIGLAS_ESTADOS.values())
+    anos = ULTIMOS_ANOS
+    fatias = {'barras_hue': [], 'barras': [], 'previsao': []}
+    for indice in range(quantidade):
+        comparacao = pd.DataFrame({
+            'SIGLA': np.repeat(siglas, len(anos)),
+            'ANO': np.tile(anos, len(siglas)),
+            'VALOR': gerador.uniform(1e5, 4e7, size=len(siglas) * len(anos)),
+        }).sort_values(['VALOR', 'SIGLA'], ascending=[False, True])
+        fatias['barras_hue'].append((comparacao, dict(
+            x='SIGLA', y='VALOR', hue='ANO', titulo='Comparação da população entre estados',
+            rotulo_x='Estado', rotulo_y='Número de Pessoas', tamanho=(24, 10))))
+
+        ano = anos[indice % len(anos)]
+        fatias['barras'].append((comparacao[comparacao['ANO'] == ano][['SIGLA', 'VALOR']], dict(
+            x='SIGLA', y='VALOR', titulo=f'Comparação da população entre estados ({ano})',
+            rotulo_x='Estado', rotulo_y='Número de Pessoas', tamanho=(16, 10))))
+
+        inclinacao, intercepto = gerador.uniform(500, 2_000), gerador.uniform(1e4, 5e4)
+        ajustado = intercepto + inclinacao * (np.asarray(anos) - anos[0])
+        serie = pd.DataFrame({'ANO': anos, 'PIB_PER_CAPTA': ajustado * gerador.normal(1, 0.05, len(anos)),
+                              'AJUSTADO': ajustado})
+        anos_futuros = list(range(anos[-1] + 1, anos[-1] + 6))
+        previsoes = (intercepto + inclinacao * (np.asarray(anos_futuros) - anos[0])).tolist()
+        fatias['previsao'].append((serie, dict(
+            anos_futuros=anos_futuros, previsoes=previsoes, rotulo_ajuste='Regressão Linear',
+            rotulo_previsao=f'Previsão até {anos_futuros[-1]}',
+            titulo=f'PIB per capita - {siglas[indice % len(siglas)]}')))
+    return fatias
+
+
+def medir(funcao, fatias, diretorio):
+    """Menor tempo, em segundos, entre `REPETICOES` gerações de todas as `fatias` com `funcao`."""
+    tempos = []
+    for _ in range(REPETICOES):
+        # Cada repetição inclui a montagem dos modelos, como um worker novo do pool
+        graficos._MODELOS.clear()
+        inicio = time.perf_counter()
+        for indice, (dados, parametros) in enumerate(fatias):
+            funcao(dados, os.path.join(diretorio, f'{indice}.png'), **parametros)
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--graficos', type=int, default=30, help='Gráficos de cada tipo por repetição.')
+    args = parser.parse_args()
+
+    fatias = gerar_fatias(args.graficos)
+    implementacoes = {
+        'barras_hue': (desenhar_barras_anterior, desenhar_barras),
+        'barras': (desenhar_barras_anterior, desenhar_barras),
+        'previsao': (desenhar_previsao_anterior, desenhar_previsao),
+    }
+    print(f"{'gráfico':<11} {'quantidade':>10} {'anterior (graf/s)':>18} {'modelos (graf/s)':>17} {'ganho':>7}")
+    with tempfile.TemporaryDirectory() as diretorio:
+        for tipo, (anterior, atual) in implementacoes.items():
+            tempo_anterior = medir(anterior, fatias[tipo], diretorio)
+            tempo_atual = medir(atual, fatias[tipo], diretorio)
+            print(f'{tipo:<11} {args.graficos:>10} {args.graficos / tempo_anterior:>18.1f} '
+                  f'{args.graficos / tempo_atual:>17.1f} {tempo_anterior / tempo_atual:>6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
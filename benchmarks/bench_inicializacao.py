@@ -0,0 +1,49 @@
+"""
+Benchmark do tempo de inicialização dos subcomandos de `cli.py`.
+
+Cada caso é executado em um processo Python novo, medindo o tempo até o fim das
+importações de que o subcomando precisa:
+
+- `cli`: apenas o analisador de argumentos (`--help`, erros de uso);
+- `extract/transform/load/forecast`: `main` e os módulos de dados, sem matplotlib;
+- `plot/run`: os mesmos mais `graficos` (matplotlib e seaborn) — o custo que todos os
+  comandos pagavam quando `main.py` importava os gráficos no topo.
+
+Execução, a partir da raiz do projeto:
+    python -m benchmarks.bench_inicializacao
+"""
+import subprocess
+import sys
+import time
+
+REPETICOES = 5
+CASOS = [
+    ('cli', 'import cli'),
+    ('extract/transform/load/forecast', 'import cli, main'),
+    ('plot/run', 'import cli, main, graficos'),
+]
+VERIFICACAO = "import sys; print(int('matplotlib' in sys.modules))"
+
+
+def medir(codigo):
+    """Menor tempo, em segundos, para executar `codigo` em um processo novo."""
+    tempos = []
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable, '-c', codigo], check=True)
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def main():
+    base = medir('pass')
+    print(f"{'subcomandos':<34} {'tempo (s)':>10} {'importações (s)':>16} {'matplotlib':>11}")
+    for nome, codigo in CASOS:
+        tempo = medir(codigo)
+        matplotlib = subprocess.run([sys.executable, '-c', f'{codigo}; {VERIFICACAO}'], check=True,
+                                    capture_output=True, text=True).stdout.strip() == '1'
+        print(f"{nome:<34} {tempo:>10.3f} {tempo - base:>16.3f} {'sim' if matplotlib else 'não':>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Relatório de memória e tempo da representação compacta (`esquema.compactar`) em escala municipal.
+
+Compara, para o PIB municipal no formato longo (um valor por município e ano):
+
+- a representação anterior: 'SIGLA' como objeto str, 'ANO' e 'LOCALIDADE' int64;
+- a representação compacta: 'SIGLA' categórica, 'ANO' int16 e 'LOCALIDADE' int32.
+
+Mostra o uso de memória por coluna e o tempo de operações típicas do pipeline:
+fatiar por estado (filtro booleano contra o índice (SIGLA, ANO)) e agregar por
+(SIGLA, ANO).
+
+Execução, a partir da raiz do projeto:
+    python -m benchmarks.bench_memoria_esquema
+"""
+import time
+
+from benchmarks.dados_sinteticos import gerar_blocos_pib_municipios
+from esquema import SIGLAS_UF, indexar, relatorio_memoria
+from main import transformar_dados_pib
+
+MUNICIPIOS = [5_570, 50_000]
+REPETICOES = 3
+
+
+def medir(funcao):
+    """Menor tempo, em segundos, entre `REPETICOES` execuções de `funcao()`."""
+    tempos = []
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def fatiar_por_filtro(df):
+    for sigla in SIGLAS_UF:
+        df[df['SIGLA'] == sigla]
+
+
+def fatiar_por_indice(df):
+    for sigla in SIGLAS_UF:
+        df.loc[sigla]
+
+
+def agregar(df):
+    df.groupby(['SIGLA', 'ANO'], observed=True)['VALOR'].sum()
+
+
+def main():
+    for qtd in MUNICIPIOS:
+        compacto = transformar_dados_pib(gerar_blocos_pib_municipios(qtd), nivel='N6')
+        anterior = compacto.astype({'SIGLA': object, 'ANO': 'int64', 'LOCALIDADE': 'int64'})
+        indexado = indexar(compacto)
+
+        memoria_anterior = relatorio_memoria(anterior)
+        memoria_compacta = relatorio_memoria(compacto)
+        print(f'\n{qtd} municípios, {len(compacto)} linhas')
+        print(f"{'coluna':<12} {'anterior (KiB)':>15} {'compacta (KiB)':>15} {'redução':>8}")
+        for coluna in memoria_anterior.index:
+            antes, depois = memoria_anterior[coluna], memoria_compacta[coluna]
+            print(f'{coluna:<12} {antes / 1024:>15.1f} {depois / 1024:>15.1f} {1 - depois / antes:>8.0%}')
+
+        print(f"{'operação':<32} {'anterior (ms)':>14} {'compacta (ms)':>14} {'ganho':>7}")
+        for nome, antes, depois in (
+            ('fatiar os 27 estados', medir(lambda: fatiar_por_filtro(anterior)),
+             medir(lambda: fatiar_por_indice(indexado))),
+            ('agregar por (SIGLA, ANO)', medir(lambda: agregar(anterior)), medir(lambda: agregar(compacto))),
+        ):
+            print(f'{nome:<32} {antes * 1e3:>14.2f} {depois * 1e3:>14.2f} {antes / depois:>6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
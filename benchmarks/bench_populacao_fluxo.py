@@ -0,0 +1,74 @@
+"""
+Benchmark da soma da população: planilha inteira em memória contra a leitura em blocos.
+
+Gera planilhas sintéticas no leiaute do IBGE com um número crescente de localidades
+(cada uma pertence a uma UF, de modo que o resultado tem sempre uma linha por sigla)
+e mede o tempo e o pico de memória alocada pelo Python (`tracemalloc`) de
+`somar_populacao` em cada modo:
+
+- `colunar`: converte a planilha inteira (sem o Parquet em cache) e soma em memória;
+- `fluxo`: soma em blocos de `--linhas-por-bloco` linhas.
+
+O pico do modo em fluxo deve crescer bem menos que o do modo colunar: o que ainda cresce
+com a planilha é a tabela de textos compartilhados do .xlsx (nomes das localidades), que o
+openpyxl carrega ao abrir o arquivo.
+
+Execução, a partir da raiz do projeto:
+    python -m benchmarks.bench_populacao_fluxo --idades 91
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+
+from benchmarks.dados_sinteticos import gerar_planilha_populacao
+from populacao import agregar_populacao_em_blocos, fontes_populacao, ler_populacao_colunar
+
+LOCALIDADES = [27, 100, 300, 1_000]
+
+
+def medir(funcao):
+    """Tempo, em segundos, e pico de memória alocada, em MiB, de uma execução de `funcao()`."""
+    tracemalloc.start()
+    try:
+        inicio = time.perf_counter()
+        funcao()
+        tempo = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return tempo, pico / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--idades', type=int, default=91, help='Linhas de idade por localidade e sexo.')
+    parser.add_argument('--linhas-por-bloco', type=int, default=50_000)
+    args = parser.parse_args()
+
+    print(f"{'localidades':>12} {'linhas':>10} {'modo':<8} {'tempo (s)':>10} {'pico (MiB)':>11}")
+    with tempfile.TemporaryDirectory() as diretorio:
+        for qtd in LOCALIDADES:
+            planilha = os.path.join(diretorio, f'populacao_{qtd}.xlsx')
+            linhas = gerar_planilha_populacao(planilha, qtd, idades=args.idades)
+            for modo, funcao in (
+                ('colunar', partial(somar_colunar_sem_cache, planilha)),
+                ('fluxo', partial(agregar_populacao_em_blocos, fontes_populacao(planilha),
+                                  linhas_por_bloco=args.linhas_por_bloco, workers=1)),
+            ):
+                tempo, pico = medir(funcao)
+                print(f'{qtd:>12} {linhas:>10} {modo:<8} {tempo:>10.3f} {pico:>11.1f}')
+
+
+def somar_colunar_sem_cache(planilha):
+    """`somar_populacao(modo='colunar')` na primeira execução: um diretório de Parquet vazio força a conversão."""
+    with tempfile.TemporaryDirectory() as destino:
+        df_pop = ler_populacao_colunar(planilha, destino)
+        df_pop = df_pop[df_pop['SEXO'] == 'Ambos'].drop(columns=['SEXO'])
+        return df_pop.groupby('SIGLA', as_index=False).sum()
+
+
+if __name__ == '__main__':
+    main()
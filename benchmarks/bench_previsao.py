@@ -0,0 +1,78 @@
+"""
+Benchmark e verificação de `previsao.prever` com todos os modelos.
+
+Mede o tempo de `prever` para um número crescente de localidades e confere, em
+cada modelo, que `ajustados` mantém todas as observações não nulas — inclusive
+anos com valor zero ou negativo, que o modelo 'log_linear' não pode transformar
+e apenas exclui do ajuste — e que esses anos não alteram a tendência ajustada.
+Termina com saída 1 se alguma verificação falhar.
+
+Execução, a partir da raiz do projeto:
+    python -m benchmarks.bench_previsao
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.dados_sinteticos import gerar_frame_longo
+from main import ULTIMOS_ANOS
+from previsao import MODELOS, prever
+
+LOCALIDADES = [27, 5_570, 50_000]
+REPETICOES = 3
+
+
+def medir(funcao):
+    """Menor tempo, em segundos, entre `REPETICOES` execuções de `funcao()`."""
+    tempos = []
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def verificar_nao_positivos():
+    """Retorna as falhas encontradas com uma série que tem um ano zero e um negativo."""
+    tabela = gerar_frame_longo(3, ULTIMOS_ANOS, semente=3, coluna_valor='PIB_PER_CAPTA', minimo=1e4, maximo=5e4)
+    # Um ano sem dado, que deve continuar fora de `ajustados`
+    tabela = tabela.drop(index=len(ULTIMOS_ANOS) * 2 + 1)
+    alterada = tabela.copy()
+    primeira = alterada['SIGLA'] == alterada['SIGLA'].iloc[0]
+    alterada.loc[primeira & (alterada['ANO'] == ULTIMOS_ANOS[0]), 'PIB_PER_CAPTA'] = 0.0
+    alterada.loc[primeira & (alterada['ANO'] == ULTIMOS_ANOS[1]), 'PIB_PER_CAPTA'] = -1.0
+
+    falhas = []
+    for modelo in MODELOS:
+        resultado = prever(alterada, modelo=modelo)
+        if len(resultado.ajustados) != len(alterada):
+            falhas.append(f'{modelo}: {len(resultado.ajustados)} linhas em ajustados, esperado {len(alterada)}')
+        if modelo != 'log_linear':
+            continue
+        # Sem os anos não positivos no ajuste, a tendência é a mesma de uma série sem esses anos
+        sem_anos = alterada[~(primeira & alterada['ANO'].isin(ULTIMOS_ANOS[:2]))]
+        referencia = prever(sem_anos, modelo=modelo).previsoes['VALOR'].to_numpy()
+        if not np.allclose(resultado.previsoes['VALOR'].to_numpy(), referencia):
+            falhas.append('log_linear: os anos não positivos alteraram a previsão')
+    return falhas
+
+
+def main():
+    falhas = verificar_nao_positivos()
+    for falha in falhas:
+        print(f'FALHA {falha}')
+    if not falhas:
+        print('ok    valores zero e negativos permanecem em ajustados e ficam fora do ajuste log-linear')
+
+    print(f"\n{'modelo':<11} {'localidades':>11} {'tempo (ms)':>11}")
+    for localidades in LOCALIDADES:
+        tabela = gerar_frame_longo(localidades, ULTIMOS_ANOS, coluna_valor='PIB_PER_CAPTA', minimo=1e4, maximo=1e5)
+        for modelo in MODELOS:
+            tempo = medir(lambda: prever(tabela, modelo=modelo))
+            print(f'{modelo:<11} {localidades:>11} {tempo * 1e3:>11.2f}')
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+Verificação e medida do serviço de consulta (`servico_consulta.py`) contra um PostgreSQL local.
+
+Cria um esquema descartável com o DDL do projeto, carrega PIB e população
+sintéticos dos 27 estados, inicia o serviço em uma porta livre, com o pool
+apontando para esse esquema, e confere:
+
+- as rotas `/indicadores`, `/indicadores/<indicador>` e `/estados/<sigla>` em JSON e em Arrow,
+  comparando os valores com os dados carregados;
+- as respostas de erro (400, 404) e a resposta 503 quando o banco não está disponível;
+- o cache: a segunda consulta não passa pelo banco, `If-None-Match` devolve 304 e um `NOTIFY`
+  no canal do ETL esvazia o cache;
+
+e mostra o tempo médio de uma consulta sem cache e com cache. Termina com saída 1 se
+alguma verificação falhar.
+
+Execução, a partir da raiz do projeto (variáveis `DB_*` do PostgreSQL local):
+    python -m benchmarks.bench_servico_consulta
+"""
+import io
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pyarrow as pa
+
+from banco import CANAL_ATUALIZACAO, SessaoBanco, atualizar_indicadores_derivados
+from benchmarks.dados_sinteticos import gerar_frame_longo
+from benchmarks.suite import esquema_descartavel
+from main import SIGLAS_ESTADOS, ULTIMOS_ANOS, carrega_dados_populacao, carregar_dados_pib
+from servico_consulta import TIPO_ARROW, criar_servico
+
+ESQUEMA_SERVICO = 'benchmark_servico_consulta'
+REQUISICOES = 200
+ESPERA_NOTIFY = 5.0
+
+
+def gerar_dados():
+    """PIB e população sintéticos no formato longo, com as siglas reais dos estados."""
+    siglas = sorted(SIGLAS_ESTADOS.values())
+    frames = []
+    for semente, (minimo, maximo) in enumerate(((1e6, 1e12), (1e5, 5e7)), start=1):
+        df = gerar_frame_longo(len(siglas), ULTIMOS_ANOS, semente=semente, minimo=minimo, maximo=maximo)
+        df['SIGLA'] = df['SIGLA'].map(lambda chave: siglas[int(chave)])
+        frames.append(df)
+    return frames
+
+
+def requisitar(base, caminho, cabecalhos=None):
+    """Executa um GET e retorna (status, cabeçalhos, corpo), inclusive para respostas de erro e 304."""
+    requisicao = urllib.request.Request(base + caminho, headers=cabecalhos or {})
+    try:
+        with urllib.request.urlopen(requisicao, timeout=10) as resposta:
+            return resposta.status, resposta.headers, resposta.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+class Verificacoes:
+    """Acumula o resultado das verificações e imprime uma linha por verificação."""
+
+    def __init__(self):
+        self.falhas = 0
+
+    def conferir(self, descricao, condicao, detalhe=''):
+        if not condicao:
+            self.falhas += 1
+        print(f"{'ok   ' if condicao else 'FALHA'} {descricao}{f' ({detalhe})' if detalhe and not condicao else ''}")
+
+
+def verificar(base, servico, conn, df_pib, verificacoes):
+    """Confere as rotas, os formatos, os erros e o cache do serviço em execução."""
+    conferir = verificacoes.conferir
+    anos = ULTIMOS_ANOS[-3:]
+    esperado = (df_pib[df_pib['SIGLA'].isin(['RJ', 'SP']) & df_pib['ANO'].between(anos[0], anos[-1])]
+                .sort_values(['SIGLA', 'ANO']))
+    rota_pib = f'/indicadores/pib?siglas=SP,RJ&ano_inicio={anos[0]}&ano_fim={anos[-1]}'
+
+    status, _, corpo = requisitar(base, '/indicadores')
+    conferir('/indicadores lista os indicadores', status == 200 and 'pib' in json.loads(corpo)['indicadores'])
+
+    status, cabecalhos, corpo = requisitar(base, rota_pib)
+    dados = json.loads(corpo) if status == 200 else {}
+    colunas = dados.get('colunas', {})
+    conferir('/indicadores/pib em JSON', status == 200 and dados.get('linhas') == len(esperado)
+             and colunas.get('sigla') == esperado['SIGLA'].tolist()
+             and colunas.get('ano') == esperado['ANO'].tolist()
+             and all(abs(valor - referencia) <= 1e-6 * abs(referencia)
+                     for valor, referencia in zip(colunas.get('valor', []), esperado['VALOR'])),
+             f'status {status}')
+    etag = cabecalhos.get('ETag')
+
+    status, cabecalhos, corpo = requisitar(base, rota_pib + '&formato=arrow')
+    tabela = pa.ipc.open_stream(io.BytesIO(corpo)).read_all() if status == 200 else None
+    conferir('/indicadores/pib em Arrow', tabela is not None and cabecalhos.get('Content-Type') == TIPO_ARROW
+             and tabela.column('sigla').to_pylist() == esperado['SIGLA'].tolist(), f'status {status}')
+
+    status, _, corpo = requisitar(base, '/estados/sp?indicadores=pib,populacao,participacao_pib')
+    indicadores = set(json.loads(corpo)['colunas']['indicador']) if status == 200 else set()
+    conferir('/estados/SP combina os indicadores', indicadores == {'pib', 'populacao', 'participacao_pib'},
+             f'status {status}, indicadores {sorted(indicadores)}')
+
+    for caminho, status_esperado in (('/indicadores/inexistente', 404), ('/estados/XYZ', 400),
+                                     ('/indicadores/pib?ano_inicio=2020&ano_fim=2010', 400), ('/outra', 404)):
+        status, _, corpo = requisitar(base, caminho)
+        conferir(f'{caminho} responde {status_esperado}', status == status_esperado and 'erro' in json.loads(corpo),
+                 f'status {status}')
+
+    itens = len(servico.cache)
+    requisitar(base, rota_pib)
+    conferir('consulta repetida vem do cache', len(servico.cache) == itens)
+    status, _, _ = requisitar(base, rota_pib, {'If-None-Match': etag or ''})
+    conferir('If-None-Match com a ETag responde 304', status == 304, f'status {status}')
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s)", (CANAL_ATUALIZACAO, 'carga_pib'))
+    conn.commit()
+    limite = time.monotonic() + ESPERA_NOTIFY
+    while len(servico.cache) and time.monotonic() < limite:
+        time.sleep(0.05)
+    conferir('NOTIFY do ETL esvazia o cache', len(servico.cache) == 0, f'{len(servico.cache)} itens')
+    return rota_pib
+
+
+def medir_latencia(base, servico, rota):
+    """Tempo médio, em milissegundos, de uma consulta sem cache e com cache."""
+    sem_cache = []
+    for _ in range(REQUISICOES):
+        servico.cache.limpar()
+        inicio = time.perf_counter()
+        requisitar(base, rota)
+        sem_cache.append(time.perf_counter() - inicio)
+    com_cache = []
+    for _ in range(REQUISICOES):
+        inicio = time.perf_counter()
+        requisitar(base, rota)
+        com_cache.append(time.perf_counter() - inicio)
+    print(f"\n{'consulta':<12} {'média (ms)':>11}")
+    print(f"{'sem cache':<12} {sum(sem_cache) / len(sem_cache) * 1e3:>11.2f}")
+    print(f"{'com cache':<12} {sum(com_cache) / len(com_cache) * 1e3:>11.2f}")
+
+
+def main():
+    df_pib, df_pop = gerar_dados()
+    verificacoes = Verificacoes()
+    with esquema_descartavel(ESQUEMA_SERVICO) as conn:
+        with conn.cursor() as cursor:
+            carregar_dados_pib(df_pib, cursor)
+            carrega_dados_populacao(df_pop, cursor)
+            atualizar_indicadores_derivados(cursor)
+        conn.commit()
+
+        # As conexões do serviço (pool e LISTEN) leem o esquema descartável; o DDL não é executado
+        os.environ['PGOPTIONS'] = f'-c search_path={ESQUEMA_SERVICO}'
+        servico = criar_servico(host='127.0.0.1', porta=0, sessao=SessaoBanco(criar_esquema=False))
+        thread = threading.Thread(target=servico.serve_forever, daemon=True)
+        thread.start()
+        base = f'http://127.0.0.1:{servico.server_address[1]}'
+        try:
+            # O ouvinte precisa estar escutando antes do NOTIFY da verificação
+            time.sleep(0.5)
+            rota = verificar(base, servico, conn, df_pib, verificacoes)
+            medir_latencia(base, servico, rota)
+
+            servico.cache.limpar()
+            servico.sessao.fechar()
+            status, _, _ = requisitar(base, rota)
+            verificacoes.conferir('banco indisponível responde 503', status == 503, f'status {status}')
+        finally:
+            servico.shutdown()
+            servico.ouvinte.parar()
+            servico.server_close()
+            servico.ouvinte.join()
+            os.environ.pop('PGOPTIONS', None)
+
+    if verificacoes.falhas:
+        print(f'\n{verificacoes.falhas} verificação(ões) com falha.')
+    else:
+        print('\nTodas as verificações passaram.')
+    sys.exit(1 if verificacoes.falhas else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark de `transformar_dados_pib`: implementação vetorizada contra a anterior.
+
+Gera respostas sintéticas no formato da API do IBGE (agregado 5938) com um número
+crescente de localidades e mede o tempo de cada implementação. O tempo por linha
+da versão vetorizada deve permanecer aproximadamente constante, isto é, o custo
+cresce de forma linear com o número de localidades.
+
+Execução, a partir da raiz do projeto:
+    python -m benchmarks.bench_transformar_pib
+"""
+import json
+import time
+from io import StringIO
+
+import pandas as pd
+
+from benchmarks.dados_sinteticos import gerar_series_pib
+from main import SIGLAS_ESTADOS, ULTIMOS_ANOS, transformar_dados_pib
+
+LOCALIDADES = [27, 1_000, 5_570, 20_000, 50_000]
+REPETICOES = 3
+
+
+def transformar_dados_pib_anterior(data_pib):
+    """Implementação anterior: ida e volta por JSON e um `apply` por ano."""
+    df_pib = pd.read_json(StringIO(json.dumps(data_pib)), orient='records')
+    df_pib['estado'] = df_pib['localidade'].apply(lambda row: row['nome'])
+    for ano in ULTIMOS_ANOS:
+        df_pib[ano] = df_pib['serie'].apply(lambda row: pd.to_numeric(row.get(str(ano), float('nan'))) * 100)
+    df_pib['SIGLA'] = df_pib['estado'].map(SIGLAS_ESTADOS)
+    df_pib = df_pib.drop(columns=['localidade', 'serie', 'estado'])
+    df_pib = df_pib.dropna(axis=1)
+    df_pib = df_pib.melt(id_vars=['SIGLA'], var_name='ANO', value_name='VALOR')
+    df_pib['ANO'] = df_pib['ANO'].astype(int)
+    return df_pib
+
+
+def medir(funcao, dados):
+    """Menor tempo, em segundos, entre `REPETICOES` execuções de `funcao(dados)`."""
+    tempos = []
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        funcao(dados)
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def main():
+    print(f"{'localidades':>12} {'linhas':>10} {'anterior (s)':>13} {'vetorizada (s)':>15} {'µs/linha':>9} {'ganho':>7}")
+    for qtd in LOCALIDADES:
+        dados = gerar_series_pib(qtd)
+        linhas = qtd * len(ULTIMOS_ANOS)
+        tempo_anterior = medir(transformar_dados_pib_anterior, dados)
+        tempo_vetorizado = medir(transformar_dados_pib, dados)
+        print(f'{qtd:>12} {linhas:>10} {tempo_anterior:>13.3f} {tempo_vetorizado:>15.3f} '
+              f'{tempo_vetorizado / linhas * 1e6:>9.2f} {tempo_anterior / tempo_vetorizado:>6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Geradores de dados sintéticos no formato das fontes do IBGE, em escala configurável.
+
+- `gerar_series_pib`: séries de estados no formato de `resultados[0]['series']` da API (nível N3).
+- `gerar_blocos_pib_municipios`: blocos de séries municipais (nível N6), um por UF, como os
+  entregues por `ibge.obter_series_pib`.
+- `gerar_planilha_populacao`: planilha de projeção da população com uma linha por localidade,
+  sexo e idade, no leiaute lido por `populacao.converter_excel_populacao`.
+- `gerar_frame_longo`: DataFrame longo ('SIGLA', 'ANO', valor) com uma chave por localidade.
+"""
+import random
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from ibge import CODIGOS_UF
+from main import SIGLAS_ESTADOS, ULTIMOS_ANOS
+from populacao import LINHA_CABECALHO
+
+SEXOS = ('Homens', 'Mulheres', 'Ambos')
+AGREGADOS_POPULACAO = ('CO', 'ND', 'NO', 'SD', 'SU', 'BR')
+# Marcadores usados pelo IBGE para valores ausentes
+MARCADORES_AUSENTES = ('...', '-', 'X')
+
+
+def gerar_series_pib(qtd_localidades, anos=ULTIMOS_ANOS, semente=0):
+    """Gera `qtd_localidades` séries no formato de `resultados[0]['series']` da API do IBGE."""
+    aleatorio = random.Random(semente)
+    nomes = list(SIGLAS_ESTADOS)
+    return [
+        {
+            'localidade': {'id': str(indice), 'nivel': {'id': 'N3', 'nome': 'Unidade da Federação'},
+                           'nome': nomes[indice % len(nomes)]},
+            'serie': {str(ano): str(aleatorio.randint(1_000, 10_000_000)) for ano in anos},
+        }
+        for indice in range(qtd_localidades)
+    ]
+
+
+def gerar_blocos_pib_municipios(qtd_localidades, anos=ULTIMOS_ANOS, semente=0, fracao_ausente=0.01):
+    """
+    Gera séries municipais de PIB distribuídas entre as UFs, em um bloco por UF.
+
+    Parâmetros:
+        qtd_localidades (int): Quantidade total de municípios.
+        anos (list): Anos de cada série.
+        semente (int): Semente do gerador aleatório.
+        fracao_ausente (float): Fração dos valores substituída por marcadores de ausência ('...', '-', 'X').
+
+    Retorno:
+        list: Listas de séries no formato da API, uma por UF (o mesmo formato de `obter_dados_pib(nivel='N6')`).
+    """
+    aleatorio = random.Random(semente)
+    codigos = list(CODIGOS_UF)
+    blocos = {codigo: [] for codigo in codigos}
+    for indice in range(qtd_localidades):
+        codigo = codigos[indice % len(codigos)]
+        serie = {
+            str(ano): (aleatorio.choice(MARCADORES_AUSENTES) if aleatorio.random() < fracao_ausente
+                       else str(aleatorio.randint(1_000, 100_000_000)))
+            for ano in anos
+        }
+        blocos[codigo].append({
+            'localidade': {'id': f'{codigo}{indice:05d}', 'nivel': {'id': 'N6', 'nome': 'Município'},
+                           'nome': f'Município {indice}'},
+            'serie': serie,
+        })
+    return [bloco for bloco in blocos.values() if bloco]
+
+
+def gerar_planilha_populacao(caminho, qtd_localidades, anos=ULTIMOS_ANOS, idades=91, semente=0):
+    """
+    Grava uma planilha de projeção da população no leiaute do arquivo do IBGE.
+
+    Parâmetros:
+        caminho (str): Arquivo .xlsx de saída.
+        qtd_localidades (int): Quantidade de localidades; cada uma pertence a uma UF, em rodízio.
+        anos (list): Anos (uma coluna por ano).
+        idades (int): Linhas de idade por localidade e sexo.
+        semente (int): Semente do gerador aleatório.
+
+    Funcionalidade:
+        - Escreve em modo `write_only`, em fluxo, com o cabeçalho na linha `LINHA_CABECALHO`.
+        - Gera as linhas 'Homens', 'Mulheres' e 'Ambos' (soma das duas) de cada idade, além das linhas
+          de agregados regionais e nacional, que o pipeline descarta.
+
+    Retorno:
+        int: Quantidade de linhas de dados gravadas.
+    """
+    gerador = np.random.default_rng(semente)
+    siglas = [CODIGOS_UF[codigo] for codigo in CODIGOS_UF]
+    localidades = [(f'{indice:07d}', siglas[indice % len(siglas)]) for indice in range(qtd_localidades)]
+    localidades += [(sigla, sigla) for sigla in AGREGADOS_POPULACAO]
+
+    livro = Workbook(write_only=True)
+    planilha = livro.create_sheet('Projeção')
+    planilha.append(['PROJEÇÕES DA POPULAÇÃO (dados sintéticos)'])
+    for _ in range(LINHA_CABECALHO - 2):
+        planilha.append([''])
+    planilha.append(['IDADE', 'SEXO', 'CÓD.', 'SIGLA', 'LOCAL', *anos])
+
+    linhas = 0
+    for codigo, sigla in localidades:
+        homens = gerador.integers(0, 5_000, size=(idades, len(anos)))
+        mulheres = gerador.integers(0, 5_000, size=(idades, len(anos)))
+        for sexo, valores in zip(SEXOS, (homens, mulheres, homens + mulheres)):
+            for idade, linha in enumerate(valores.tolist()):
+                planilha.append([idade, sexo, codigo, sigla, f'Localidade {codigo}', *linha])
+                linhas += 1
+    livro.save(caminho)
+    return linhas
+
+
+def gerar_frame_longo(qtd_localidades, anos=ULTIMOS_ANOS, semente=0, coluna_valor='VALOR', minimo=1.0, maximo=1e9):
+    """Gera um DataFrame longo com as colunas 'SIGLA' (uma chave por localidade), 'ANO' e `coluna_valor`."""
+    gerador = np.random.default_rng(semente)
+    siglas = np.array([f'{indice:07d}' for indice in range(qtd_localidades)], dtype=object)
+    return pd.DataFrame({
+        'SIGLA': np.repeat(siglas, len(anos)),
+        'ANO': np.tile(np.asarray(anos, dtype=int), qtd_localidades),
+        coluna_valor: gerador.uniform(minimo, maximo, size=qtd_localidades * len(anos)),
+    })
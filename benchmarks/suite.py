@@ -0,0 +1,321 @@
+"""
+Suíte de benchmarks de todas as etapas do pipeline com dados sintéticos.
+
+Para cada escala (quantidade de localidades × anos × linhas de idade) mede
+separadamente cada etapa:
+
+- `transformar_pib`: `transformar_dados_pib` sobre blocos municipais (nível N6);
+- `transformar_populacao_excel` e `transformar_populacao_parquet`: `transformar_dados_populacao`
+  com o Excel ainda não convertido e com o Parquet já em cache;
+- `calcular_pib_per_capta`: merge e divisão sobre frames longos com uma chave por localidade;
+- `carga_pib`, `carga_pib_municipios`, `carga_populacao`, `carga_pib_per_capta`: cargas em um
+  PostgreSQL local, em um esquema descartável (`--sem-banco` para pular); `carga_pib_municipios`
+  carrega o resultado de `transformar_pib` no nível territorial dos municípios;
+- `pib_per_capta_banco`: com PIB e população já carregados, atualização de `mv_indicadores_derivados`
+  e leitura do PIB per capita — o caminho de `PIB_PER_CAPTA_MODO=banco`, que substitui
+  `calcular_pib_per_capta` mais `carga_pib_per_capta`;
+- `plotar_pib`, `plotar_populacao`, `plotar_pib_per_capta`: geração dos gráficos em nível de estado,
+  uma vez por execução (`--sem-graficos` para pular).
+
+Os resultados são gravados em JSON em `benchmarks/resultados/` e comparados com a
+execução anterior (ou com o arquivo de `--comparar`); etapas mais lentas que o
+limite de tolerância são apontadas como regressão e a saída do processo é 1.
+
+Execução, a partir da raiz do projeto:
+    python -m benchmarks.suite --localidades 27 1000 5570 --repeticoes 3
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+
+import psycopg2
+from psycopg2 import sql
+
+from banco import ESQUEMA, atualizar_indicadores_derivados, conectar
+from benchmarks.dados_sinteticos import (gerar_blocos_pib_municipios, gerar_frame_longo, gerar_planilha_populacao,
+                                         gerar_series_pib)
+from main import (ULTIMOS_ANOS, calcular_pib_per_capta, carrega_dados_pib_per_capta, carrega_dados_populacao,
+                  carregar_dados_pib, carregar_dados_pib_municipios, plotar_graficos_pib,
+                  plotar_graficos_pib_per_capta, plotar_graficos_populacao, transformar_dados_pib,
+                  transformar_dados_populacao)
+from previsao import prever
+
+RESULTADOS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resultados')
+ESQUEMA_BENCHMARK = 'benchmark_etl'
+VERSAO_FORMATO = 1
+
+
+def medir(funcao, repeticoes):
+    """Executa `funcao()` `repeticoes` vezes e retorna (tempos em segundos, retorno da última execução)."""
+    tempos, resultado = [], None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return tempos, resultado
+
+
+@contextmanager
+def diretorio_temporario():
+    """Executa o bloco dentro de um diretório temporário novo (caminhos relativos como `data/` e `output/`)."""
+    anterior = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='benchmark_') as diretorio:
+        os.chdir(diretorio)
+        try:
+            yield diretorio
+        finally:
+            os.chdir(anterior)
+
+
+@contextmanager
+def esquema_descartavel(nome=ESQUEMA_BENCHMARK):
+    """
+    Conexão com o `search_path` apontando para o esquema `nome`, criado para o benchmark e removido ao final.
+
+    O esquema recebe o DDL de `banco.ESQUEMA` sem alterações: as chaves das localidades sintéticas e os
+    códigos dos municípios (7 caracteres) cabem em `fato_indicador.localidade` (VARCHAR(16)).
+    """
+    conn = conectar()
+    try:
+        with conn.cursor() as cursor:
+            esquema = sql.Identifier(nome)
+            cursor.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(esquema))
+            cursor.execute(sql.SQL("CREATE SCHEMA {}").format(esquema))
+            cursor.execute(sql.SQL("SET search_path TO {}").format(esquema))
+            for comando in ESQUEMA:
+                cursor.execute(comando)
+        conn.commit()
+        yield conn
+    finally:
+        try:
+            conn.rollback()
+            with conn.cursor() as cursor:
+                cursor.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(sql.Identifier(nome)))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def medir_carga(conn, carregar, df, repeticoes, preparar=()):
+    """
+    Mede uma carga em tabelas vazias: cada repetição é desfeita com rollback, fora da medição.
+
+    `preparar` lista pares (carga, df) executados antes de cada repetição, também fora da medição.
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        with conn.cursor() as cursor:
+            for carga, entrada in preparar:
+                carga(entrada, cursor)
+            inicio = time.perf_counter()
+            carregar(df, cursor)
+            tempos.append(time.perf_counter() - inicio)
+        conn.rollback()
+    return tempos
+
+
+def executar_escala(localidades, anos, idades, repeticoes, banco, pasta_planilhas):
+    """Executa as etapas de dados para uma escala e retorna a lista de resultados."""
+    resultados = []
+
+    def registrar(etapa, tempos, linhas_entrada, linhas_saida):
+        resultados.append({
+            'etapa': etapa, 'localidades': localidades, 'anos': len(anos), 'idades': idades,
+            'linhas_entrada': int(linhas_entrada), 'linhas_saida': int(linhas_saida),
+            'tempos': tempos, 'minimo': min(tempos), 'mediana': statistics.median(tempos),
+        })
+        print(f'{etapa:<30} {localidades:>9} {len(anos):>5} {idades:>6} {linhas_entrada:>12} '
+              f'{min(tempos):>10.4f} {statistics.median(tempos):>10.4f}')
+
+    # PIB municipal
+    blocos = gerar_blocos_pib_municipios(localidades, anos)
+    tempos, df_pib = medir(lambda: transformar_dados_pib(iter(blocos), nivel='N6'), repeticoes)
+    registrar('transformar_pib', tempos, localidades * len(anos), len(df_pib))
+
+    # População: Excel sem cache e Parquet em cache
+    planilha = os.path.join(pasta_planilhas, f'populacao_{localidades}x{len(anos)}x{idades}.xlsx')
+    if not os.path.exists(planilha):
+        gerar_planilha_populacao(planilha, localidades, anos, idades)
+    linhas_planilha = (localidades + 6) * idades * 3
+    tempos = []
+    for _ in range(repeticoes):
+        # Diretório novo a cada repetição: `data/colunar` vazio, o Excel é convertido de novo
+        with diretorio_temporario():
+            inicio = time.perf_counter()
+            df_pop = transformar_dados_populacao(planilha)
+            tempos.append(time.perf_counter() - inicio)
+    registrar('transformar_populacao_excel', tempos, linhas_planilha, len(df_pop))
+    with diretorio_temporario():
+        transformar_dados_populacao(planilha)
+        tempos, df_pop = medir(lambda: transformar_dados_populacao(planilha), repeticoes)
+        registrar('transformar_populacao_parquet', tempos, linhas_planilha, len(df_pop))
+
+    # PIB per capita com uma chave por localidade
+    pib_longo = gerar_frame_longo(localidades, anos, semente=1, minimo=1e6, maximo=1e12)
+    pop_longo = gerar_frame_longo(localidades, anos, semente=2, minimo=1e3, maximo=1e7)
+    tempos, tabela = medir(lambda: calcular_pib_per_capta(pib_longo, pop_longo), repeticoes)
+    registrar('calcular_pib_per_capta', tempos, len(pib_longo) + len(pop_longo), len(tabela))
+
+    if banco is not None:
+        for etapa, carregar, df in (('carga_pib', carregar_dados_pib, pib_longo),
+                                    ('carga_pib_municipios', carregar_dados_pib_municipios, df_pib),
+                                    ('carga_populacao', carrega_dados_populacao, pop_longo),
+                                    ('carga_pib_per_capta', carrega_dados_pib_per_capta, tabela)):
+            registrar(etapa, medir_carga(banco, carregar, df, repeticoes), len(df), len(df))
+        tempos = medir_carga(banco, pib_per_capta_no_banco, None, repeticoes,
+                             preparar=((carregar_dados_pib, pib_longo), (carrega_dados_populacao, pop_longo)))
+        registrar('pib_per_capta_banco', tempos, len(pib_longo) + len(pop_longo), len(tabela))
+    return resultados
+
+
+def pib_per_capta_no_banco(_, cursor):
+    """Atualiza a visão materializada e lê o PIB per capita, como `main.calcular_pib_per_capta_no_banco`."""
+    # Sem `ler_tabela`: as localidades sintéticas não são siglas de UF e não passam por `compactar`
+    atualizar_indicadores_derivados(cursor)
+    cursor.execute("SELECT sigla, ano, pib_per_capta::float8 FROM mv_indicadores_derivados ORDER BY sigla, ano")
+    return cursor.fetchall()
+
+
+def executar_graficos(anos, idades, workers, pasta_planilhas):
+    """Mede os gráficos em nível de estado (27 UFs); cada etapa roda em um diretório de saída vazio."""
+    df_pib = transformar_dados_pib(gerar_series_pib(27, anos))
+    planilha = os.path.join(pasta_planilhas, f'populacao_27x{len(anos)}x{idades}.xlsx')
+    if not os.path.exists(planilha):
+        gerar_planilha_populacao(planilha, 27, anos, idades)
+    with diretorio_temporario():
+        df_pop = transformar_dados_populacao(planilha)
+    tabela = calcular_pib_per_capta(df_pib, df_pop)
+    previsao = prever(tabela)
+
+    resultados = []
+    for etapa, funcao, argumentos in (('plotar_pib', plotar_graficos_pib, (df_pib,)),
+                                      ('plotar_populacao', plotar_graficos_populacao, (df_pop,)),
+                                      ('plotar_pib_per_capta', plotar_graficos_pib_per_capta, (tabela, previsao))):
+        with diretorio_temporario():
+            inicio = time.perf_counter()
+            funcao(*argumentos, workers=workers)
+            tempo = time.perf_counter() - inicio
+            graficos = sum(arquivo.endswith('.png') for _, _, arquivos in os.walk('output') for arquivo in arquivos)
+        resultados.append({
+            'etapa': etapa, 'localidades': 27, 'anos': len(anos), 'idades': idades, 'workers': workers,
+            'linhas_entrada': int(len(argumentos[0])), 'linhas_saida': graficos,
+            'tempos': [tempo], 'minimo': tempo, 'mediana': tempo,
+        })
+        print(f'{etapa:<30} {27:>9} {len(anos):>5} {idades:>6} {len(argumentos[0]):>12} {tempo:>10.4f} {tempo:>10.4f}')
+    return resultados
+
+
+def comparar(atual, anterior, limiar):
+    """
+    Compara o menor tempo de cada etapa e escala com uma execução anterior.
+
+    Retorno:
+        list: Regressões, como tuplas (etapa, localidades, tempo anterior, tempo atual).
+    """
+    def chave(resultado):
+        return resultado['etapa'], resultado['localidades'], resultado['anos'], resultado['idades']
+
+    referencia = {chave(resultado): resultado for resultado in anterior['resultados']}
+    regressoes = []
+    print(f"\nComparação com {anterior['data']} ({anterior.get('commit') or 'sem commit'}):")
+    for resultado in atual['resultados']:
+        antigo = referencia.get(chave(resultado))
+        if antigo is None:
+            continue
+        razao = resultado['minimo'] / antigo['minimo'] if antigo['minimo'] > 0 else float('inf')
+        marca = ''
+        if razao > 1 + limiar:
+            marca = '  <-- regressão'
+            regressoes.append((resultado['etapa'], resultado['localidades'], antigo['minimo'], resultado['minimo']))
+        print(f"{resultado['etapa']:<30} {resultado['localidades']:>9} {antigo['minimo']:>10.4f} "
+              f"{resultado['minimo']:>10.4f} {razao:>7.2f}x{marca}")
+    return regressoes
+
+
+def ultimo_resultado(diretorio):
+    """Caminho do resultado mais recente em `diretorio`, ou None."""
+    arquivos = sorted(glob.glob(os.path.join(diretorio, '*.json')))
+    return arquivos[-1] if arquivos else None
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description='Benchmarks das etapas do pipeline com dados sintéticos.')
+    parser.add_argument('--localidades', type=int, nargs='+', default=[27, 1_000],
+                        help='Quantidades de localidades (uma escala por valor).')
+    parser.add_argument('--anos', type=int, default=len(ULTIMOS_ANOS),
+                        help='Quantidade de anos, terminando no atual (o PIB mantém apenas os de ULTIMOS_ANOS).')
+    parser.add_argument('--idades', type=int, default=91, help='Linhas de idade por localidade e sexo.')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=None, help='Processos usados nos gráficos.')
+    parser.add_argument('--sem-banco', action='store_true', help='Não mede as cargas no PostgreSQL.')
+    parser.add_argument('--sem-graficos', action='store_true', help='Não mede os gráficos.')
+    parser.add_argument('--saida', default=RESULTADOS_DIR, help='Diretório dos resultados em JSON.')
+    parser.add_argument('--comparar', help='Resultado usado na comparação (padrão: o mais recente em --saida).')
+    parser.add_argument('--limiar', type=float, default=0.2,
+                        help='Aumento relativo de tempo considerado regressão (padrão 0.2 = 20%%).')
+    return parser.parse_args()
+
+
+def main():
+    args = _argumentos()
+    anos = list(range(ULTIMOS_ANOS[-1] - args.anos + 1, ULTIMOS_ANOS[-1] + 1))
+    referencia = args.comparar or ultimo_resultado(args.saida)
+
+    print(f"{'etapa':<30} {'locais':>9} {'anos':>5} {'idades':>6} {'linhas':>12} {'mínimo (s)':>10} {'mediana (s)':>10}")
+    resultados = []
+    with tempfile.TemporaryDirectory(prefix='benchmark_planilhas_') as pasta_planilhas:
+        with ExitStack() as pilha:
+            banco = None
+            if not args.sem_banco:
+                try:
+                    banco = pilha.enter_context(esquema_descartavel())
+                except psycopg2.Error as e:
+                    print(f'PostgreSQL indisponível, cargas não medidas: {e}')
+            for localidades in args.localidades:
+                resultados += executar_escala(localidades, anos, args.idades, args.repeticoes, banco, pasta_planilhas)
+        if not args.sem_graficos:
+            resultados += executar_graficos(anos, args.idades, args.workers, pasta_planilhas)
+
+    execucao = {
+        'versao': VERSAO_FORMATO,
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit_atual(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'processadores': os.cpu_count(),
+        'parametros': {chave: valor for chave, valor in vars(args).items() if chave not in ('saida', 'comparar')},
+        'resultados': resultados,
+    }
+    os.makedirs(args.saida, exist_ok=True)
+    destino = os.path.join(args.saida, f"{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(destino, 'w', encoding='utf-8') as f:
+        json.dump(execucao, f, indent=2)
+    print(f'\nResultados salvos em {destino}')
+
+    if referencia:
+        with open(referencia, encoding='utf-8') as f:
+            regressoes = comparar(execucao, json.load(f), args.limiar)
+        if regressoes:
+            print(f'{len(regressoes)} etapa(s) mais lenta(s) que o limite de {args.limiar:.0%}.')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
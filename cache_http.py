@@ -0,0 +1,175 @@
+"""
+Cache HTTP em disco, endereçado por conteúdo, para as fontes de dados do IBGE.
+
+Os corpos das respostas ficam em `objetos/<sha256>` e um índice JSON associa cada
+URL ao seu objeto e aos validadores `ETag`/`Last-Modified`. Dentro do TTL a rede
+não é acessada; depois dele, a entrada é revalidada com uma requisição
+condicional e uma resposta 304 reaproveita o objeto já salvo.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+
+from download import baixar_arquivo
+
+CACHE_HTTP_DIR = os.getenv('CACHE_HTTP_DIR', 'data/cache_http')
+# Tempo, em segundos, em que uma entrada é usada sem revalidação
+CACHE_HTTP_TTL = int(os.getenv('CACHE_HTTP_TTL', str(24 * 60 * 60)))
+# Tamanho máximo, em bytes, ocupado pelos objetos do cache
+CACHE_HTTP_TAMANHO_MAXIMO = int(os.getenv('CACHE_HTTP_TAMANHO_MAXIMO', str(512 * 1024 * 1024)))
+
+
+class CacheHTTP:
+    """
+    Cache HTTP em disco com revalidação condicional, TTL e limite de tamanho.
+
+    Parâmetros:
+        diretorio (str): Diretório do cache (padrão `data/cache_http`).
+        ttl (int): Segundos em que uma entrada é considerada válida sem consultar o servidor.
+        tamanho_maximo (int): Tamanho máximo, em bytes, dos objetos armazenados.
+        sessao (requests.Session): Sessão HTTP reutilizada em todas as requisições.
+
+    Funcionalidade:
+        - Dentro do TTL, entrega o conteúdo salvo sem acessar a rede.
+        - Após o TTL, envia `If-None-Match`/`If-Modified-Since`; em caso de 304 reaproveita o objeto,
+          ou baixa o conteúdo de novo se a entrada tiver sido despejada durante a revalidação.
+        - Atende uma chamada por URL de cada vez; URLs diferentes são baixadas em paralelo.
+        - Baixa os corpos em fluxo com `download.baixar_arquivo` e armazena cada um pelo seu hash SHA-256,
+          de modo que conteúdos iguais são salvos uma única vez.
+        - Remove as entradas acessadas há mais tempo quando o limite de tamanho é ultrapassado.
+
+    Exceções:
+        - `requests.HTTPError` para respostas de erro do servidor; nada é gravado no cache nesse caso.
+        - Erros de conexão que persistirem após as tentativas de `download.baixar_arquivo`; o download
+          parcial é retomado na próxima chamada.
+        - `requests.HTTPError` se o servidor responder 304 a uma requisição sem validadores.
+    """
+
+    def __init__(self, diretorio=CACHE_HTTP_DIR, ttl=CACHE_HTTP_TTL, tamanho_maximo=CACHE_HTTP_TAMANHO_MAXIMO,
+                 sessao=None):
+        self.diretorio = diretorio
+        self.ttl = ttl
+        self.tamanho_maximo = tamanho_maximo
+        self.sessao = sessao or requests.Session()
+        self._dir_objetos = os.path.join(diretorio, 'objetos')
+        self._caminho_indice = os.path.join(diretorio, 'indice.json')
+        self._trava = threading.Lock()
+        self._travas_url = {}
+        os.makedirs(self._dir_objetos, exist_ok=True)
+        self._indice = self._ler_indice()
+
+    def obter_caminho(self, url):
+        """
+        Retorna o caminho local do conteúdo de `url`, baixando ou revalidando quando necessário.
+
+        Retorno:
+            str: Caminho do objeto no cache (`objetos/<sha256>`).
+        """
+        # Uma chamada por URL de cada vez: quem espera encontra a entrada já revalidada, e o
+        # arquivo de download da URL, retomado entre chamadas, nunca é gravado por duas threads
+        with self._trava_url(url):
+            agora = time.time()
+            with self._trava:
+                entrada = self._entrada_valida(url)
+                if entrada is not None and agora - entrada['validado_em'] < self.ttl:
+                    entrada['acessado_em'] = agora
+                    self._salvar_indice()
+                    return self._caminho_objeto(entrada['sha256'])
+                entrada = dict(entrada) if entrada is not None else None
+
+            cabecalhos = {}
+            if entrada is not None:
+                if entrada.get('etag'):
+                    cabecalhos['If-None-Match'] = entrada['etag']
+                if entrada.get('last_modified'):
+                    cabecalhos['If-Modified-Since'] = entrada['last_modified']
+
+            # A rede é acessada fora da trava do índice para não serializar downloads de URLs diferentes;
+            # um download interrompido é retomado na próxima chamada para a mesma URL
+            destino = os.path.join(self._dir_objetos, 'download_' + hashlib.sha256(url.encode()).hexdigest())
+            resultado = baixar_arquivo(url, destino, sessao=self.sessao, cabecalhos=cabecalhos)
+            if not resultado.modificado:
+                # Durante o download a entrada pode ter sido despejada por outra URL
+                with self._trava:
+                    atual = self._entrada_valida(url)
+                    if atual is not None and entrada is not None and atual['sha256'] == entrada['sha256']:
+                        atual['validado_em'] = atual['acessado_em'] = agora
+                        self._salvar_indice()
+                        return self._caminho_objeto(atual['sha256'])
+                resultado = baixar_arquivo(url, destino, sessao=self.sessao)
+                if not resultado.modificado:
+                    raise requests.HTTPError(f'{url}: resposta 304 a uma requisição sem validadores')
+
+            sha256 = resultado.sha256
+            os.replace(destino, self._caminho_objeto(sha256))
+            entrada = {
+                'sha256': sha256,
+                'tamanho': resultado.tamanho,
+                'etag': resultado.etag,
+                'last_modified': resultado.last_modified,
+                'validado_em': agora,
+                'acessado_em': agora,
+            }
+            with self._trava:
+                self._indice[url] = entrada
+                self._despejar(preservar=url)
+                self._salvar_indice()
+            return self._caminho_objeto(sha256)
+
+    def obter_bytes(self, url):
+        """Retorna o conteúdo de `url` em bytes, a partir do cache sempre que possível."""
+        with open(self.obter_caminho(url), 'rb') as f:
+            return f.read()
+
+    def obter_json(self, url):
+        """Retorna o conteúdo de `url` decodificado como JSON."""
+        return json.loads(self.obter_bytes(url))
+
+    def _trava_url(self, url):
+        with self._trava:
+            return self._travas_url.setdefault(url, threading.Lock())
+
+    def _entrada_valida(self, url):
+        # Entrada do índice cujo objeto ainda existe em disco; chamada com `_trava` adquirida
+        entrada = self._indice.get(url)
+        if entrada is not None and not os.path.exists(self._caminho_objeto(entrada['sha256'])):
+            return None
+        return entrada
+
+    def _caminho_objeto(self, sha256):
+        return os.path.join(self._dir_objetos, sha256)
+
+    def _despejar(self, preservar):
+        # Remove as entradas menos acessadas até respeitar o limite de tamanho
+        tamanhos = {entrada['sha256']: entrada['tamanho'] for entrada in self._indice.values()}
+        total = sum(tamanhos.values())
+        por_acesso = sorted(self._indice.items(), key=lambda item: item[1]['acessado_em'])
+        for url, entrada in por_acesso:
+            if total <= self.tamanho_maximo:
+                break
+            if url == preservar:
+                continue
+            del self._indice[url]
+            if all(outra['sha256'] != entrada['sha256'] for outra in self._indice.values()):
+                total -= tamanhos[entrada['sha256']]
+                try:
+                    os.unlink(self._caminho_objeto(entrada['sha256']))
+                except FileNotFoundError:
+                    pass
+
+    def _ler_indice(self):
+        try:
+            with open(self._caminho_indice, encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _salvar_indice(self):
+        temporario = f'{self._caminho_indice}.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(self._indice, f, indent=2)
+        os.replace(temporario, self._caminho_indice)
@@ -0,0 +1,169 @@
+"""
+Carga em massa de DataFrames no banco de dados PostgreSQL.
+
+Os dados são enviados em fluxo com `COPY FROM STDIN` para uma tabela temporária
+de staging e, em seguida, mesclados na tabela de destino com um único
+`INSERT ... SELECT ... ON CONFLICT DO UPDATE`, evitando uma ida e volta ao banco
+por linha.
+"""
+import io
+from collections import namedtuple
+
+from psycopg2 import sql
+
+from banco import NIVEL_ESTADO
+
+ResultadoCarga = namedtuple('ResultadoCarga', ['inseridos', 'atualizados'])
+
+LINHAS_POR_BLOCO = 50_000
+TAMANHO_LEITURA_COPY = 1 << 20
+
+
+class _FluxoCSV:
+    """
+    Objeto do tipo arquivo que serializa um DataFrame em CSV sob demanda.
+
+    Funcionalidade:
+        - Converte o DataFrame em blocos de `linhas_por_bloco` linhas, apenas quando o
+          `COPY` solicita mais dados, mantendo o uso de memória limitado a um bloco.
+        - Valores nulos são escritos como campo vazio, interpretado como NULL pelo `COPY`.
+    """
+
+    def __init__(self, df, linhas_por_bloco):
+        self._blocos = (
+            df.iloc[inicio:inicio + linhas_por_bloco].to_csv(header=False, index=False)
+            for inicio in range(0, len(df), linhas_por_bloco)
+        )
+        self._atual = io.StringIO()
+
+    def read(self, size=-1):
+        partes = []
+        restante = size
+        while size < 0 or restante > 0:
+            dados = self._atual.read(restante if size >= 0 else -1)
+            if not dados:
+                bloco = next(self._blocos, None)
+                if bloco is None:
+                    break
+                self._atual = io.StringIO(bloco)
+                continue
+            partes.append(dados)
+            if size >= 0:
+                restante -= len(dados)
+        return ''.join(partes)
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+def carregar_dataframe(cursor, tabela, df, colunas, chave, linhas_por_bloco=LINHAS_POR_BLOCO, constantes=None,
+                       ordenar_por=()):
+    """
+    Carrega um DataFrame em uma tabela do PostgreSQL usando `COPY` e merge em lote.
+
+    Parâmetros:
+        cursor (psycopg2.extensions.cursor): Cursor de uma conexão aberta. O commit fica a cargo de quem chama.
+        tabela (str): Nome da tabela de destino.
+        df (pd.DataFrame): Dados a serem carregados.
+        colunas (dict): Mapeamento entre as colunas do DataFrame e as colunas da tabela,
+                        por exemplo `{'SIGLA': 'sigla', 'ANO': 'ano', 'VALOR': 'valor'}`.
+        chave (tuple): Colunas da tabela que formam a chave primária usada no `ON CONFLICT`.
+        linhas_por_bloco (int): Quantidade de linhas serializadas por vez durante o `COPY`.
+        constantes (dict, opcional): Colunas da tabela com o mesmo valor em todas as linhas (por exemplo
+                                     `{'indicador': 'pib'}`), preenchidas no merge sem passar pelo `COPY`.
+        ordenar_por (tuple): Colunas da tabela pelas quais as linhas são inseridas, para manter a ordem
+                             física usada por índices BRIN.
+
+    Funcionalidade:
+        - Cria uma tabela temporária de staging com os tipos das colunas carregadas da tabela de destino.
+        - Envia os dados em fluxo com `COPY ... FROM STDIN` no formato CSV.
+        - Mescla o staging na tabela de destino com um único `INSERT ... SELECT ... ON CONFLICT DO UPDATE`.
+        - Remove a tabela de staging ao final.
+
+    Retorno:
+        ResultadoCarga: Tupla nomeada com a quantidade de linhas inseridas e atualizadas.
+
+    Exceções:
+        - Erros do banco são propagados; a transação deve ser desfeita por quem chama.
+    """
+    constantes = constantes or {}
+    colunas_df = list(colunas.keys())
+    colunas_tabela = [colunas[coluna] for coluna in colunas_df]
+    colunas_atualizadas = [coluna for coluna in colunas_tabela if coluna not in chave]
+    staging = f'_staging_{tabela}'
+
+    identificadores = sql.SQL(', ').join(map(sql.Identifier, colunas_tabela))
+
+    # Tabela temporária apenas com as colunas carregadas, com os tipos do destino
+    cursor.execute(sql.SQL("CREATE TEMP TABLE {staging} AS SELECT {colunas} FROM {tabela} WITH NO DATA").format(
+        staging=sql.Identifier(staging),
+        colunas=identificadores,
+        tabela=sql.Identifier(tabela),
+    ))
+
+    # Envio dos dados em fluxo para o staging
+    copy = sql.SQL("COPY {staging} ({colunas}) FROM STDIN WITH (FORMAT csv)").format(
+        staging=sql.Identifier(staging),
+        colunas=identificadores,
+    )
+    cursor.copy_expert(copy.as_string(cursor), _FluxoCSV(df[colunas_df], linhas_por_bloco),
+                       size=TAMANHO_LEITURA_COPY)
+
+    # Merge em lote; xmax = 0 identifica as linhas recém-inseridas
+    cursor.execute(sql.SQL("""
+        WITH mesclagem AS (
+            INSERT INTO {tabela} ({colunas_destino})
+            SELECT {valores} FROM {staging}{ordem}
+            ON CONFLICT ({chave}) DO UPDATE
+            SET {atualizacoes}
+            RETURNING (xmax = 0) AS inserido
+        )
+        SELECT count(*) FILTER (WHERE inserido), count(*) FILTER (WHERE NOT inserido)
+        FROM mesclagem;
+    """).format(
+        tabela=sql.Identifier(tabela),
+        colunas_destino=sql.SQL(', ').join(map(sql.Identifier, [*colunas_tabela, *constantes])),
+        valores=sql.SQL(', ').join([identificadores, *map(sql.Literal, constantes.values())]),
+        staging=sql.Identifier(staging),
+        ordem=sql.SQL(' ORDER BY {}').format(sql.SQL(', ').join(map(sql.Identifier, ordenar_por)))
+        if ordenar_por else sql.SQL(''),
+        chave=sql.SQL(', ').join(map(sql.Identifier, chave)),
+        atualizacoes=sql.SQL(', ').join(
+            sql.SQL("{coluna} = EXCLUDED.{coluna}").format(coluna=sql.Identifier(coluna))
+            for coluna in colunas_atualizadas
+        ),
+    ))
+    inseridos, atualizados = cursor.fetchone()
+
+    cursor.execute(sql.SQL("DROP TABLE {staging}").format(staging=sql.Identifier(staging)))
+    return ResultadoCarga(inseridos, atualizados)
+
+
+def carregar_indicador(cursor, indicador, df, coluna_valor='VALOR', nivel_territorial=NIVEL_ESTADO,
+                       coluna_localidade='SIGLA'):
+    """
+    Carrega uma série de um indicador em `fato_indicador`.
+
+    Parâmetros:
+        cursor (psycopg2.extensions.cursor): Cursor de uma conexão aberta. O commit fica a cargo de quem chama.
+        indicador (str): Nome do indicador (por exemplo 'pib'); define a partição de destino.
+        df (pd.DataFrame): Dados com as colunas `coluna_localidade`, 'ANO' e `coluna_valor`.
+        coluna_valor (str): Coluna do DataFrame com o valor.
+        nivel_territorial (str): `NIVEL_ESTADO` ou `NIVEL_MUNICIPIO` (módulo `banco`).
+        coluna_localidade (str): Coluna do DataFrame com a localidade ('SIGLA' nos estados,
+                                 'LOCALIDADE' nos municípios).
+
+    Funcionalidade:
+        - Indicador e nível territorial não passam pelo `COPY`: são preenchidos no merge.
+        - As linhas são inseridas em ordem de ano, o que mantém o índice BRIN em `ano` seletivo.
+
+    Retorno:
+        ResultadoCarga: Tupla nomeada com a quantidade de linhas inseridas e atualizadas.
+    """
+    return carregar_dataframe(
+        cursor, 'fato_indicador', df,
+        colunas={coluna_localidade: 'localidade', 'ANO': 'ano', coluna_valor: 'valor'},
+        chave=('indicador', 'nivel_territorial', 'localidade', 'ano'),
+        constantes={'indicador': indicador, 'nivel_territorial': nivel_territorial},
+        ordenar_por=('ano',),
+    )
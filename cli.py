@@ -0,0 +1,259 @@
+"""
+Linha de comando do pipeline, com um subcomando por etapa.
+
+    python cli.py extract   [--fonte pib populacao] [--ano-inicio A] [--ano-fim B] [--nivel N3|N6]
+    python cli.py transform [--fonte pib populacao pib_per_capta] [--ano-inicio A] [--ano-fim B] [--nivel N3|N6]
+    python cli.py load      [--fonte pib populacao pib_per_capta] [--ano-inicio A] [--ano-fim B] [--nivel N3|N6]
+    python cli.py forecast  [--modelo M] [--horizonte N] [--sem-banco] [--ano-inicio A] [--ano-fim B]
+    python cli.py plot      [--fonte pib populacao pib_per_capta] [--ano-inicio A] [--ano-fim B] [--workers N]
+    python cli.py run       [--incremental] [--nivel N3|N6]
+
+Os subcomandos trocam dados pelo cache HTTP (`extract`) e pelo armazém colunar
+(`transform` e `forecast`), de modo que cada etapa pode ser refeita sozinha. As
+bibliotecas pesadas são importadas apenas dentro dos subcomandos que as usam:
+só `plot` e `run` carregam o matplotlib e o seaborn.
+
+Com `--nivel N6`, a fonte `pib` de `extract`, `transform` e `load` é o PIB dos
+municípios, guardado na etapa `pib_municipios` do armazém; o PIB per capita
+continua calculado a partir da etapa `pib`, dos estados.
+"""
+import argparse
+import sys
+from functools import partial
+
+from instrumentacao import Instrumentacao
+
+FONTES_EXTRACAO = ('pib', 'populacao')
+FONTES = ('pib', 'populacao', 'pib_per_capta')
+NIVEIS_PIB = ('N3', 'N6')
+
+
+def extrair(args):
+    """Baixa as fontes selecionadas para o cache HTTP."""
+    from cache_http import CacheHTTP
+    from main import ULTIMOS_ANOS, obtem_dados_populacao
+
+    anos = _anos(args, ULTIMOS_ANOS)
+    nivel = _nivel(args)
+    cache = CacheHTTP()
+    with Instrumentacao() as instrumentacao:
+        if 'pib' in args.fonte:
+            series = instrumentacao.medir('data_pib', _contar_series_pib, cache, anos, nivel)
+            print(f'PIB ({nivel}): {series} séries de {anos[0]} a {anos[-1]} no cache')
+        if 'populacao' in args.fonte:
+            caminho = instrumentacao.medir('path_pop', partial(obtem_dados_populacao, cache))
+            print(f'População: {caminho}')
+
+
+def transformar(args):
+    """Transforma as fontes selecionadas (a partir do cache HTTP) e salva o resultado no armazém."""
+    from armazem import salvar_etapa
+    from cache_http import CacheHTTP
+    from main import (ULTIMOS_ANOS, calcular_pib_per_capta, obtem_dados_populacao, obter_dados_pib,
+                      transformar_dados_pib, transformar_dados_populacao)
+
+    anos = _anos(args, ULTIMOS_ANOS)
+    nivel = _nivel(args)
+    # Com um intervalo parcial, as partições dos outros anos são mantidas
+    substituir = anos == ULTIMOS_ANOS
+    cache = CacheHTTP()
+    tabelas = {}
+    with Instrumentacao() as instrumentacao:
+        if 'pib' in args.fonte:
+            data_pib = instrumentacao.medir('data_pib', partial(obter_dados_pib, cache, anos, nivel=nivel))
+            tabelas[_etapa_pib(nivel)] = instrumentacao.medir('df_pib', partial(transformar_dados_pib, nivel=nivel),
+                                                              data_pib)
+        if 'populacao' in args.fonte:
+            path_pop = instrumentacao.medir('path_pop', partial(obtem_dados_populacao, cache))
+            df_pop = instrumentacao.medir('df_pop', transformar_dados_populacao, path_pop)
+            tabelas['populacao'] = df_pop[df_pop['ANO'].isin(anos)]
+        if 'pib_per_capta' in args.fonte:
+            df_pib = tabelas['pib'] if 'pib' in tabelas else _ler_armazem('pib', anos)
+            df_pop = tabelas['populacao'] if 'populacao' in tabelas else _ler_armazem('populacao', anos)
+            tabelas['pib_per_capta'] = instrumentacao.medir('tabela_pib_per_capta', calcular_pib_per_capta,
+                                                            df_pib, df_pop)
+        for nome, df in tabelas.items():
+            gravados = instrumentacao.medir(f'armazem_{nome}', partial(salvar_etapa, nome, substituir=substituir), df)
+            print(f'{nome}: {len(df)} linhas em {len(gravados)} partições anuais')
+
+
+def carregar(args):
+    """Carrega no banco, em uma transação, as fontes selecionadas lidas do armazém."""
+    from banco import SessaoBanco
+    from incremental import carregar_com_marcas
+    from main import (ULTIMOS_ANOS, carrega_dados_pib_per_capta, carrega_dados_populacao, carregar_dados_pib,
+                      carregar_dados_pib_municipios)
+
+    # PIB e população registram as marcas d'água, como na carga completa de `main.py`
+    carregadores = {
+        'pib': partial(carregar_com_marcas, 'pib', carregar_dados_pib),
+        'pib_municipios': carregar_dados_pib_municipios,
+        'populacao': partial(carregar_com_marcas, 'populacao', carrega_dados_populacao),
+        'pib_per_capta': carrega_dados_pib_per_capta,
+    }
+    anos = _anos(args, ULTIMOS_ANOS)
+    etapas = [_etapa_pib(_nivel(args)) if fonte == 'pib' else fonte for fonte in args.fonte]
+    with Instrumentacao() as instrumentacao:
+        tabelas = {etapa: _ler_armazem(etapa, anos) for etapa in etapas}
+        with SessaoBanco() as banco, banco.transacao() as transacao:
+            for fonte, df in tabelas.items():
+                depende_de = tuple(entrada for entrada in ('pib', 'populacao')
+                                   if fonte == 'pib_per_capta' and entrada in tabelas)
+                instrumentacao.medir(f'carga_{fonte}', partial(transacao.executar_etapa, fonte, carregadores[fonte],
+                                                               depende_de=depende_de), df)
+
+
+def prever_pib_per_capta(args):
+    """Calcula as previsões a partir do PIB per capita do armazém, salva-as no armazém e as carrega no banco."""
+    from armazem import salvar_etapa
+    from main import ULTIMOS_ANOS
+    from previsao import prever
+
+    anos = _anos(args, ULTIMOS_ANOS)
+    opcoes = {chave: valor for chave, valor in (('modelo', args.modelo), ('horizonte', args.horizonte))
+              if valor is not None}
+    with Instrumentacao() as instrumentacao:
+        tabela = _ler_armazem('pib_per_capta', anos)
+        previsao = instrumentacao.medir('previsao', partial(prever, **opcoes), tabela)
+        instrumentacao.medir('armazem_previsao', partial(salvar_etapa, 'previsao_pib_per_capta'), previsao.previsoes)
+        print(f'Previsão: {len(previsao.previsoes)} valores')
+        if not args.sem_banco:
+            from banco import SessaoBanco
+            from main import carrega_previsao_pib_per_capta
+
+            with SessaoBanco() as banco, banco.transacao() as transacao:
+                instrumentacao.medir('carga_previsao', partial(transacao.executar_etapa, 'previsao',
+                                                               carrega_previsao_pib_per_capta), previsao.previsoes)
+
+
+def plotar(args):
+    """
+    Gera os gráficos das fontes selecionadas a partir do armazém.
+
+    O intervalo de anos seleciona os gráficos por ano de PIB e população; os gráficos comparativos
+    e os de previsão usam a série inteira, e gráficos cujos dados não mudaram não são gerados de novo.
+    """
+    from main import ULTIMOS_ANOS, plotar_graficos_pib, plotar_graficos_pib_per_capta, plotar_graficos_populacao
+    from previsao import prever
+
+    anos = _anos(args, ULTIMOS_ANOS)
+    with Instrumentacao() as instrumentacao:
+        if 'pib' in args.fonte:
+            gerados = instrumentacao.medir('graficos_pib', partial(plotar_graficos_pib, workers=args.workers, anos=anos),
+                                           _ler_armazem('pib'))
+            print(f'PIB: {gerados} gráficos gerados')
+        if 'populacao' in args.fonte:
+            gerados = instrumentacao.medir('graficos_pop', partial(plotar_graficos_populacao, workers=args.workers,
+                                                                   anos=anos), _ler_armazem('populacao'))
+            print(f'População: {gerados} gráficos gerados')
+        if 'pib_per_capta' in args.fonte:
+            tabela = _ler_armazem('pib_per_capta')
+            previsao = instrumentacao.medir('previsao', prever, tabela)
+            gerados = instrumentacao.medir('graficos_pib_per_capta',
+                                           partial(plotar_graficos_pib_per_capta, workers=args.workers),
+                                           tabela, previsao)
+            print(f'PIB per capita: {gerados} gráficos gerados')
+
+
+def executar(args):
+    """Executa o pipeline completo (ou incremental), como `python main.py`."""
+    import main
+
+    main.main(incremental=args.incremental or main.ETL_INCREMENTAL, nivel=_nivel(args))
+
+
+def _contar_series_pib(cache, anos, nivel):
+    from main import obter_dados_pib
+
+    dados = obter_dados_pib(cache, anos, nivel=nivel)
+    # No nível N6 os blocos chegam em fluxo: consumi-los é o que os grava no cache
+    return sum(len(bloco) for bloco in dados) if nivel == 'N6' else len(dados)
+
+
+def _etapa_pib(nivel):
+    # O PIB municipal fica em uma etapa própria do armazém, ao lado do PIB dos estados
+    return 'pib_municipios' if nivel == 'N6' else 'pib'
+
+
+def _nivel(args):
+    from main import PIB_NIVEL
+
+    return args.nivel or PIB_NIVEL
+
+
+def _ler_armazem(nome, anos=None):
+    from armazem import ler_etapa
+    from esquema import compactar
+
+    return compactar(ler_etapa(nome, anos))
+
+
+def _anos(args, ultimos_anos):
+    inicio = args.ano_inicio if args.ano_inicio is not None else ultimos_anos[0]
+    fim = args.ano_fim if args.ano_fim is not None else ultimos_anos[-1]
+    if inicio > fim:
+        raise SystemExit(f'Intervalo de anos inválido: {inicio} > {fim}')
+    anos = list(range(inicio, fim + 1))
+    return ultimos_anos if anos == ultimos_anos else anos
+
+
+def criar_parser():
+    """Monta o `argparse.ArgumentParser` com os subcomandos."""
+    intervalo = argparse.ArgumentParser(add_help=False)
+    intervalo.add_argument('--ano-inicio', type=int, help='Primeiro ano (padrão: início de ULTIMOS_ANOS).')
+    intervalo.add_argument('--ano-fim', type=int, help='Último ano (padrão: ano atual).')
+    territorio = argparse.ArgumentParser(add_help=False)
+    territorio.add_argument('--nivel', choices=NIVEIS_PIB,
+                            help='Nível do PIB: N3 (estados) ou N6 (municípios) (padrão: PIB_NIVEL).')
+
+    parser = argparse.ArgumentParser(prog='cli.py', description='Pipeline de PIB e população do IBGE.')
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    extract = subcomandos.add_parser('extract', parents=[intervalo, territorio],
+                                     help='Baixa as fontes para o cache HTTP.')
+    extract.add_argument('--fonte', nargs='+', choices=FONTES_EXTRACAO, default=list(FONTES_EXTRACAO))
+    extract.set_defaults(funcao=extrair)
+
+    transform = subcomandos.add_parser('transform', parents=[intervalo, territorio],
+                                       help='Transforma e salva no armazém.')
+    transform.add_argument('--fonte', nargs='+', choices=FONTES, default=list(FONTES))
+    transform.set_defaults(funcao=transformar)
+
+    load = subcomandos.add_parser('load', parents=[intervalo, territorio],
+                                  help='Carrega no banco a partir do armazém.')
+    load.add_argument('--fonte', nargs='+', choices=FONTES, default=list(FONTES))
+    load.set_defaults(funcao=carregar)
+
+    forecast = subcomandos.add_parser('forecast', parents=[intervalo], help='Prevê o PIB per capita.')
+    forecast.add_argument('--modelo', help='linear, log_linear ou ponderado (padrão: PREVISAO_MODELO).')
+    forecast.add_argument('--horizonte', type=int, help='Anos previstos (padrão: PREVISAO_HORIZONTE).')
+    forecast.add_argument('--sem-banco', action='store_true', help='Apenas salva as previsões no armazém.')
+    forecast.set_defaults(funcao=prever_pib_per_capta)
+
+    plot = subcomandos.add_parser('plot', parents=[intervalo], help='Gera os gráficos a partir do armazém.')
+    plot.add_argument('--fonte', nargs='+', choices=FONTES, default=list(FONTES))
+    plot.add_argument('--workers', type=int, help='Processos usados nos gráficos (padrão: PLOT_WORKERS).')
+    plot.set_defaults(funcao=plotar)
+
+    run = subcomandos.add_parser('run', parents=[territorio], help='Executa o pipeline completo.')
+    run.add_argument('--incremental', action='store_true', help='Modo incremental (como ETL_INCREMENTAL=1).')
+    run.set_defaults(funcao=executar)
+    return parser
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    # Todos os subcomandos já carregam o armazém (o `main` o importa); `--help` não chega aqui
+    from armazem import EtapaAusente
+
+    try:
+        args.funcao(args)
+    except EtapaAusente as e:
+        # Etapa ainda não salva no armazém; outros arquivos ausentes são erros e seguem com o traceback
+        print(f'{e}. Execute `transform` antes.', file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Download em fluxo e retomável de arquivos grandes.
+
+O corpo da resposta é gravado em blocos de tamanho fixo em `<destino>.parcial` e
+só é renomeado para o destino, de forma atômica, depois de conferidos tamanho e
+hash. Se o download for interrompido, a próxima tentativa continua do ponto em
+que parou com um cabeçalho `Range`.
+"""
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+
+import requests
+
+from instrumentacao import registrar_bytes_baixados
+
+TAMANHO_BLOCO = 1 << 20
+TENTATIVAS = 3
+TIMEOUT = (10, 60)
+
+ResultadoDownload = namedtuple('ResultadoDownload', ['caminho', 'tamanho', 'sha256', 'etag', 'last_modified', 'modificado'])
+
+_ERROS_TRANSITORIOS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.Timeout,
+)
+_CABECALHOS_CONDICIONAIS = ('If-None-Match', 'If-Modified-Since')
+
+
+class ErroDownload(Exception):
+    """O arquivo baixado não confere com o tamanho ou o hash esperado."""
+
+
+def baixar_arquivo(url, destino, sessao=None, cabecalhos=None, tamanho_esperado=None, sha256_esperado=None,
+                   tamanho_bloco=TAMANHO_BLOCO, tentativas=TENTATIVAS):
+    """
+    Baixa `url` para `destino` em fluxo, retomando downloads interrompidos.
+
+    Parâmetros:
+        url (str): Endereço do arquivo.
+        destino (str): Caminho final do arquivo.
+        sessao (requests.Session, opcional): Sessão HTTP reutilizada nas requisições.
+        cabecalhos (dict, opcional): Cabeçalhos extras, como `If-None-Match` para requisições condicionais.
+        tamanho_esperado (int, opcional): Tamanho em bytes que o arquivo deve ter.
+        sha256_esperado (str, opcional): Hash SHA-256 (hexadecimal) que o arquivo deve ter.
+        tamanho_bloco (int): Tamanho dos blocos lidos da rede e gravados em disco.
+        tentativas (int): Número de tentativas em caso de falha de conexão.
+
+    Funcionalidade:
+        - Grava a resposta em blocos em `<destino>.parcial`, mantendo o uso de memória constante.
+        - Se já existe um arquivo parcial, pede apenas o restante com `Range` e `If-Range`;
+          se o servidor devolver o arquivo inteiro, o parcial é descartado.
+        - Em falhas de conexão, tenta novamente a partir do último byte gravado, com espera exponencial.
+        - Confere o tamanho anunciado pelo servidor, o tamanho esperado e o hash antes de renomear
+          o arquivo para o destino com `os.replace`.
+        - Uma resposta 304 a uma requisição condicional não altera o destino.
+
+    Retorno:
+        ResultadoDownload: Caminho, tamanho, hash SHA-256, validadores do servidor e se o conteúdo foi baixado
+                           (`modificado=False` em caso de 304).
+
+    Exceções:
+        - `requests.HTTPError` para respostas de erro do servidor.
+        - `ErroDownload` se o tamanho ou o hash não conferirem; o arquivo parcial é removido.
+    """
+    sessao = sessao or requests.Session()
+    parcial = f'{destino}.parcial'
+    metadados_parcial = f'{parcial}.json'
+    diretorio = os.path.dirname(destino)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+
+    for tentativa in range(tentativas):
+        try:
+            resultado = _baixar(url, parcial, metadados_parcial, sessao, dict(cabecalhos or {}), tamanho_bloco)
+            break
+        except _ERROS_TRANSITORIOS:
+            if tentativa == tentativas - 1:
+                raise
+            time.sleep(2 ** tentativa)
+
+    if not resultado.modificado:
+        return resultado
+
+    try:
+        if tamanho_esperado is not None and resultado.tamanho != tamanho_esperado:
+            raise ErroDownload(f'{url}: tamanho {resultado.tamanho} difere do esperado {tamanho_esperado}')
+        if sha256_esperado is not None and resultado.sha256 != sha256_esperado.lower():
+            raise ErroDownload(f'{url}: hash {resultado.sha256} difere do esperado {sha256_esperado}')
+    except ErroDownload:
+        _remover(parcial, metadados_parcial)
+        raise
+
+    os.replace(parcial, destino)
+    _remover(metadados_parcial)
+    return resultado._replace(caminho=destino)
+
+
+def _baixar(url, parcial, metadados_parcial, sessao, cabecalhos, tamanho_bloco):
+    metadados = _ler_metadados(metadados_parcial)
+    inicio = os.path.getsize(parcial) if os.path.exists(parcial) else 0
+    if metadados.get('codificado'):
+        # O parcial guarda bytes já descomprimidos, que não correspondem aos offsets do Range
+        inicio = 0
+    if inicio:
+        # Retomada: uma resposta 304 seria ambígua, então os cabeçalhos condicionais dão lugar ao If-Range
+        for cabecalho in _CABECALHOS_CONDICIONAIS:
+            cabecalhos.pop(cabecalho, None)
+        cabecalhos['Range'] = f'bytes={inicio}-'
+        cabecalhos['Accept-Encoding'] = 'identity'
+        validador = metadados.get('etag') or metadados.get('last_modified')
+        if validador:
+            cabecalhos['If-Range'] = validador
+
+    with sessao.get(url, headers=cabecalhos, stream=True, timeout=TIMEOUT) as response:
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status_code == 304:
+            return ResultadoDownload(None, None, None, etag, last_modified, False)
+        if response.status_code == 416 and inicio:
+            # O parcial já contém o arquivo inteiro
+            tamanho_total = inicio
+            response_iter = iter(())
+        else:
+            response.raise_for_status()
+            if response.status_code != 206:
+                inicio = 0
+            tamanho_total = _tamanho_total(response, inicio)
+            response_iter = response.iter_content(chunk_size=tamanho_bloco)
+            with open(metadados_parcial, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'etag': etag,
+                    'last_modified': last_modified,
+                    'codificado': response.headers.get('Content-Encoding', 'identity') != 'identity',
+                }, f)
+
+        sha256 = _hash_parcial(parcial, inicio, tamanho_bloco)
+        tamanho = inicio
+        with open(parcial, 'r+b' if inicio else 'wb') as f:
+            f.seek(inicio)
+            f.truncate()
+            for bloco in response_iter:
+                f.write(bloco)
+                sha256.update(bloco)
+                tamanho += len(bloco)
+                registrar_bytes_baixados(len(bloco))
+
+    if tamanho_total is not None and tamanho != tamanho_total:
+        # Conexão encerrada antes do fim: o parcial é mantido para a próxima tentativa
+        raise requests.exceptions.ChunkedEncodingError(f'{url}: recebidos {tamanho} de {tamanho_total} bytes')
+    return ResultadoDownload(parcial, tamanho, sha256.hexdigest(), etag, last_modified, True)
+
+
+def _tamanho_total(response, inicio):
+    # Content-Range: bytes 100-199/200
+    intervalo = response.headers.get('Content-Range')
+    if intervalo and '/' in intervalo and not intervalo.endswith('/*'):
+        return int(intervalo.rsplit('/', 1)[1])
+    tamanho = response.headers.get('Content-Length')
+    if tamanho is not None and response.headers.get('Content-Encoding', 'identity') == 'identity':
+        return inicio + int(tamanho)
+    return None
+
+
+def _hash_parcial(parcial, inicio, tamanho_bloco):
+    sha256 = hashlib.sha256()
+    if inicio:
+        with open(parcial, 'rb') as f:
+            restante = inicio
+            while restante:
+                bloco = f.read(min(tamanho_bloco, restante))
+                if not bloco:
+                    break
+                sha256.update(bloco)
+                restante -= len(bloco)
+    return sha256
+
+
+def _ler_metadados(metadados_parcial):
+    try:
+        with open(metadados_parcial, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _remover(*caminhos):
+    for caminho in caminhos:
+        try:
+            os.unlink(caminho)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,80 @@
+"""
+Representação compacta dos DataFrames longos do pipeline.
+
+- 'SIGLA' é categórica, com um dicionário fixo das siglas das UFs: cada linha
+  guarda um código de 1 byte em vez de um objeto str, e merges e agrupamentos
+  comparam códigos inteiros.
+- 'ANO' é int16.
+- Colunas inteiras (população, código do município) são reduzidas para o menor
+  tipo inteiro que comporta os valores; o PIB continua float64, pois os valores
+  (em R$ × 100) não cabem em float32 sem perda.
+
+`indexar` monta o índice ordenado (SIGLA, ANO), com o qual as fatias por estado
+são buscas no índice em vez de varreduras da coluna inteira.
+"""
+import pandas as pd
+
+from ibge import CODIGOS_UF
+
+# Dicionário fixo: a mesma categoria em todos os DataFrames permite merges e concatenações pelos códigos
+SIGLAS_UF = tuple(sorted(CODIGOS_UF.values()))
+TIPO_SIGLA = pd.CategoricalDtype(categories=SIGLAS_UF, ordered=False)
+TIPO_ANO = 'int16'
+
+
+def compactar(df, inteiros=()):
+    """
+    Converte um DataFrame longo para a representação compacta.
+
+    Parâmetros:
+        df (pd.DataFrame): DataFrame com as colunas 'SIGLA' e/ou 'ANO'.
+        inteiros (tuple): Colunas de valores inteiros a reduzir para o menor tipo inteiro possível
+                          (por exemplo 'VALOR' da população e 'LOCALIDADE').
+
+    Funcionalidade:
+        - 'SIGLA' vira categórica com `TIPO_SIGLA`; 'ANO' vira int16.
+        - Colunas de `inteiros` com valores não inteiros ou nulos são mantidas como estão.
+
+    Retorno:
+        pd.DataFrame: Novo DataFrame com os tipos compactos.
+
+    Exceções:
+        - `ValueError` se houver siglas fora de `SIGLAS_UF`.
+    """
+    tipos = {}
+    if 'SIGLA' in df.columns and df['SIGLA'].dtype != TIPO_SIGLA:
+        desconhecidas = set(df['SIGLA'].dropna().unique()) - set(SIGLAS_UF)
+        if desconhecidas:
+            raise ValueError(f"Siglas fora do dicionário de UFs: {', '.join(sorted(map(str, desconhecidas)))}")
+        tipos['SIGLA'] = TIPO_SIGLA
+    if 'ANO' in df.columns:
+        tipos['ANO'] = TIPO_ANO
+    df = df.astype(tipos)
+    for coluna in inteiros:
+        if coluna in df.columns and df[coluna].notna().all():
+            reduzida = pd.to_numeric(df[coluna], downcast='integer')
+            if pd.api.types.is_integer_dtype(reduzida):
+                df[coluna] = reduzida
+    return df
+
+
+def indexar(df):
+    """
+    Define o índice ordenado (SIGLA, ANO).
+
+    Retorno:
+        pd.DataFrame: Cópia indexada; `df.loc[sigla]` e `df.loc[(sigla, ano)]` usam busca binária no índice.
+    """
+    return df.set_index(['SIGLA', 'ANO']).sort_index()
+
+
+def relatorio_memoria(df):
+    """
+    Uso de memória de cada coluna, em bytes (contando o conteúdo dos objetos str).
+
+    Retorno:
+        pd.Series: Bytes por coluna, incluindo o índice ('Index'), e o total em 'TOTAL'.
+    """
+    uso = df.memory_usage(deep=True)
+    uso['TOTAL'] = uso.sum()
+    return uso
@@ -0,0 +1,318 @@
+"""
+Renderização dos gráficos do projeto em um pool de processos.
+
+Cada gráfico é um trabalho independente com a sua própria fatia de dados; os
+trabalhos são distribuídos entre processos que usam o backend Agg do
+matplotlib e gravam os PNGs em paralelo. Um manifesto guarda, para cada
+arquivo gerado, o hash dos dados e parâmetros usados, e gráficos cujo hash não
+mudou não são gerados de novo.
+
+Cada processo mantém um modelo de figura por tipo de gráfico (barras de um
+tamanho, previsão): a figura, os eixos, o estilo e o layout são montados uma
+vez, e cada gráfico apenas atualiza as alturas das barras, os rótulos e as
+linhas antes de salvar o PNG.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+matplotlib.use('Agg')
+
+import seaborn as sns  # noqa: E402
+from matplotlib import ticker  # noqa: E402
+from matplotlib.figure import Figure  # noqa: E402
+
+PLOT_WORKERS = int(os.getenv('PLOT_WORKERS', str(os.cpu_count() or 1)))
+GRAFICOS_MANIFESTO = os.getenv('GRAFICOS_MANIFESTO', 'output/.manifesto_graficos.json')
+# Incrementar quando a aparência dos gráficos mudar, para invalidar o manifesto
+VERSAO_GRAFICOS = 3
+# Largura ocupada pelas barras de uma categoria, dividida entre os níveis de `hue` (como no seaborn)
+LARGURA_BARRAS = 0.8
+
+TrabalhoGrafico = namedtuple('TrabalhoGrafico', ['funcao', 'caminho', 'dados', 'parametros'])
+TrabalhoGrafico.__doc__ = """
+Um gráfico a ser gerado: `funcao(dados, caminho, **parametros)`.
+
+`funcao` deve ser uma função de nível de módulo (para poder ser enviada a outro processo) e
+`dados` apenas a fatia do DataFrame usada no gráfico.
+"""
+
+
+def renderizar(trabalhos, workers=None, manifesto=GRAFICOS_MANIFESTO):
+    """
+    Gera os gráficos de `trabalhos` que estão desatualizados, em paralelo quando há mais de um worker.
+
+    Parâmetros:
+        trabalhos (list): Lista de `TrabalhoGrafico`.
+        workers (int, opcional): Quantidade de processos. Se omitido, usa `PLOT_WORKERS`
+                                 (variável de ambiente, padrão: número de núcleos).
+        manifesto (str): Arquivo JSON com o hash de cada gráfico gerado (padrão `output/.manifesto_graficos.json`).
+
+    Funcionalidade:
+        - Calcula o hash de cada trabalho (função, parâmetros e fatia de dados) e pula os gráficos
+          cujo arquivo existe e cujo hash é igual ao registrado no manifesto.
+        - Cria os diretórios de saída.
+        - Com um worker (ou um único gráfico pendente), gera os gráficos no próprio processo.
+        - Caso contrário, distribui os trabalhos em um `ProcessPoolExecutor` de processos iniciados com
+          'spawn' (não herdam threads nem conexões do processo principal) e backend Agg.
+        - Registra no manifesto cada gráfico gerado com sucesso, mesmo que outro falhe.
+
+    Retorno:
+        int: Quantidade de gráficos gerados.
+
+    Exceções:
+        - A exceção de qualquer trabalho que falhar é propagada.
+    """
+    workers = workers or PLOT_WORKERS
+    hashes = _ler_manifesto(manifesto)
+    pendentes = []
+    for trabalho in trabalhos:
+        hash_atual = hash_trabalho(trabalho)
+        if hashes.get(trabalho.caminho) != hash_atual or not os.path.exists(trabalho.caminho):
+            pendentes.append((trabalho, hash_atual))
+    if not pendentes:
+        return 0
+
+    for diretorio in {os.path.dirname(trabalho.caminho) for trabalho, _ in pendentes}:
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+
+    try:
+        if workers <= 1 or len(pendentes) <= 1:
+            for trabalho, hash_atual in pendentes:
+                _executar(trabalho)
+                hashes[trabalho.caminho] = hash_atual
+        else:
+            # 'spawn': um fork copiaria as threads e a conexão aberta do gravador do banco
+            with ProcessPoolExecutor(max_workers=min(workers, len(pendentes)),
+                                     mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_inicializar_worker) as executor:
+                futuros = {executor.submit(_executar, trabalho): (trabalho, hash_atual)
+                           for trabalho, hash_atual in pendentes}
+                for futuro in as_completed(futuros):
+                    futuro.result()
+                    trabalho, hash_atual = futuros[futuro]
+                    hashes[trabalho.caminho] = hash_atual
+    finally:
+        _salvar_manifesto(manifesto, hashes)
+    return len(pendentes)
+
+
+def hash_trabalho(trabalho):
+    """
+    Calcula o hash SHA-256 de um trabalho: função de desenho, parâmetros e conteúdo da fatia de dados.
+    """
+    sha256 = hashlib.sha256()
+    sha256.update(f'{VERSAO_GRAFICOS}:{trabalho.funcao.__module__}.{trabalho.funcao.__qualname__}'.encode())
+    sha256.update(json.dumps(trabalho.parametros, sort_keys=True, default=str).encode())
+    sha256.update(json.dumps([str(coluna) for coluna in trabalho.dados.columns]).encode())
+    sha256.update(pd.util.hash_pandas_object(trabalho.dados, index=False).to_numpy().tobytes())
+    return sha256.hexdigest()
+
+
+def desenhar_barras(dados, caminho, x, y, titulo, rotulo_x, rotulo_y, tamanho, hue=None):
+    """
+    Gera um gráfico de barras, agrupadas por `hue` quando informado, e o salva em `caminho`.
+
+    Parâmetros:
+        dados (pd.DataFrame): Fatia de dados do gráfico, já ordenada.
+        caminho (str): Arquivo PNG de saída.
+        x, y, hue (str): Colunas usadas nos eixos e na legenda.
+        titulo, rotulo_x, rotulo_y (str): Textos do gráfico.
+        tamanho (tuple): Dimensões da figura, em polegadas.
+
+    Funcionalidade:
+        - As categorias de `x` seguem a ordem das linhas e os níveis de `hue` são ordenados, como no seaborn;
+          valores repetidos de um par (x, hue) são resumidos pela média e pares ausentes ficam sem barra.
+        - Reaproveita o `ModeloBarras` do processo para o tamanho pedido.
+    """
+    categorias = pd.unique(dados[x])
+    if hue is None:
+        niveis = [None]
+        alturas = dados.groupby(x, sort=False)[y].mean().reindex(categorias).to_numpy()[np.newaxis, :]
+    else:
+        niveis = sorted(pd.unique(dados[hue]))
+        alturas = (dados.groupby([hue, x], sort=False)[y].mean().unstack(x)
+                   .reindex(index=niveis, columns=categorias).to_numpy())
+    modelo = _modelo(('barras', tuple(tamanho)), ModeloBarras, tamanho)
+    modelo.desenhar(caminho, categorias, niveis, alturas, titulo, rotulo_x, rotulo_y, titulo_legenda=hue)
+
+
+def desenhar_previsao(dados, caminho, anos_futuros, previsoes, rotulo_ajuste, rotulo_previsao, titulo):
+    """
+    Gera o gráfico de dados reais, tendência ajustada e previsão do PIB per capita de um estado.
+
+    Parâmetros:
+        dados (pd.DataFrame): Colunas 'ANO', 'PIB_PER_CAPTA' e 'AJUSTADO' (valor da tendência em cada ano).
+        caminho (str): Arquivo PNG de saída.
+        anos_futuros (list): Anos previstos.
+        previsoes (list): Valores previstos para `anos_futuros`.
+        rotulo_ajuste (str): Legenda da tendência ajustada (o modelo de previsão, ver `previsao.ROTULOS_MODELOS`).
+        rotulo_previsao (str): Legenda da linha de previsão.
+        titulo (str): Título do gráfico.
+    """
+    modelo = _modelo(('previsao',), ModeloPrevisao)
+    modelo.desenhar(caminho, dados['ANO'].to_numpy(), dados['PIB_PER_CAPTA'].to_numpy(),
+                    dados['AJUSTADO'].to_numpy(), anos_futuros, previsoes, rotulo_ajuste, rotulo_previsao, titulo)
+
+
+class ModeloBarras:
+    """
+    Figura de barras reaproveitada entre gráficos do mesmo tamanho.
+
+    As barras são recriadas apenas quando muda a quantidade de categorias ou de níveis;
+    nos demais gráficos, só as alturas, os rótulos, a legenda e os limites do eixo y mudam.
+    O layout (`tight_layout`) é recalculado a cada gráfico, pois os rótulos mudam de largura.
+    """
+
+    def __init__(self, tamanho):
+        self.estilo = sns.axes_style('whitegrid')
+        with self.estilo:
+            self.figura = Figure(figsize=tamanho)
+            self.eixos = self.figura.subplots()
+        self.grupos = []
+        self.legenda = None
+        self.chave_legenda = None
+
+    def desenhar(self, caminho, categorias, niveis, alturas, titulo, rotulo_x, rotulo_y, titulo_legenda=None):
+        """
+        Atualiza a figura com uma fatia e a salva em `caminho`.
+
+        Parâmetros:
+            caminho (str): Arquivo PNG de saída.
+            categorias (array): Rótulos do eixo x, na ordem das barras.
+            niveis (list): Níveis de `hue` ([None] para uma única série).
+            alturas (np.ndarray): Matriz níveis × categorias; NaN representa uma barra ausente.
+            titulo, rotulo_x, rotulo_y (str): Textos do gráfico.
+            titulo_legenda (str, opcional): Título da legenda; sem ele, não há legenda.
+        """
+        eixos = self.eixos
+        with self.estilo:
+            if [len(grupo) for grupo in self.grupos] != [len(categorias)] * len(niveis):
+                self._criar_barras(len(categorias), len(niveis))
+            for grupo, linha in zip(self.grupos, alturas):
+                for barra, altura in zip(grupo, linha):
+                    ausente = np.isnan(altura)
+                    barra.set_height(0 if ausente else altura)
+                    barra.set_visible(not ausente)
+            legenda = None if titulo_legenda is None else (titulo_legenda, [str(nivel) for nivel in niveis])
+            if legenda != self.chave_legenda:
+                if self.legenda is not None:
+                    self.legenda.remove()
+                    self.legenda = None
+                if legenda is not None:
+                    self.legenda = eixos.legend(self.grupos, legenda[1], title=legenda[0])
+                self.chave_legenda = legenda
+            eixos.set_xticks(range(len(categorias)), [str(categoria) for categoria in categorias])
+            eixos.set_xlabel(rotulo_x)
+            eixos.set_ylabel(rotulo_y)
+            eixos.set_title(titulo)
+            eixos.relim()
+            eixos.autoscale_view(scalex=False)
+            self.figura.tight_layout()
+            self.figura.savefig(caminho)
+
+    def _criar_barras(self, quantidade_categorias, quantidade_niveis):
+        for grupo in self.grupos:
+            grupo.remove()
+        cores = sns.color_palette(n_colors=quantidade_niveis)
+        largura = LARGURA_BARRAS / max(quantidade_niveis, 1)
+        posicoes = np.arange(quantidade_categorias)
+        self.grupos = [
+            self.eixos.bar(posicoes - LARGURA_BARRAS / 2 + largura * (indice + 0.5), np.zeros(quantidade_categorias),
+                           width=largura, color=cores[indice])
+            for indice in range(quantidade_niveis)
+        ]
+        self.eixos.set_xlim(-0.5, max(quantidade_categorias, 1) - 0.5)
+        # A legenda aponta para as barras antigas
+        if self.legenda is not None:
+            self.legenda.remove()
+            self.legenda = None
+        self.chave_legenda = None
+
+
+class ModeloPrevisao:
+    """
+    Figura de previsão reaproveitada entre os estados: pontos reais, tendência ajustada e linha de previsão.
+    """
+
+    def __init__(self):
+        with sns.axes_style('whitegrid'):
+            self.figura = Figure(figsize=(10, 6))
+            eixos = self.eixos = self.figura.subplots()
+            self.reais = eixos.scatter([], [], color='blue')
+            self.ajustada, = eixos.plot([], [], color='orange')
+            self.previsao, = eixos.plot([], [], color='green', linestyle='--', marker='o')
+            eixos.xaxis.set_major_locator(ticker.MaxNLocator(integer=True))
+            eixos.set_xlabel('Ano')
+            eixos.set_ylabel('PIB per capita')
+            # Ordem fixa das entradas: a segunda é a do modelo e a terceira a da previsão, cujos textos
+            # são atualizados a cada gráfico
+            self.legenda = eixos.legend([self.reais, self.ajustada, self.previsao],
+                                        ['Dados reais', 'Tendência', 'Previsão'])
+            eixos.grid(True)
+
+    def desenhar(self, caminho, anos, valores, ajustados, anos_futuros, previsoes, rotulo_ajuste, rotulo_previsao,
+                 titulo):
+        """
+        Atualiza os pontos, as linhas, a legenda e o título, recalcula os limites e salva em `caminho`.
+        """
+        eixos = self.eixos
+        self.reais.set_offsets(np.column_stack([anos, valores]))
+        self.ajustada.set_data(anos, ajustados)
+        self.previsao.set_data(anos_futuros, previsoes)
+        textos = self.legenda.get_texts()
+        textos[1].set_text(rotulo_ajuste)
+        textos[2].set_text(rotulo_previsao)
+        eixos.set_title(titulo)
+        # `relim` não considera os pontos do scatter, então os limites são recalculados a partir dos dados
+        pontos = np.concatenate([np.column_stack([anos, valores]), np.column_stack([anos, ajustados]),
+                                 np.column_stack([anos_futuros, previsoes]).reshape(-1, 2)]).astype(float)
+        eixos.ignore_existing_data_limits = True
+        eixos.update_datalim(pontos[~np.isnan(pontos).any(axis=1)])
+        eixos.autoscale_view()
+        self.figura.savefig(caminho)
+
+
+# Modelos de figura do processo, por tipo de gráfico; cada worker do pool tem os seus
+_MODELOS = {}
+
+
+def _modelo(chave, classe, *argumentos):
+    modelo = _MODELOS.get(chave)
+    if modelo is None:
+        modelo = _MODELOS[chave] = classe(*argumentos)
+    return modelo
+
+
+def _inicializar_worker():
+    matplotlib.use('Agg')
+
+
+def _executar(trabalho):
+    trabalho.funcao(trabalho.dados, trabalho.caminho, **trabalho.parametros)
+
+
+def _ler_manifesto(manifesto):
+    try:
+        with open(manifesto, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _salvar_manifesto(manifesto, hashes):
+    diretorio = os.path.dirname(manifesto)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+    temporario = f'{manifesto}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(hashes, f, indent=2, sort_keys=True)
+    os.replace(temporario, manifesto)
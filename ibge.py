@@ -0,0 +1,145 @@
+"""
+Cliente da API de agregados do IBGE para consultas grandes.
+
+Consultas em nível de município (N6) não cabem em uma única requisição: são
+divididas em blocos de localidades e de períodos, executadas com concorrência
+limitada, um limitador de taxa no cliente e novas tentativas com espera
+exponencial. Os blocos são entregues em fluxo, à medida que chegam.
+"""
+import contextvars
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+import requests
+
+IBGE_API_URL = os.getenv('IBGE_API_URL', 'https://servicodados.ibge.gov.br/api/v3/agregados')
+IBGE_CONCORRENCIA = int(os.getenv('IBGE_CONCORRENCIA', '4'))
+IBGE_REQUISICOES_POR_SEGUNDO = float(os.getenv('IBGE_REQUISICOES_POR_SEGUNDO', '5'))
+IBGE_TENTATIVAS = int(os.getenv('IBGE_TENTATIVAS', '5'))
+IBGE_ANOS_POR_BLOCO = int(os.getenv('IBGE_ANOS_POR_BLOCO', '5'))
+
+ATRASO_BASE = 1.0
+ATRASO_MAXIMO = 60.0
+STATUS_TRANSITORIOS = (429, 500, 502, 503, 504)
+
+# Código IBGE de cada Unidade da Federação; os dois primeiros dígitos do código de um município
+CODIGOS_UF = {
+    '11': 'RO', '12': 'AC', '13': 'AM', '14': 'RR', '15': 'PA', '16': 'AP', '17': 'TO',
+    '21': 'MA', '22': 'PI', '23': 'CE', '24': 'RN', '25': 'PB', '26': 'PE', '27': 'AL', '28': 'SE', '29': 'BA',
+    '31': 'MG', '32': 'ES', '33': 'RJ', '35': 'SP',
+    '41': 'PR', '42': 'SC', '43': 'RS',
+    '50': 'MS', '51': 'MT', '52': 'GO', '53': 'DF',
+}
+
+
+def montar_url_pib(anos, localidades):
+    """
+    Monta a URL do PIB a preços correntes (agregado 5938, variável 37).
+
+    Parâmetros:
+        anos (list): Anos consultados.
+        localidades (str): Filtro de localidades da API, por exemplo 'N3[all]' ou 'N6[N3[33]]'.
+    """
+    anos_pipe = '|'.join(map(str, anos))
+    return f'{IBGE_API_URL}/5938/periodos/{anos_pipe}/variaveis/37?localidades={localidades}'
+
+
+class LimitadorTaxa:
+    """
+    Limitador de taxa compartilhado entre threads.
+
+    Parâmetros:
+        por_segundo (float): Quantidade máxima de requisições iniciadas por segundo.
+
+    Funcionalidade:
+        - `aguardar()` reserva o próximo horário livre e dorme até ele, espaçando as requisições de forma uniforme.
+    """
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1.0 / por_segundo
+        self._proximo = 0.0
+        self._trava = threading.Lock()
+
+    def aguardar(self):
+        with self._trava:
+            agora = time.monotonic()
+            espera = self._proximo - agora
+            self._proximo = max(agora, self._proximo) + self.intervalo
+        if espera > 0:
+            time.sleep(espera)
+
+
+def obter_json_com_tentativas(cache, url, limitador, tentativas=IBGE_TENTATIVAS):
+    """
+    Obtém `url` pelo cache HTTP, respeitando o limitador e tentando novamente em falhas transitórias.
+
+    Funcionalidade:
+        - Repete a requisição em erros de conexão e nos status 429 e 5xx, com espera exponencial
+          e variação aleatória; em 429 respeita o cabeçalho `Retry-After`, se houver.
+
+    Exceções:
+        - A última exceção é propagada quando as tentativas se esgotam ou o erro não é transitório.
+    """
+    for tentativa in range(tentativas):
+        limitador.aguardar()
+        atraso = min(ATRASO_MAXIMO, ATRASO_BASE * 2 ** tentativa) * random.uniform(0.5, 1.5)
+        try:
+            return cache.obter_json(url)
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status not in STATUS_TRANSITORIOS or tentativa == tentativas - 1:
+                raise
+            retry_after = e.response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                atraso = min(ATRASO_MAXIMO, float(retry_after))
+        except (requests.ConnectionError, requests.Timeout):
+            if tentativa == tentativas - 1:
+                raise
+        time.sleep(atraso)
+
+
+def obter_series_pib(cache, anos, localidades, concorrencia=IBGE_CONCORRENCIA,
+                     requisicoes_por_segundo=IBGE_REQUISICOES_POR_SEGUNDO, anos_por_bloco=IBGE_ANOS_POR_BLOCO):
+    """
+    Obtém as séries de PIB em blocos de localidades e períodos, entregando cada bloco assim que chega.
+
+    Parâmetros:
+        cache (CacheHTTP): Cache HTTP usado nas requisições.
+        anos (list): Anos consultados.
+        localidades (list): Filtros de localidade, um por bloco (por exemplo, um 'N6[N3[xx]]' por UF).
+        concorrencia (int): Quantidade máxima de requisições simultâneas.
+        requisicoes_por_segundo (float): Taxa máxima de requisições.
+        anos_por_bloco (int): Quantidade de anos por requisição.
+
+    Funcionalidade:
+        - Mantém no máximo `concorrencia` requisições em andamento; um novo bloco só é submetido
+          quando outro termina, de modo que a memória não cresce com o total de blocos.
+
+    Retorno:
+        generator: Listas de séries, no formato de `resultados[0]['series']` da API, uma por bloco.
+    """
+    blocos = ((anos[inicio:inicio + anos_por_bloco], localidade)
+              for localidade in localidades
+              for inicio in range(0, len(anos), anos_por_bloco))
+    limitador = LimitadorTaxa(requisicoes_por_segundo)
+
+    with ThreadPoolExecutor(max_workers=concorrencia, thread_name_prefix='ibge') as executor:
+        def submeter(quantidade):
+            # Cada requisição roda em uma cópia do contexto, para que os bytes baixados sejam atribuídos à etapa
+            return {
+                executor.submit(contextvars.copy_context().run, obter_json_com_tentativas, cache,
+                                montar_url_pib(anos_bloco, localidade), limitador)
+                for anos_bloco, localidade in islice(blocos, quantidade)
+            }
+
+        pendentes = submeter(concorrencia)
+        while pendentes:
+            concluidos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+            pendentes |= submeter(len(concluidos))
+            for futuro in concluidos:
+                resposta = futuro.result()
+                yield resposta[0]['resultados'][0]['series'] if resposta else []
@@ -0,0 +1,200 @@
+"""
+Execução incremental do ETL com marcas d'água por fonte.
+
+A tabela `etl_marca_dagua` guarda, por fonte e por (sigla, ano), o hash do
+último valor carregado, e `etl_fonte` guarda a versão (hash do conteúdo) do
+último arquivo processado de cada fonte. Com isso uma execução consulta apenas
+os períodos que podem ter mudado, carrega apenas as linhas diferentes e
+recalcula o PIB per capita apenas para as chaves afetadas. As tabelas são
+criadas pela `SessaoBanco` (módulo `banco`).
+"""
+import os
+
+import pandas as pd
+from psycopg2 import sql
+
+from banco import NIVEL_ESTADO
+from carga import carregar_dataframe
+from esquema import compactar
+
+# Anos mais recentes já carregados que ainda são consultados, pois o IBGE revisa as estimativas
+JANELA_REVISAO = int(os.getenv('ETL_JANELA_REVISAO', '2'))
+
+
+def anos_a_consultar(cursor, fonte, anos, janela=JANELA_REVISAO):
+    """
+    Seleciona os anos que podem ter mudado desde a última carga de `fonte`.
+
+    Parâmetros:
+        cursor (psycopg2.extensions.cursor): Cursor da transação em andamento.
+        fonte (str): Nome da fonte nas marcas d'água (por exemplo 'pib').
+        anos (list): Anos candidatos, normalmente `ULTIMOS_ANOS`.
+        janela (int): Quantidade de anos já carregados que continuam sendo consultados.
+
+    Retorno:
+        list: Anos posteriores ao último ano carregado menos a janela de revisão;
+              todos os anos se a fonte nunca foi carregada. Pode ser vazia (com `janela=0` e
+              nenhum ano novo): nada a consultar.
+    """
+    cursor.execute("SELECT max(ano) FROM etl_marca_dagua WHERE fonte = %s", (fonte,))
+    ultimo_ano = cursor.fetchone()[0]
+    if ultimo_ano is None:
+        return list(anos)
+    return [ano for ano in anos if ano > ultimo_ano - janela]
+
+
+def versao_fonte(cursor, fonte):
+    """Retorna a versão (hash do conteúdo) do último arquivo processado de `fonte`, ou None."""
+    cursor.execute("SELECT versao FROM etl_fonte WHERE fonte = %s", (fonte,))
+    linha = cursor.fetchone()
+    return linha[0] if linha else None
+
+
+def registrar_versao_fonte(cursor, fonte, versao):
+    """Registra `versao` como a última processada de `fonte`."""
+    cursor.execute("""
+        INSERT INTO etl_fonte (fonte, versao, atualizado_em)
+        VALUES (%s, %s, now())
+        ON CONFLICT (fonte) DO UPDATE
+        SET versao = EXCLUDED.versao, atualizado_em = EXCLUDED.atualizado_em;
+    """, (fonte, versao))
+
+
+def linhas_alteradas(cursor, fonte, df, coluna_valor='VALOR'):
+    """
+    Filtra as linhas de `df` cujo valor difere do último carregado.
+
+    Parâmetros:
+        cursor (psycopg2.extensions.cursor): Cursor da transação em andamento.
+        fonte (str): Nome da fonte nas marcas d'água.
+        df (pd.DataFrame): DataFrame com as colunas 'SIGLA', 'ANO' e `coluna_valor`.
+        coluna_valor (str): Coluna com o valor a ser comparado.
+
+    Funcionalidade:
+        - Calcula um hash de 64 bits por valor, de forma vetorizada.
+        - Compara com as marcas d'água da fonte; linhas novas ou com hash diferente são mantidas.
+
+    Retorno:
+        pd.DataFrame: Linhas alteradas, com a coluna adicional 'HASH_VALOR'.
+    """
+    df = df.assign(HASH_VALOR=_hash_valores(df[coluna_valor]))
+    cursor.execute("SELECT sigla, ano, hash_valor FROM etl_marca_dagua WHERE fonte = %s", (fonte,))
+    marcas = pd.DataFrame(cursor.fetchall(), columns=['SIGLA', 'ANO', 'HASH_ANTERIOR'])
+    marcas['ANO'] = marcas['ANO'].astype(df['ANO'].dtype)
+    # Inteiro anulável para que a comparação dos hashes não passe por float
+    marcas['HASH_ANTERIOR'] = marcas['HASH_ANTERIOR'].astype('Int64')
+    df = df.merge(marcas, on=['SIGLA', 'ANO'], how='left')
+    diferentes = df['HASH_ANTERIOR'].ne(df['HASH_VALOR']).fillna(True).astype(bool)
+    alteradas = df[diferentes]
+    return alteradas.drop(columns=['HASH_ANTERIOR'])
+
+
+def registrar_marcas_dagua(cursor, fonte, df_alteradas):
+    """
+    Atualiza as marcas d'água de `fonte` com as linhas carregadas.
+
+    Parâmetros:
+        cursor (psycopg2.extensions.cursor): Cursor da transação em andamento.
+        fonte (str): Nome da fonte nas marcas d'água.
+        df_alteradas (pd.DataFrame): Resultado de `linhas_alteradas`.
+    """
+    if df_alteradas.empty:
+        return
+    carregar_dataframe(
+        cursor, 'etl_marca_dagua', df_alteradas.assign(FONTE=fonte),
+        colunas={'FONTE': 'fonte', 'SIGLA': 'sigla', 'ANO': 'ano', 'HASH_VALOR': 'hash_valor'},
+        chave=('fonte', 'sigla', 'ano')
+    )
+
+
+def carregar_alteracoes(fonte, carregar, df_alteradas, cursor, versao=None):
+    """
+    Carrega as linhas alteradas de uma fonte e atualiza as suas marcas d'água na mesma etapa.
+
+    Parâmetros:
+        fonte (str): Nome da fonte nas marcas d'água.
+        carregar (callable): Função de carga do `main.py`, chamada como `carregar(df_alteradas, cursor)`.
+        df_alteradas (pd.DataFrame): Resultado de `linhas_alteradas`.
+        cursor (psycopg2.extensions.cursor): Cursor da transação em andamento.
+        versao (str, opcional): Versão do arquivo da fonte a ser registrada em `etl_fonte`.
+
+    Funcionalidade:
+        - Como tudo roda na mesma etapa, uma falha na carga (inclusive em modo savepoint) também
+          desfaz a atualização das marcas d'água.
+
+    Retorno:
+        ResultadoCarga: Resultado da função de carga.
+    """
+    resultado = carregar(df_alteradas, cursor)
+    registrar_marcas_dagua(cursor, fonte, df_alteradas)
+    if versao is not None:
+        registrar_versao_fonte(cursor, fonte, versao)
+    return resultado
+
+
+def carregar_com_marcas(fonte, carregar, df, cursor, versao=None, coluna_valor='VALOR'):
+    """
+    Carrega todas as linhas de uma fonte e registra as suas marcas d'água, como numa carga completa.
+
+    Parâmetros:
+        fonte (str): Nome da fonte nas marcas d'água.
+        carregar (callable): Função de carga do `main.py`, chamada como `carregar(df, cursor)`.
+        df (pd.DataFrame): DataFrame com as colunas 'SIGLA', 'ANO' e `coluna_valor`.
+        cursor (psycopg2.extensions.cursor): Cursor da transação em andamento.
+        versao (str, opcional): Versão do arquivo da fonte a ser registrada em `etl_fonte`.
+
+    Funcionalidade:
+        - Sem as marcas d'água, a primeira execução incremental depois de uma carga completa trataria
+          todas as linhas como alteradas e processaria de novo o arquivo de população.
+
+    Retorno:
+        ResultadoCarga: Resultado da função de carga.
+    """
+    return carregar_alteracoes(fonte, carregar, df.assign(HASH_VALOR=_hash_valores(df[coluna_valor])), cursor,
+                               versao=versao)
+
+
+def recalcular_pib_per_capta(chaves, cursor):
+    """
+    Recalcula o PIB per capita estadual em `fato_indicador` apenas para as chaves afetadas.
+
+    Parâmetros:
+        chaves (pd.DataFrame): Pares 'SIGLA' e 'ANO' cujo PIB ou população mudou.
+        cursor (psycopg2.extensions.cursor): Cursor da transação em andamento, que já contém
+                                             as cargas de PIB e população.
+
+    Retorno:
+        int: Quantidade de linhas de PIB per capita inseridas ou atualizadas.
+    """
+    if chaves.empty:
+        return 0
+    cursor.execute("""
+        INSERT INTO fato_indicador (indicador, nivel_territorial, localidade, ano, valor)
+        SELECT 'pib_per_capta', %s, pib.sigla, pib.ano, pib.valor / pop.valor
+        FROM unnest(%s::varchar[], %s::int[]) AS chave(sigla, ano)
+        JOIN tabela_pib pib ON pib.sigla = chave.sigla AND pib.ano = chave.ano
+        JOIN tabela_pop pop ON pop.sigla = chave.sigla AND pop.ano = chave.ano
+        ON CONFLICT (indicador, nivel_territorial, localidade, ano) DO UPDATE
+        SET valor = EXCLUDED.valor;
+    """, (NIVEL_ESTADO, chaves['SIGLA'].tolist(), chaves['ANO'].astype(int).tolist()))
+    return cursor.rowcount
+
+
+def ler_tabela(cursor, tabela, coluna_valor='VALOR', coluna='valor'):
+    """
+    Lê uma tabela (sigla, ano, valor) do banco no formato usado pelo pipeline.
+
+    Parâmetros:
+        coluna (str): Coluna do banco lida como valor (por exemplo 'pib_per_capta' de `mv_indicadores_derivados`).
+
+    Retorno:
+        pd.DataFrame: DataFrame com as colunas 'SIGLA', 'ANO' e `coluna_valor`, na representação compacta.
+    """
+    cursor.execute(sql.SQL("SELECT sigla, ano, {}::float8 FROM {} ORDER BY sigla, ano").format(
+        sql.Identifier(coluna), sql.Identifier(tabela)))
+    return compactar(pd.DataFrame(cursor.fetchall(), columns=['SIGLA', 'ANO', coluna_valor]))
+
+
+def _hash_valores(valores):
+    # O valor é normalizado para float para que o hash não dependa do dtype da coluna
+    return pd.util.hash_pandas_object(valores.astype('float64'), index=False).astype('int64').to_numpy()
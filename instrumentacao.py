@@ -0,0 +1,301 @@
+"""
+Instrumentação das etapas do pipeline.
+
+Cada etapa de extração, transformação, carga e gráficos é medida: tempo de
+relógio, tempo de CPU, pico de memória (RSS e, opcionalmente, tracemalloc),
+bytes baixados e linhas de entrada e saída. Ao final da execução é gravado um
+relatório JSON e um arquivo de métricas no formato texto do Prometheus (para o
+coletor "textfile" do node_exporter). Opcionalmente, cada etapa é perfilada com
+cProfile.
+"""
+import contextvars
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+INSTRUMENTACAO_RELATORIO = os.getenv('INSTRUMENTACAO_RELATORIO', 'output/relatorio_execucao.json')
+INSTRUMENTACAO_PROMETHEUS = os.getenv('INSTRUMENTACAO_PROMETHEUS', 'output/metricas_etl.prom')
+INSTRUMENTACAO_TRACEMALLOC = os.getenv('INSTRUMENTACAO_TRACEMALLOC', '0') == '1'
+# Diretório dos perfis cProfile (um arquivo .prof por etapa); vazio desativa
+INSTRUMENTACAO_PERFIL_DIR = os.getenv('INSTRUMENTACAO_PERFIL_DIR', '')
+
+# Etapa em andamento no contexto atual, para atribuir os bytes baixados
+_etapa_atual = contextvars.ContextVar('etapa_atual', default=None)
+_bytes_baixados = 0
+_trava_bytes = threading.Lock()
+
+
+def registrar_bytes_baixados(quantidade):
+    """Soma `quantidade` bytes recebidos da rede ao total do processo e à etapa em andamento, se houver."""
+    global _bytes_baixados
+    with _trava_bytes:
+        _bytes_baixados += quantidade
+    registro = _etapa_atual.get()
+    if registro is not None:
+        registro.adicionar_bytes(quantidade)
+
+
+def total_bytes_baixados():
+    """Total de bytes recebidos da rede desde o início do processo."""
+    return _bytes_baixados
+
+
+def contar_linhas(objeto):
+    """
+    Conta as linhas de um valor trocado entre etapas.
+
+    Retorno:
+        int ou None: Linhas de um DataFrame/Series ou lista, linhas inseridas e atualizadas de um
+                     `ResultadoCarga`, soma das partes de uma tupla de DataFrames (`ResultadoPrevisao`),
+                     ou None se o valor não tem linhas (caminhos, cursores, funções).
+    """
+    if hasattr(objeto, 'shape'):
+        return int(objeto.shape[0])
+    if hasattr(objeto, 'inseridos') and hasattr(objeto, 'atualizados'):
+        return int(objeto.inseridos) + int(objeto.atualizados)
+    if isinstance(objeto, tuple):
+        partes = [linhas for linhas in map(contar_linhas, objeto) if linhas is not None]
+        return sum(partes) if partes else None
+    if isinstance(objeto, list):
+        return len(objeto)
+    return None
+
+
+class RegistroEtapa:
+    """Medidas de uma execução de etapa."""
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.inicio = datetime.now().isoformat(timespec='milliseconds')
+        self.duracao_s = None
+        self.cpu_s = None
+        self.rss_pico_mb = None
+        self.tracemalloc_pico_mb = None
+        self.bytes_baixados = 0
+        self.linhas_entrada = None
+        self.linhas_saida = None
+        self.erro = None
+        self.perfil = None
+        self._trava = threading.Lock()
+
+    def adicionar_bytes(self, quantidade):
+        with self._trava:
+            self.bytes_baixados += quantidade
+
+    def como_dict(self):
+        return {chave: valor for chave, valor in vars(self).items() if not chave.startswith('_')}
+
+
+class Instrumentacao:
+    """
+    Coleta as medidas das etapas de uma execução e grava os relatórios ao final.
+
+    Parâmetros:
+        relatorio (str): Arquivo JSON do relatório (padrão `output/relatorio_execucao.json`); vazio desativa.
+        prometheus (str): Arquivo de métricas do Prometheus (padrão `output/metricas_etl.prom`); vazio desativa.
+        usar_tracemalloc (bool): Mede também o pico de memória alocada pelo Python em cada etapa (mais lento).
+        perfil_dir (str): Diretório dos perfis cProfile de cada etapa; vazio desativa.
+
+    Funcionalidade:
+        - `etapa(nome)` mede um bloco; `medir(nome, funcao, *args)` mede uma chamada e conta as linhas
+          dos argumentos e do retorno.
+        - Usada como gerenciador de contexto, grava o relatório ao sair, com sucesso ou com erro.
+
+    Observações:
+        - O tempo de CPU é o da thread da etapa mais o dos processos filhos encerrados durante ela
+          (o pool de gráficos). O pico de RSS é o do processo até o fim da etapa.
+        - Com etapas simultâneas, o pico do tracemalloc inclui as alocações das outras etapas em andamento.
+        - O cProfile admite apenas um perfil ativo por processo: uma etapa que começa enquanto outra
+          está sendo perfilada é medida normalmente, mas sem perfil (`perfil` fica None).
+    """
+
+    def __init__(self, relatorio=INSTRUMENTACAO_RELATORIO, prometheus=INSTRUMENTACAO_PROMETHEUS,
+                 usar_tracemalloc=INSTRUMENTACAO_TRACEMALLOC, perfil_dir=INSTRUMENTACAO_PERFIL_DIR):
+        self.relatorio = relatorio
+        self.prometheus = prometheus
+        self.usar_tracemalloc = usar_tracemalloc
+        self.perfil_dir = perfil_dir
+        self.etapas = []
+        self.inicio = time.time()
+        self.erro = None
+        self._inicio_relogio = time.perf_counter()
+        self._bytes_inicio = total_bytes_baixados()
+        self._trava = threading.Lock()
+        self._trava_perfil = threading.Lock()
+        if usar_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def etapa(self, nome):
+        """Mede o bloco como a etapa `nome` e entrega o `RegistroEtapa`, que pode receber as linhas."""
+        registro = RegistroEtapa(nome)
+        with self._trava:
+            self.etapas.append(registro)
+        token = _etapa_atual.set(registro)
+        perfil = None
+        # Sem bloquear: uma etapa perfilada pode esperar por outra thread (o gravador do banco, por exemplo)
+        if self.perfil_dir and self._trava_perfil.acquire(blocking=False):
+            perfil = cProfile.Profile()
+        if self.usar_tracemalloc:
+            tracemalloc.reset_peak()
+            memoria_inicio = tracemalloc.get_traced_memory()[0]
+        cpu_inicio = time.thread_time() + _cpu_filhos()
+        relogio_inicio = time.perf_counter()
+        try:
+            if perfil is not None:
+                perfil.enable()
+            yield registro
+        except BaseException as e:
+            registro.erro = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            if perfil is not None:
+                perfil.disable()
+            registro.duracao_s = round(time.perf_counter() - relogio_inicio, 6)
+            registro.cpu_s = round(time.thread_time() + _cpu_filhos() - cpu_inicio, 6)
+            registro.rss_pico_mb = _rss_pico_mb()
+            if self.usar_tracemalloc:
+                registro.tracemalloc_pico_mb = round((tracemalloc.get_traced_memory()[1] - memoria_inicio) / 2 ** 20, 3)
+            if perfil is not None:
+                try:
+                    os.makedirs(self.perfil_dir, exist_ok=True)
+                    registro.perfil = os.path.join(self.perfil_dir, f'{nome}.prof')
+                    perfil.dump_stats(registro.perfil)
+                finally:
+                    self._trava_perfil.release()
+            _etapa_atual.reset(token)
+
+    def medir(self, nome, funcao, *args):
+        """
+        Executa `funcao(*args)` como a etapa `nome`.
+
+        Retorno:
+            O retorno de `funcao`; as linhas dos argumentos e do retorno são registradas com `contar_linhas`.
+        """
+        with self.etapa(nome) as registro:
+            linhas = [linhas for linhas in map(contar_linhas, args) if linhas is not None]
+            registro.linhas_entrada = sum(linhas) if linhas else None
+            resultado = funcao(*args)
+            registro.linhas_saida = contar_linhas(resultado)
+            return resultado
+
+    def relatorio_dict(self):
+        """Relatório da execução: totais e a lista de etapas na ordem em que começaram."""
+        return {
+            'inicio': datetime.fromtimestamp(self.inicio).isoformat(timespec='seconds'),
+            'duracao_s': round(time.perf_counter() - self._inicio_relogio, 6),
+            'sucesso': self.erro is None,
+            'erro': self.erro,
+            'bytes_baixados': total_bytes_baixados() - self._bytes_inicio,
+            'rss_pico_mb': _rss_pico_mb(),
+            'etapas': [registro.como_dict() for registro in self.etapas],
+        }
+
+    def salvar(self):
+        """Grava o relatório JSON e as métricas do Prometheus (cada um apenas se configurado)."""
+        relatorio = self.relatorio_dict()
+        if self.relatorio:
+            _gravar_atomico(self.relatorio, json.dumps(relatorio, indent=2, ensure_ascii=False))
+        if self.prometheus:
+            _gravar_atomico(self.prometheus, _formatar_prometheus(relatorio))
+        return relatorio
+
+    def resumo(self):
+        """Tabela de texto com as etapas ordenadas pelo tempo de relógio."""
+        linhas = [f"{'etapa':<24} {'tempo (s)':>10} {'cpu (s)':>9} {'rss (MiB)':>10} {'entrada':>9} {'saída':>9}"]
+        for registro in sorted(self.etapas, key=lambda registro: -(registro.duracao_s or 0)):
+            linhas.append(f'{registro.nome:<24} {registro.duracao_s or 0:>10.3f} {registro.cpu_s or 0:>9.3f} '
+                          f'{registro.rss_pico_mb or 0:>10.1f} {_texto(registro.linhas_entrada):>9} '
+                          f'{_texto(registro.linhas_saida):>9}')
+        return '\n'.join(linhas)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, erro, _):
+        if erro is not None:
+            self.erro = f'{tipo.__name__}: {erro}'
+        self.salvar()
+        if self.etapas:
+            print(self.resumo())
+
+
+# (nome, campo do registro, descrição) de cada métrica por etapa
+_METRICAS_ETAPA = (
+    ('etl_etapa_duracao_segundos', 'duracao_s', 'Tempo de relógio da etapa.'),
+    ('etl_etapa_cpu_segundos', 'cpu_s', 'Tempo de CPU da etapa.'),
+    ('etl_etapa_rss_pico_megabytes', 'rss_pico_mb', 'Pico de RSS do processo até o fim da etapa.'),
+    ('etl_etapa_tracemalloc_pico_megabytes', 'tracemalloc_pico_mb', 'Pico de memória alocada pelo Python na etapa.'),
+    ('etl_etapa_bytes_baixados', 'bytes_baixados', 'Bytes recebidos da rede durante a etapa.'),
+    ('etl_etapa_linhas_entrada', 'linhas_entrada', 'Linhas recebidas pela etapa.'),
+    ('etl_etapa_linhas_saida', 'linhas_saida', 'Linhas produzidas pela etapa.'),
+)
+
+
+def _formatar_prometheus(relatorio):
+    linhas = []
+    for nome, campo, descricao in _METRICAS_ETAPA:
+        amostras = [(etapa['nome'], etapa[campo]) for etapa in relatorio['etapas'] if etapa[campo] is not None]
+        if not amostras:
+            continue
+        linhas += [f'# HELP {nome} {descricao}', f'# TYPE {nome} gauge']
+        # Uma etapa executada mais de uma vez soma as medidas
+        somas = {}
+        for etapa, valor in amostras:
+            somas[etapa] = somas.get(etapa, 0) + valor
+        linhas += [f'{nome}{{etapa="{etapa}"}} {valor}' for etapa, valor in somas.items()]
+    linhas += [
+        '# HELP etl_etapa_sucesso 1 se a etapa terminou sem erro.', '# TYPE etl_etapa_sucesso gauge',
+        *(f'etl_etapa_sucesso{{etapa="{etapa["nome"]}"}} {int(etapa["erro"] is None)}'
+          for etapa in relatorio['etapas']),
+        '# HELP etl_execucao_duracao_segundos Tempo de relógio da execução.',
+        '# TYPE etl_execucao_duracao_segundos gauge',
+        f"etl_execucao_duracao_segundos {relatorio['duracao_s']}",
+        '# HELP etl_execucao_sucesso 1 se a execução terminou sem erro.', '# TYPE etl_execucao_sucesso gauge',
+        f"etl_execucao_sucesso {int(relatorio['sucesso'])}",
+        '# HELP etl_execucao_bytes_baixados Bytes recebidos da rede na execução.',
+        '# TYPE etl_execucao_bytes_baixados gauge',
+        f"etl_execucao_bytes_baixados {relatorio['bytes_baixados']}",
+        '# HELP etl_execucao_fim_timestamp_segundos Horário do fim da execução.',
+        '# TYPE etl_execucao_fim_timestamp_segundos gauge',
+        f'etl_execucao_fim_timestamp_segundos {time.time():.0f}',
+    ]
+    return '\n'.join(linhas) + '\n'
+
+
+def _gravar_atomico(caminho, conteudo):
+    diretorio = os.path.dirname(caminho)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+    temporario = f'{caminho}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        f.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+def _cpu_filhos():
+    if resource is None:
+        return 0.0
+    uso = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return uso.ru_utime + uso.ru_stime
+
+
+def _rss_pico_mb():
+    if resource is None:
+        return None
+    # ru_maxrss é dado em KiB no Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _texto(valor):
+    return '-' if valor is None else str(valor)
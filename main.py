@@ -1,16 +1,24 @@
-import json
 import os
 from datetime import datetime
-from io import StringIO
+from functools import partial
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import psycopg2
-import requests
-import seaborn as sns
-from matplotlib import ticker
-from sklearn.linear_model import LinearRegression
+
+from agendador import AgendadorEtapas
+from armazem import salvar_etapa
+from banco import (MODOS_PIB_PER_CAPTA, NIVEL_MUNICIPIO, ErroCarga, GravadorBanco, SessaoBanco,
+                   atualizar_indicadores_derivados, pib_per_capta_modo)
+from cache_http import CacheHTTP
+from carga import carregar_dataframe, carregar_indicador
+from esquema import compactar, indexar
+from ibge import CODIGOS_UF, montar_url_pib, obter_series_pib
+from instrumentacao import Instrumentacao
+from incremental import (anos_a_consultar, carregar_alteracoes, carregar_com_marcas, ler_tabela, linhas_alteradas,
+                         recalcular_pib_per_capta, versao_fonte)
+from populacao import somar_populacao
+from previsao import ROTULOS_MODELOS, prever
+from regioes import SIGLAS_AGREGADOS, agregados_oficiais_populacao, atualizar_agregados, conferir_populacao
 
 """
 Autores:
@@ -52,106 +60,313 @@ SIGLAS_ESTADOS = {
     'Sergipe': 'SE',
     'Tocantins': 'TO'
 }
+# Modo incremental: carrega apenas o que mudou desde a última execução
+ETL_INCREMENTAL = os.getenv('ETL_INCREMENTAL', '0') == '1'
+# Níveis territoriais do PIB: 'N3' (estados) e 'N6' (municípios, carregados além dos estados)
+NIVEIS_PIB = ('N3', 'N6')
+PIB_NIVEL = os.getenv('PIB_NIVEL', 'N3')
+# Arquivo de projeção da população (Google Drive); pode apontar para o servidor local de `servidor_ibge.py`
+POPULACAO_URL = os.getenv('POPULACAO_URL',
+                          'https://drive.google.com/uc?export=download&id=1xc40YIHHr_d9kQWjZ9i5eLE_OVzI701c')
+
+
+def main(incremental=ETL_INCREMENTAL, modo_pib_per_capta=pib_per_capta_modo, nivel=PIB_NIVEL):
+    if modo_pib_per_capta not in MODOS_PIB_PER_CAPTA:
+        raise ValueError(f"Modo de PIB per capita inválido: {modo_pib_per_capta!r} "
+                         f"(use {' ou '.join(MODOS_PIB_PER_CAPTA)})")
+    if nivel not in NIVEIS_PIB:
+        raise ValueError(f"Nível territorial não suportado: {nivel!r} (use {' ou '.join(NIVEIS_PIB)})")
+    no_banco = modo_pib_per_capta == 'banco'
+    # Mede cada etapa e grava o relatório da execução ao final, mesmo em caso de erro
+    with Instrumentacao() as instrumentacao:
+        cache = CacheHTTP()
+
+        # As cargas são gravadas em segundo plano; ao sair do bloco, a barreira espera o commit
+        # e propaga qualquer falha de carga, mesmo que os gráficos já tenham sido gerados
+        with SessaoBanco() as banco, GravadorBanco(banco, instrumentacao=instrumentacao) as gravador:
+            if incremental:
+                tabelas = executar_incremental(cache, gravador, instrumentacao, no_banco, nivel)
+            else:
+                tabelas = executar_completo(cache, gravador, instrumentacao, no_banco, nivel)
+
+            if tabelas is None:
+                print('Nenhuma alteração nas fontes desde a última carga; gráficos mantidos.')
+                return
+
+            # Gráficos enquanto o gravador termina as cargas (pyplot não é seguro entre threads,
+            # então rodam na thread principal)
+            df_pib, df_pop, tabela_pib_per_capta, previsao = tabelas
+            instrumentacao.medir('graficos_pib', plotar_graficos_pib, df_pib)
+            instrumentacao.medir('graficos_pop', plotar_graficos_populacao, df_pop)
+            instrumentacao.medir('graficos_pib_per_capta', plotar_graficos_pib_per_capta, tabela_pib_per_capta,
+                                 previsao)
+            instrumentacao.medir('barreira_gravacao', gravador.concluir)
+
+
+def executar_completo(cache, gravador, instrumentacao, pib_per_capta_no_banco=False, nivel='N3'):
+    """
+    Extrai, transforma e carrega todos os anos de `ULTIMOS_ANOS`.
 
-db_user = os.getenv('DB_USER', 'user')
-db_password = os.getenv('DB_PASSWORD', 'password')
-db_name = os.getenv('DB_NAME', 'meu_banco')
-db_port = os.getenv('DB_PORT', '5432')
-db_host = os.getenv('DB_HOST', '5432')
+    Parâmetros:
+        cache (CacheHTTP): Cache HTTP compartilhado pelas extrações.
+        gravador (GravadorBanco): Gravador em segundo plano com a transação aberta pela `SessaoBanco`.
+        instrumentacao (Instrumentacao): Registra as medidas de cada etapa.
+        pib_per_capta_no_banco (bool): Se True, o PIB per capita vem de `mv_indicadores_derivados`, atualizada
+                                       após as cargas de PIB e população, em vez do merge em pandas.
+        nivel (str): 'N3' carrega o PIB dos estados; 'N6' carrega também o PIB dos municípios.
 
+    Funcionalidade:
+        - Executa os ramos de PIB e população em paralelo com o `AgendadorEtapas`.
+        - No nível 'N6', extrai o PIB municipal em um ramo próprio, salva-o na etapa 'pib_municipios' do
+          armazém e o carrega com `carregar_dados_pib_municipios`; PIB per capita, previsões, agregados
+          e gráficos continuam no nível estadual.
+        - Calcula as previsões de PIB per capita de todos os estados de uma só vez.
+        - Salva PIB, população e PIB per capita no armazém colunar, particionados por ano.
+        - Enfileira no gravador as cargas (com as marcas d'água e a versão do arquivo de população usadas
+          pelo modo incremental), a atualização da visão materializada de indicadores derivados e
+          os agregados regionais e nacional, na ordem em que devem ser executadas; as cargas seguem em
+          segundo plano enquanto as previsões são calculadas e os gráficos gerados.
 
-def main():
+    Retorno:
+        tuple: DataFrames de PIB, população e PIB per capita e o `ResultadoPrevisao`, usados nos gráficos.
+               As cargas podem ainda estar em andamento: o resultado delas vem de `gravador.concluir()`.
+    """
+    agendador = AgendadorEtapas(instrumentacao=instrumentacao)
     # PIB
-    data_pib = obter_dados_pib()
-    df_pib = transformar_dados_pib(data_pib)
-    carregar_dados_pib(df_pib)
-    plotar_graficos_pib(df_pib)
-
+    agendador.adicionar('data_pib', partial(obter_dados_pib, cache))
+    agendador.adicionar('df_pib', transformar_dados_pib, entradas=('data_pib',))
     # População
-    path = obtem_dados_populacao()
-    df_pop = transformar_dados_populacao(path)
-    carrega_dados_populacao(df_pop)
-    plotar_graficos_populacao(df_pop)
+    agendador.adicionar('path_pop', partial(obtem_dados_populacao, cache))
+    agendador.adicionar('df_pop', transformar_dados_populacao, entradas=('path_pop',))
+    # PIB municipal, além dos estados
+    if nivel == 'N6':
+        agendador.adicionar('data_pib_municipios', partial(obter_dados_pib, cache, nivel='N6'))
+        agendador.adicionar('df_pib_municipios', partial(transformar_dados_pib, nivel='N6'),
+                            entradas=('data_pib_municipios',))
+        agendador.adicionar('armazem_pib_municipios', partial(salvar_etapa, 'pib_municipios'),
+                            entradas=('df_pib_municipios',))
+        agendador.adicionar('carga_pib_municipios',
+                            partial(gravador.enviar, 'pib_municipios', carregar_dados_pib_municipios),
+                            entradas=('df_pib_municipios',), apos=('carga_pib',))
+    # PIB per capta: merge em pandas ou leitura da visão materializada, depois das cargas
+    if pib_per_capta_no_banco:
+        agendador.adicionar('tabela_pib_per_capta', partial(calcular_pib_per_capta_no_banco, gravador),
+                            apos=('carga_pop',))
+    else:
+        agendador.adicionar('tabela_pib_per_capta', calcular_pib_per_capta, entradas=('df_pib', 'df_pop'))
+    # Previsões de todos os estados de uma só vez
+    agendador.adicionar('previsao', prever, entradas=('tabela_pib_per_capta',))
+    # Resultados intermediários no armazém colunar, em paralelo com as cargas
+    agendador.adicionar('armazem_pib', partial(salvar_etapa, 'pib'), entradas=('df_pib',))
+    agendador.adicionar('armazem_pop', partial(salvar_etapa, 'populacao'), entradas=('df_pop',))
+    agendador.adicionar('armazem_pib_per_capta', partial(salvar_etapa, 'pib_per_capta'),
+                        entradas=('tabela_pib_per_capta',))
+    # Cargas enfileiradas no gravador, que as executa na ordem de envio; as etapas só enfileiram,
+    # e `apos` fixa a ordem em que chegam à fila
+    # As marcas d'água e a versão do arquivo de população são registradas com as cargas, para que a
+    # próxima execução incremental parta desta carga completa
+    agendador.adicionar('carga_pib', partial(gravador.enviar, 'pib', carregar_com_marcas, 'pib', carregar_dados_pib),
+                        entradas=('df_pib',))
+    agendador.adicionar('carga_pop',
+                        lambda df_pop, path_pop: gravador.enviar(
+                            'populacao', partial(carregar_com_marcas, versao=os.path.basename(path_pop)),
+                            'populacao', carrega_dados_populacao, df_pop),
+                        entradas=('df_pop', 'path_pop'), apos=('carga_pib',))
+    if not pib_per_capta_no_banco:
+        agendador.adicionar('carga_pib_per_capta',
+                            partial(gravador.enviar, 'pib_per_capta', carrega_dados_pib_per_capta,
+                                    depende_de=('pib', 'populacao')),
+                            entradas=('tabela_pib_per_capta',), apos=('carga_pop',))
+        agendador.adicionar('indicadores_derivados',
+                            partial(gravador.enviar, 'indicadores_derivados', atualizar_indicadores_derivados,
+                                    depende_de=('pib', 'populacao')),
+                            apos=('carga_pib_per_capta',))
+    agendador.adicionar('carga_previsao',
+                        lambda previsao: gravador.enviar('previsao', carrega_previsao_pib_per_capta,
+                                                         previsao.previsoes, depende_de=('pib_per_capta',)),
+                        entradas=('previsao',),
+                        apos=('tabela_pib_per_capta',) if pib_per_capta_no_banco else ('indicadores_derivados',))
+    # Agregados regionais e nacional de todos os anos, conferidos com as linhas oficiais da população
+    agendador.adicionar('agregados',
+                        partial(gravador.enviar, 'agregados', atualizar_agregados, None,
+                                depende_de=('pib', 'populacao')),
+                        apos=('carga_previsao',))
+    # Os agregados oficiais são lidos do arquivo fora do gravador; a conferência só consulta e compara
+    agendador.adicionar('agregados_oficiais', agregados_oficiais_populacao, entradas=('path_pop',))
+    agendador.adicionar('conferencia_agregados',
+                        partial(gravador.enviar, 'conferencia_agregados', conferir_populacao,
+                                depende_de=('agregados',)),
+                        entradas=('agregados_oficiais',), apos=('agregados',))
+    resultados = agendador.executar()
+    return (resultados['df_pib'], resultados['df_pop'], resultados['tabela_pib_per_capta'],
+            resultados['previsao'])
+
+
+def executar_incremental(cache, gravador, instrumentacao, pib_per_capta_no_banco=False, nivel='N3'):
+    """
+    Extrai e carrega apenas o que pode ter mudado desde a última execução.
 
-    # PIB per capta
-    tabela_pib_per_capta = calcular_pib_per_capta(df_pib, df_pop)
-    carrega_dados_pib_per_capta(tabela_pib_per_capta)
-    plotar_graficos_pib_per_capta(tabela_pib_per_capta)
+    Parâmetros:
+        cache (CacheHTTP): Cache HTTP compartilhado pelas extrações.
+        gravador (GravadorBanco): Gravador em segundo plano com a transação aberta pela `SessaoBanco`.
+        instrumentacao (Instrumentacao): Registra as medidas de cada etapa.
+        pib_per_capta_no_banco (bool): Se True, o PIB per capita vem de `mv_indicadores_derivados`
+                                       em vez de `tabela_pib_per_capta`.
+        nivel (str): 'N3' carrega o PIB dos estados; 'N6' carrega também o PIB dos municípios.
+
+    Funcionalidade:
+        - Consulta na API do IBGE apenas os anos posteriores ao último carregado, menos a janela de revisão.
+        - No nível 'N6', consulta os mesmos anos para os municípios e os regrava por inteiro (as marcas
+          d'água são estaduais), no banco e nas partições desses anos da etapa 'pib_municipios' do armazém.
+        - Só transforma o arquivo de população se o seu conteúdo mudou desde a última carga.
+        - Compara os valores com as marcas d'água e carrega apenas as linhas diferentes.
+        - Recalcula o PIB per capita no banco apenas para as chaves (sigla, ano) afetadas (ou, com
+          `pib_per_capta_no_banco`, apenas atualiza a visão materializada de indicadores derivados).
+        - Recalcula os agregados regionais e nacional apenas das regiões e anos afetados.
+        - Atualiza o armazém colunar com as tabelas lidas do banco.
+        - Recalcula e carrega as previsões a partir do PIB per capita lido do banco.
+        - As leituras esperam as cargas enfileiradas antes delas; as cargas finais (agregados e previsões)
+          seguem em segundo plano durante os gráficos.
 
+    Retorno:
+        tuple ou None: DataFrames de PIB, população e PIB per capita lidos do banco e o `ResultadoPrevisao`,
+                       ou None se nada mudou.
 
-def plotar_graficos_pib_per_capta(tabela_pib_per_capta):
+    Dependências:
+        - Funções do módulo `incremental`.
+    """
+    medir = instrumentacao.medir
+    # As leituras passam pelo gravador, depois das cargas já enfileiradas, e as cargas seguem em segundo plano
+    consultar = gravador.consultar
+    anos_pib = consultar(anos_a_consultar, 'pib', ULTIMOS_ANOS)
+    versao_pop = consultar(versao_fonte, 'populacao')
+
+    agendador = AgendadorEtapas(instrumentacao=instrumentacao)
+    agendador.adicionar('data_pib', partial(obter_dados_pib, cache, anos_pib))
+    agendador.adicionar('df_pib', transformar_dados_pib, entradas=('data_pib',))
+    agendador.adicionar('path_pop', partial(obtem_dados_populacao, cache))
+    if nivel == 'N6':
+        agendador.adicionar('data_pib_municipios', partial(obter_dados_pib, cache, anos_pib, nivel='N6'))
+        agendador.adicionar('df_pib_municipios', partial(transformar_dados_pib, nivel='N6'),
+                            entradas=('data_pib_municipios',))
+    resultados = agendador.executar()
+
+    # PIB: apenas as linhas com valor diferente do último carregado
+    alteradas_pib = medir('alteradas_pib', consultar, linhas_alteradas, 'pib', resultados['df_pib'])
+    medir('carga_pib', gravador.enviar, 'pib', carregar_alteracoes, 'pib', carregar_dados_pib, alteradas_pib)
+    if nivel == 'N6':
+        df_pib_municipios = resultados['df_pib_municipios']
+        medir('carga_pib_municipios', gravador.enviar, 'pib_municipios', carregar_dados_pib_municipios,
+              df_pib_municipios)
+        medir('armazem_pib_municipios', partial(salvar_etapa, 'pib_municipios', substituir=False),
+              df_pib_municipios)
+
+    # População: o nome do objeto no cache é o hash do seu conteúdo
+    path_pop = resultados['path_pop']
+    nova_versao_pop = os.path.basename(path_pop)
+    alteradas_pop = pd.DataFrame(columns=['SIGLA', 'ANO'])
+    if nova_versao_pop != versao_pop:
+        df_pop = medir('df_pop', transformar_dados_populacao, path_pop)
+        alteradas_pop = medir('alteradas_pop', consultar, linhas_alteradas, 'populacao', df_pop)
+        medir('carga_pop', gravador.enviar, 'populacao', partial(carregar_alteracoes, versao=nova_versao_pop),
+              'populacao', carrega_dados_populacao, alteradas_pop)
+
+    chaves = pd.concat([alteradas_pib[['SIGLA', 'ANO']], alteradas_pop[['SIGLA', 'ANO']]]).drop_duplicates()
+    print(f"Incremental: {len(alteradas_pib)} linhas de PIB e {len(alteradas_pop)} de população alteradas")
+    if chaves.empty:
+        return None
+
+    if pib_per_capta_no_banco:
+        tabela_pib_per_capta = medir('tabela_pib_per_capta', calcular_pib_per_capta_no_banco, gravador)
+    else:
+        medir('carga_pib_per_capta', partial(gravador.enviar, 'pib_per_capta', recalcular_pib_per_capta,
+                                             depende_de=('pib', 'populacao')), chaves)
+        medir('indicadores_derivados', partial(gravador.enviar, 'indicadores_derivados',
+                                               atualizar_indicadores_derivados, depende_de=('pib', 'populacao')))
+        tabela_pib_per_capta = medir('leitura_pib_per_capta',
+                                     partial(consultar, ler_tabela, coluna_valor='PIB_PER_CAPTA'),
+                                     'tabela_pib_per_capta')
+    # Agregados apenas das regiões e anos afetados; a conferência só é refeita com um novo arquivo de população
+    medir('agregados', partial(gravador.enviar, 'agregados', atualizar_agregados,
+                               depende_de=('pib', 'populacao')), chaves)
+    if nova_versao_pop != versao_pop:
+        oficiais = medir('agregados_oficiais', agregados_oficiais_populacao, path_pop)
+        medir('conferencia_agregados', partial(gravador.enviar, 'conferencia_agregados', conferir_populacao,
+                                               depende_de=('agregados',)), oficiais)
+
+    df_pib = medir('leitura_pib', consultar, ler_tabela, 'tabela_pib')
+    df_pop = medir('leitura_pop', consultar, ler_tabela, 'tabela_pop')
+    medir('armazem_pib', salvar_etapa, 'pib', df_pib)
+    medir('armazem_pop', salvar_etapa, 'populacao', df_pop)
+    medir('armazem_pib_per_capta', salvar_etapa, 'pib_per_capta', tabela_pib_per_capta)
+    previsao = medir('previsao', prever, tabela_pib_per_capta)
+    medir('carga_previsao', partial(gravador.enviar, 'previsao', carrega_previsao_pib_per_capta,
+                                    depende_de=('pib_per_capta',)), previsao.previsoes)
+    return df_pib, df_pop, tabela_pib_per_capta, previsao
+
+
+def plotar_graficos_pib_per_capta(tabela_pib_per_capta, previsao, workers=None):
     """
-    Gera gráficos de barras e previsões de regressão linear para o PIB per capita por estado e ano.
+    Gera gráficos de barras e de previsão do PIB per capita por estado e ano.
 
     Parâmetros:
         tabela_pib_per_capta (pd.DataFrame): DataFrame contendo as colunas 'SIGLA', 'ANO' e 'PIB_PER_CAPTA'.
+        previsao (ResultadoPrevisao): Tendências e previsões de todos os estados, calculadas por `previsao.prever`.
+        workers (int, opcional): Quantidade de processos usados na renderização (padrão `PLOT_WORKERS`).
 
     Funcionalidade:
         - Ordena os dados por PIB per capita e sigla do estado.
         - Gera um gráfico de barras comparativo do PIB per capita por estado e ano.
-        - Para cada estado, realiza uma regressão linear para prever o PIB per capita até 2025.
+        - Para cada estado, gera um gráfico com os dados reais, a tendência ajustada e a previsão.
+        - Renderiza os gráficos em paralelo, enviando a cada processo apenas a fatia de dados do seu gráfico.
         - Salva os gráficos gerados no diretório `output` com nomes específicos para cada estado.
 
     Dependências:
-        - Bibliotecas: seaborn, matplotlib, sklearn.linear_model.LinearRegression, numpy.
-        - O diretório `output` deve existir para salvar os gráficos.
+        - Bibliotecas: seaborn, matplotlib.
+        - Funções do módulo `graficos`.
 
     Exceções:
         - Certifique-se de que o DataFrame contém as colunas necessárias ('SIGLA', 'ANO', 'PIB_PER_CAPTA').
         - O diretório `output` deve estar acessível para salvar os arquivos.
 
+    Retorno:
+        int: Quantidade de gráficos gerados (os que não mudaram desde a última execução são pulados).
+
     Saída:
         - Gráficos salvos no formato PNG no diretório `output`.
     """
+    # Importado aqui para que os comandos sem gráficos não carreguem o matplotlib
+    from graficos import TrabalhoGrafico, desenhar_barras, desenhar_previsao, renderizar
+
     # Ordernação por valor e estado
     tabela_pib_per_capta = tabela_pib_per_capta.sort_values(by=['PIB_PER_CAPTA', 'SIGLA'], ascending=[False, True])
-    # Configurando estilo
-    sns.set_style(style="whitegrid")
-    # Configurando dimenções
-    plt.figure(figsize=(28, 10))
-    # Criando as barras
-    sns.barplot(x='SIGLA', y='PIB_PER_CAPTA', hue='ANO', data=tabela_pib_per_capta)
-    # Rótulos e título
-    plt.xlabel('Estados')
-    plt.ylabel('PIB per capta')
-    plt.title('Comparação PIB per capta')
-    # Plotando
-    plt.tight_layout()
-    plt.savefig(f'output/pib_per_capta/comparação_pib_per_capta.png')
-    plt.close()
-
-    for sigla in tabela_pib_per_capta['SIGLA']:
-        tabela_pib_per_capta_estado = tabela_pib_per_capta[tabela_pib_per_capta['SIGLA'] == sigla]
-        # Regressão Linear
-        lr = LinearRegression()
-
-        # Reshape para o modelo
-        X = tabela_pib_per_capta_estado['ANO'].values.reshape(-1, 1)
-        # Valores de PIB per capta
-        y = tabela_pib_per_capta_estado['PIB_PER_CAPTA'].values
-
-        # Ajustando o modelo
-        lr.fit(X, y)
-        # Previsão
-        y_predicts = lr.predict(X)
-
-        # Previsão para os próximos anos
-        anos_futuros = np.array([2022, 2023, 2024, 2025]).reshape(-1, 1)
-        previsoes = lr.predict(anos_futuros)
-
-        # Gráfico de PIB per capta
-        plt.figure(figsize=(10, 6))
-        plt.scatter(X, y, color='blue', label='Dados reais')
-        plt.plot(X, y_predicts, color='orange', label='Regressão Linear')
-        plt.plot(anos_futuros, previsoes, color='green', linestyle='--', marker='o', label='Previsão até 2025')
-        plt.gca().xaxis.set_major_locator(ticker.MaxNLocator(integer=True))
-        plt.xlabel('Ano')
-        plt.ylabel('PIB per capita')
-        plt.title(f'PIB per capita - {sigla} (2022–2025)')
-        plt.legend()
-        plt.grid(True)
-        plt.savefig(f'output/previsoes_pib_per_capta_estados/previsao_pib_per_capta_{sigla}.png')
-        plt.close()
+    trabalhos = [TrabalhoGrafico(
+        desenhar_barras,
+        'output/pib_per_capta/comparação_pib_per_capta.png',
+        _para_grafico(tabela_pib_per_capta[['SIGLA', 'ANO', 'PIB_PER_CAPTA']]),
+        dict(x='SIGLA', y='PIB_PER_CAPTA', hue='ANO', titulo='Comparação PIB per capta',
+             rotulo_x='Estados', rotulo_y='PIB per capta', tamanho=(28, 10))
+    )]
+
+    # Um gráfico por estado, a partir das previsões já calculadas para todos os estados;
+    # o índice ordenado (SIGLA, ANO) torna cada fatia uma busca no índice
+    ajustados = indexar(previsao.ajustados)
+    previsoes = indexar(previsao.previsoes)
+    for sigla in ajustados.index.unique(level='SIGLA'):
+        previsoes_estado = previsoes.loc[sigla] if sigla in previsoes.index else previsoes.droplevel('SIGLA').iloc[0:0]
+        anos_futuros = previsoes_estado.index.tolist()
+        periodo = f'{anos_futuros[0]}–{anos_futuros[-1]}' if anos_futuros else 'sem previsão'
+        trabalhos.append(TrabalhoGrafico(
+            desenhar_previsao,
+            f'output/previsoes_pib_per_capta_estados/previsao_pib_per_capta_{sigla}.png',
+            ajustados.loc[sigla, ['PIB_PER_CAPTA', 'AJUSTADO']].reset_index(),
+            dict(anos_futuros=anos_futuros, previsoes=previsoes_estado['VALOR'].tolist(),
+                 rotulo_ajuste=ROTULOS_MODELOS[previsao.modelo],
+                 rotulo_previsao=f'Previsão até {anos_futuros[-1]}' if anos_futuros else 'Previsão',
+                 titulo=f'PIB per capita - {sigla} ({periodo})')
+        ))
+
+    return renderizar(trabalhos, workers)
 
 
 def calcular_pib_per_capta(df_pib, df_pop):
@@ -176,72 +391,87 @@ def calcular_pib_per_capta(df_pib, df_pop):
     return tabela_pib_per_capta
 
 
-def plotar_graficos_populacao(df_pop):
+def calcular_pib_per_capta_no_banco(gravador):
+    """
+    Obtém o PIB per capita calculado pelo PostgreSQL, sem o merge em pandas nem a carga de `tabela_pib_per_capta`.
+
+    Parâmetros:
+        gravador (GravadorBanco): Gravador em que as cargas de PIB e população já foram enfileiradas.
+
+    Funcionalidade:
+        - Atualiza `mv_indicadores_derivados` como a etapa 'pib_per_capta' da transação e espera o seu fim.
+        - Lê a coluna `pib_per_capta` da visão para as previsões, o armazém e os gráficos.
+
+    Retorno:
+        pd.DataFrame: DataFrame com as colunas 'SIGLA', 'ANO' e 'PIB_PER_CAPTA'.
+
+    Exceções:
+        - `ErroCarga` se a etapa falhou ou foi pulada (modo 'savepoint'): sem o PIB per capita não há previsões.
+    """
+    gravador.enviar('pib_per_capta', atualizar_indicadores_derivados, depende_de=('pib', 'populacao')).result()
+    if 'pib_per_capta' in gravador.falhas:
+        raise ErroCarga(gravador.falhas)
+    return gravador.consultar(ler_tabela, 'mv_indicadores_derivados', coluna_valor='PIB_PER_CAPTA',
+                              coluna='pib_per_capta')
+
+
+def plotar_graficos_populacao(df_pop, workers=None, anos=None):
     """
     Gera gráficos comparativos da população por estado e ano.
 
     Parâmetros:
         df_pop (pd.DataFrame): DataFrame contendo as colunas 'SIGLA', 'ANO' e 'VALOR',
                                representando a sigla do estado, o ano e o número de pessoas.
+        workers (int, opcional): Quantidade de processos usados na renderização (padrão `PLOT_WORKERS`).
+        anos (list, opcional): Anos com gráfico individual (padrão `ULTIMOS_ANOS`).
 
     Funcionalidade:
         - Ordena os dados por número de pessoas e sigla do estado.
         - Gera um gráfico de barras comparativo da população entre estados para todos os anos.
         - Para cada ano, gera gráficos de barras individuais comparando a população entre estados.
+        - Renderiza os gráficos em paralelo, enviando a cada processo apenas a fatia de dados do seu gráfico.
         - Salva os gráficos gerados no diretório `output` com nomes específicos.
 
     Dependências:
         - Bibliotecas: seaborn, matplotlib.
-        - O diretório `output` deve existir para salvar os gráficos.
+        - Funções do módulo `graficos`.
 
     Exceções:
         - Certifique-se de que o DataFrame contém as colunas necessárias ('SIGLA', 'ANO', 'VALOR').
         - O diretório `output` deve estar acessível para salvar os arquivos.
 
+    Retorno:
+        int: Quantidade de gráficos gerados (os que não mudaram desde a última execução são pulados).
+
     Saída:
         - Gráficos salvos no formato PNG no diretório `output`.
     """
+    # Importado aqui para que os comandos sem gráficos não carreguem o matplotlib
+    from graficos import TrabalhoGrafico, desenhar_barras, renderizar
+
     # Ordernação por valor e estado
     df_pop = df_pop.sort_values(by=['VALOR', 'SIGLA'], ascending=[False, True])
-    # Configurando estilo
-    sns.set_style(style="whitegrid")
-    # Configurando dimenções
-    plt.figure(figsize=(24, 10))
-    # Criando as barras
-    sns.barplot(x='SIGLA', y='VALOR', hue='ANO', data=df_pop)
-    # Rótulos e título
-    plt.xlabel('Estado')
-    plt.ylabel('Número de Pessoas')
-    plt.title('Comparação da população entre estados')
-    # Plotando
-    plt.tight_layout()
-    plt.savefig(f'output/populacao_estados/comparacao_pop_estados.png')
-    plt.close()
-
-    for ano in ULTIMOS_ANOS:
-        df_pop_ano = df_pop[df_pop['ANO'] == ano]
-
-        # Ordernação por valor e estado
-        df_pop_ano = df_pop_ano.sort_values(by=['VALOR', 'SIGLA'], ascending=[False, True])
-
-        # Configurando estilo
-        sns.set_style(style="whitegrid")
-
-        # Configurando dimenções
-        plt.figure(figsize=(16, 10))
-
-        # Criando as barras
-        sns.barplot(x='SIGLA', y='VALOR', data=df_pop_ano)
-
-        # Rótulos e título
-        plt.xlabel('Estado')
-        plt.ylabel('Número de Pessoas')
-        plt.title('Comparação da população entre estados (2021)')
-
-        # Plotando
-        plt.tight_layout()
-        plt.savefig(f'output/populacao_estados_ano/comparacao_pop_estados_{ano}.png')
-        plt.close()
+    trabalhos = [TrabalhoGrafico(
+        desenhar_barras,
+        'output/populacao_estados/comparacao_pop_estados.png',
+        _para_grafico(df_pop[['SIGLA', 'ANO', 'VALOR']]),
+        dict(x='SIGLA', y='VALOR', hue='ANO', titulo='Comparação da população entre estados',
+             rotulo_x='Estado', rotulo_y='Número de Pessoas', tamanho=(24, 10))
+    )]
+
+    # Fatias de todos os anos em uma única passada, já ordenadas por valor e estado
+    fatias = dict(tuple(df_pop.groupby('ANO', sort=False)))
+    for ano in anos or ULTIMOS_ANOS:
+        df_pop_ano = fatias.get(ano, df_pop.iloc[0:0])
+        trabalhos.append(TrabalhoGrafico(
+            desenhar_barras,
+            f'output/populacao_estados_ano/comparacao_pop_estados_{ano}.png',
+            _para_grafico(df_pop_ano[['SIGLA', 'VALOR']]),
+            dict(x='SIGLA', y='VALOR', titulo=f'Comparação da população entre estados ({ano})',
+                 rotulo_x='Estado', rotulo_y='Número de Pessoas', tamanho=(16, 10))
+        ))
+
+    return renderizar(trabalhos, workers)
 
 
 def transformar_dados_populacao(path):
@@ -252,390 +482,393 @@ def transformar_dados_populacao(path):
         path (str): Caminho para o arquivo Excel contendo os dados de população.
 
     Funcionalidade:
-        - Lê o arquivo Excel e filtra os dados para incluir apenas registros com o sexo 'Ambos' e siglas válidas.
-        - Remove colunas desnecessárias.
-        - Agrega os dados por sigla dos estados.
+        - Soma as linhas de idade com o sexo 'Ambos' por sigla com `populacao.somar_populacao`: a partir do
+          formato colunar (Parquet, convertido do Excel apenas quando o seu conteúdo muda) ou, com
+          `POPULACAO_MODO=fluxo`, lendo o Excel em blocos de tamanho limitado.
+        - Remove as linhas de agregados regionais e nacional.
         - Transforma os anos em uma única coluna chamada 'ANO' e os valores correspondentes em 'VALOR'.
         - Converte os anos para o tipo inteiro.
         - Filtra os dados para incluir apenas anos até o ano atual.
+        - Converte o resultado para a representação compacta de `esquema.compactar` (sigla categórica,
+          ano int16 e população no menor tipo inteiro).
 
     Retorno:
         pd.DataFrame: DataFrame contendo as colunas 'SIGLA', 'ANO' e 'VALOR', representando a sigla do estado, o ano e o número de pessoas.
 
     Dependências:
-        - Bibliotecas: pandas, openpyxl.
+        - Bibliotecas: pandas, openpyxl, pyarrow.
+        - Função `somar_populacao` do módulo `populacao`.
         - O arquivo Excel deve estar no formato esperado, com as colunas e estrutura adequadas.
 
     Exceções:
         - Certifique-se de que o arquivo fornecido existe e está acessível.
         - O arquivo deve conter as colunas necessárias para o processamento.
     """
-    # Lendo o arquivo Excel
-    df_pop = pd.read_excel(path, header=1, skiprows=4, engine='openpyxl')
-    # Renomeando colunas
-    df_pop = df_pop[(df_pop['SEXO'] == 'Ambos') & (~df_pop['SIGLA'].isin(['CO', 'ND', 'NO', 'SD', 'SU', 'BR']))]
-    # Removendo colunas desnecessárias
-    df_pop = df_pop.drop(columns=['IDADE', 'CÓD.', 'SEXO', 'LOCAL'])
-    # Agregando por sigla
-    df_pop = df_pop.groupby('SIGLA', as_index=False).sum()
+    # Somando as linhas de idade com o sexo 'Ambos' por sigla (no formato colunar ou em blocos)
+    df_pop = somar_populacao(path)
+    # Removendo agregados regionais e nacional
+    df_pop = df_pop[~df_pop['SIGLA'].isin(SIGLAS_AGREGADOS)]
     # Transpondo Anos para coluna ano
     df_pop = df_pop.melt(id_vars=['SIGLA'], var_name='ANO', value_name='VALOR')
     # Ano para inteiro
     df_pop['ANO'] = df_pop['ANO'].astype(int)
     # Anos até o ano atual
     df_pop = df_pop[df_pop['ANO'] <= ANO_ATUAL]
-    return df_pop
+    # Sigla categórica, ano int16 e população no menor inteiro que comporta os valores
+    return compactar(df_pop.reset_index(drop=True), inteiros=('VALOR',))
 
 
-def obtem_dados_populacao():
+def obtem_dados_populacao(cache=None):
     """
-    Faz o download de um arquivo Excel contendo dados de população a partir de um link do Google Drive.
+    Obtém o arquivo Excel contendo dados de população a partir de um link do Google Drive (`POPULACAO_URL`).
+
+    Parâmetros:
+        cache (CacheHTTP, opcional): Cache HTTP usado no download. Se omitido, usa o cache padrão em `data/cache_http`.
 
     Funcionalidade:
-        - Realiza uma requisição HTTP para baixar o arquivo Excel.
-        - Salva o arquivo no diretório `data` com o nome `populacao.xlsx`.
+        - Consulta o cache HTTP; dentro do TTL, ou se o servidor responder 304, o arquivo salvo é reaproveitado.
+        - Caso contrário, baixa o arquivo Excel em fluxo (blocos de tamanho fixo, com retomada via `Range`
+          após interrupções) e o armazena no cache.
 
     Retorno:
-        str: Caminho para o arquivo salvo (`data/populacao.xlsx`).
+        str: Caminho para o arquivo no cache.
 
     Dependências:
-        - Biblioteca `requests` para realizar a requisição HTTP.
+        - Classe `CacheHTTP` do módulo `cache_http`.
         - O diretório `data` deve existir para salvar o arquivo.
 
     Exceções:
         - Certifique-se de que o link do Google Drive é válido e acessível.
-        - O diretório `data` deve estar acessível para salvar o arquivo.
-    """
-    file_id = '1xc40YIHHr_d9kQWjZ9i5eLE_OVzI701c'
-    url = f'https://drive.google.com/uc?export=download&id={file_id}'
-    response = requests.get(url)
-    path = 'data/populacao.xlsx'
-    with open(path, 'wb') as f:
-        f.write(response.content)
+        - `requests.HTTPError` caso o servidor responda com erro.
+    """
+    cache = cache or CacheHTTP()
+    path = cache.obter_caminho(POPULACAO_URL)
     return path
 
 
-def plotar_graficos_pib(df_pib):
+def plotar_graficos_pib(df_pib, workers=None, anos=None):
     """
     Gera gráficos comparativos do PIB por estado e ano.
 
     Parâmetros:
         df_pib (pd.DataFrame): DataFrame contendo as colunas 'SIGLA', 'ANO' e 'VALOR',
                                representando a sigla do estado, o ano e o valor do PIB.
+        workers (int, opcional): Quantidade de processos usados na renderização (padrão `PLOT_WORKERS`).
+        anos (list, opcional): Anos com gráfico individual (padrão `ULTIMOS_ANOS`).
 
     Funcionalidade:
         - Ordena os dados por valor do PIB e sigla do estado.
         - Gera um gráfico de barras comparativo do PIB entre estados para todos os anos.
         - Para cada ano, gera gráficos de barras individuais comparando o PIB entre estados.
+        - Renderiza os gráficos em paralelo, enviando a cada processo apenas a fatia de dados do seu gráfico.
         - Salva os gráficos gerados no diretório `output` com nomes específicos.
 
     Dependências:
         - Bibliotecas: seaborn, matplotlib.
-        - O diretório `output` deve existir para salvar os gráficos.
+        - Funções do módulo `graficos`.
 
     Exceções:
         - Certifique-se de que o DataFrame contém as colunas necessárias ('SIGLA', 'ANO', 'VALOR').
         - O diretório `output` deve estar acessível para salvar os arquivos.
 
+    Retorno:
+        int: Quantidade de gráficos gerados (os que não mudaram desde a última execução são pulados).
+
     Saída:
         - Gráficos salvos no formato PNG no diretório `output`.
     """
+    # Importado aqui para que os comandos sem gráficos não carreguem o matplotlib
+    from graficos import TrabalhoGrafico, desenhar_barras, renderizar
+
     # Ordernação por valor e estado
     df_pib = df_pib.sort_values(by=['VALOR', 'SIGLA'], ascending=[False, True])
-    # Configurando estilo
-    sns.set_style(style="whitegrid")
-    # Configurando dimenções
-    plt.figure(figsize=(24, 10))
-    # Criando as barras
-    sns.barplot(x='SIGLA', y='VALOR', hue='ANO', data=df_pib)
-    # Rótulos e título
-    plt.xlabel('Estado')
-    plt.ylabel('Valor (em bilhões)')
-    plt.title('Comparação PIB entre estados')
-    # Plotando
-    plt.tight_layout()
-    plt.savefig('output/estados_pib/comparacao_pib_estados.png')
-    plt.close()
-    #####################
-    for ano in ULTIMOS_ANOS:
-        df_pib_ano = df_pib[df_pib['ANO'] == ano]
-
-        # Ordernação por valor e estado
-        df_pib_ano = df_pib_ano.sort_values(by=['VALOR', 'SIGLA'], ascending=[False, True])
-
-        # Configurando estilo
-        sns.set_style(style="whitegrid")
-
-        # Configurando dimenções
-        plt.figure(figsize=(16, 10))
-
-        # Criando as barras
-        sns.barplot(x='SIGLA', y='VALOR', data=df_pib_ano)
-
-        # Rótulos e título
-        plt.xlabel('Estado')
-        plt.ylabel('Valor (em bilhões)')
-        plt.title(f'Comparação PIB entre estados ({ano})')
-
-        # Plotando
-        plt.tight_layout()
-        plt.savefig(f'output/estados_pib_ano/comparacao_pib_estados_{ano}.png')
-        plt.close()
-
-
-def transformar_dados_pib(data_pib):
+    trabalhos = [TrabalhoGrafico(
+        desenhar_barras,
+        'output/estados_pib/comparacao_pib_estados.png',
+        _para_grafico(df_pib[['SIGLA', 'ANO', 'VALOR']]),
+        dict(x='SIGLA', y='VALOR', hue='ANO', titulo='Comparação PIB entre estados',
+             rotulo_x='Estado', rotulo_y='Valor (em bilhões)', tamanho=(24, 10))
+    )]
+
+    # Fatias de todos os anos em uma única passada, já ordenadas por valor e estado
+    fatias = dict(tuple(df_pib.groupby('ANO', sort=False)))
+    for ano in anos or ULTIMOS_ANOS:
+        df_pib_ano = fatias.get(ano, df_pib.iloc[0:0])
+        trabalhos.append(TrabalhoGrafico(
+            desenhar_barras,
+            f'output/estados_pib_ano/comparacao_pib_estados_{ano}.png',
+            _para_grafico(df_pib_ano[['SIGLA', 'VALOR']]),
+            dict(x='SIGLA', y='VALOR', titulo=f'Comparação PIB entre estados ({ano})',
+                 rotulo_x='Estado', rotulo_y='Valor (em bilhões)', tamanho=(16, 10))
+        ))
+
+    return renderizar(trabalhos, workers)
+
+
+def transformar_dados_pib(data_pib, nivel='N3'):
     """
     Transforma os dados de PIB obtidos da API do IBGE em um DataFrame estruturado.
 
     Parâmetros:
-        data_pib (list): Lista de dicionários contendo os dados de PIB no formato retornado pela API do IBGE.
+        data_pib (list ou iterable): No nível 'N3', lista de dicionários no formato retornado pela API do IBGE.
+                                     No nível 'N6', iterável de blocos (listas) entregues por `obter_dados_pib`.
+        nivel (str): 'N3' para estados ou 'N6' para municípios.
 
     Funcionalidade:
-        - Converte os dados JSON em um DataFrame do pandas.
-        - Extrai o nome do estado a partir da chave 'localidade'.
-        - Para cada ano nos últimos anos definidos, calcula o valor do PIB multiplicado por 100.
-        - Remove colunas desnecessárias e mapeia os nomes dos estados para suas respectivas siglas.
-        - Transforma os anos em uma única coluna chamada 'ANO' e os valores correspondentes em 'VALOR'.
-        - Converte os anos para o tipo inteiro.
+        - Achata as séries diretamente no formato longo (localidade, ano, valor), sem serializar os dados
+          de volta para JSON.
+        - Converte anos e valores de uma só vez com `pd.to_numeric`; marcadores do IBGE como '...' e '-'
+          viram NaN.
+        - Multiplica o valor do PIB por 100.
+        - Estados: mapeia os nomes para as siglas e mantém apenas os anos de `ULTIMOS_ANOS` com valor para
+          todos os estados.
+        - Municípios: consome os blocos à medida que chegam, guardando apenas o formato longo de cada um,
+          obtém a sigla da UF pelo código do município e descarta apenas os valores ausentes.
+        - Converte o resultado para a representação compacta de `esquema.compactar` (sigla categórica, ano int16).
 
     Retorno:
         pd.DataFrame: DataFrame contendo as colunas 'SIGLA', 'ANO' e 'VALOR', representando a sigla do estado, o ano e o valor do PIB.
+                      No nível 'N6' há também a coluna 'LOCALIDADE', com o código IBGE do município.
 
     Dependências:
-        - Bibliotecas: pandas, json.
-        - O dicionário `SIGLAS_ESTADOS` deve estar definido no escopo global.
+        - Bibliotecas: pandas, numpy.
+        - Os dicionários `SIGLAS_ESTADOS` e `ibge.CODIGOS_UF`.
 
     Exceções:
         - Certifique-se de que os dados fornecidos estão no formato esperado.
         - O DataFrame resultante deve conter as colunas necessárias para o processamento subsequente.
     """
-    df_pib = pd.read_json(StringIO(json.dumps(data_pib)), orient='records')
-    # Extraindo o nome do estado
-    df_pib['estado'] = df_pib['localidade'].apply(lambda row: row['nome'])
-    # Extraindo os anos
-    for ano in ULTIMOS_ANOS:
-        df_pib[ano] = df_pib['serie'].apply(lambda row: pd.to_numeric(row.get(str(ano), float('nan'))) * 100)
+    if nivel == 'N6':
+        # Sem blocos (nenhum ano consultado), o resultado é vazio, com as mesmas colunas
+        df_pib = pd.concat([_achatar_series_pib(bloco) for bloco in data_pib] or [_achatar_series_pib([])],
+                           ignore_index=True)
+        df_pib = df_pib[df_pib['ANO'].isin(ULTIMOS_ANOS) & df_pib['VALOR'].notna()]
+        # Os dois primeiros dígitos do código do município identificam a UF
+        df_pib = df_pib.assign(SIGLA=df_pib['ID'].str[:2].map(CODIGOS_UF), LOCALIDADE=df_pib['ID'].astype(int))
+        return compactar(df_pib[['LOCALIDADE', 'SIGLA', 'ANO', 'VALOR']].reset_index(drop=True),
+                         inteiros=('LOCALIDADE',))
+
+    df_pib = _achatar_series_pib(data_pib)
     # Remapeando os nomes dos estados para siglas
-    df_pib['SIGLA'] = df_pib['estado'].map(SIGLAS_ESTADOS)
-    # Removendo colunas desnecessárias
-    df_pib = df_pib.drop(columns=['localidade', 'serie', 'estado'])
-    # Removendo colunas com valores NaN
-    df_pib = df_pib.dropna(axis=1)
-    # Transpondo Anos para coluna ano
-    df_pib = df_pib.melt(id_vars=['SIGLA'], var_name='ANO', value_name='VALOR')
-    # Ano para inteiros
-    df_pib['ANO'] = df_pib['ANO'].astype(int)
-    return df_pib
-
-
-def obter_dados_pib():
+    df_pib['SIGLA'] = df_pib['NOME'].map(SIGLAS_ESTADOS)
+    # Anos considerados
+    df_pib = df_pib[df_pib['ANO'].isin(ULTIMOS_ANOS)]
+    # Removendo anos sem valor para alguma localidade
+    preenchidos = df_pib['VALOR'].notna().groupby(df_pib['ANO']).transform('sum')
+    df_pib = df_pib[preenchidos == len(data_pib)]
+    return compactar(df_pib[['SIGLA', 'ANO', 'VALOR']].reset_index(drop=True))
+
+
+def _achatar_series_pib(series):
+    # Uma linha por (localidade, ano), com o valor do PIB multiplicado por 100
+    ids = [item['localidade']['id'] for item in series]
+    nomes = [item['localidade']['nome'] for item in series]
+    tamanhos = [len(item['serie']) for item in series]
+    anos = [ano for item in series for ano in item['serie']]
+    valores = [valor for item in series for valor in item['serie'].values()]
+    return pd.DataFrame({
+        'ID': pd.Series(np.repeat(ids, tamanhos), dtype=object),
+        'NOME': pd.Series(np.repeat(nomes, tamanhos), dtype=object),
+        'ANO': pd.to_numeric(pd.Series(anos, dtype=object)).astype(int),
+        'VALOR': pd.to_numeric(pd.Series(valores, dtype=object), errors='coerce') * 100,
+    })
+
+
+def _para_grafico(dados):
+    # Com texto, as barras seguem a ordem das linhas (por valor), e não a ordem do dicionário categórico,
+    # e as categorias ausentes na fatia não aparecem
+    return dados.astype({'SIGLA': str})
+
+
+def obter_dados_pib(cache=None, anos=None, nivel='N3'):
     """
     Obtém os dados de PIB a partir da API do IBGE.
 
+    Parâmetros:
+        cache (CacheHTTP, opcional): Cache HTTP usado na requisição. Se omitido, usa o cache padrão em `data/cache_http`.
+        anos (list, opcional): Anos consultados. Se omitido, usa `ULTIMOS_ANOS`; uma lista vazia
+                               (nenhum ano a consultar no modo incremental) não acessa a API.
+        nivel (str): 'N3' para estados (padrão) ou 'N6' para municípios.
+
     Funcionalidade:
-        - Constrói a URL da API com base nos anos definidos em `ULTIMOS_ANOS`.
-        - Realiza uma requisição HTTP para obter os dados de PIB.
-        - Extrai e retorna os dados relevantes da resposta JSON.
+        - Estados: constrói a URL da API com base nos anos informados e faz uma única requisição pelo cache HTTP,
+          que só acessa a API quando o TTL expirou e o conteúdo mudou.
+        - Municípios: divide a consulta em blocos por UF e por período, executados com concorrência limitada,
+          limite de taxa e novas tentativas (`ibge.obter_series_pib`), e entrega os blocos em fluxo.
 
     Retorno:
-        list: Lista de dicionários contendo os dados de PIB no formato retornado pela API.
+        list ou generator: No nível 'N3', lista de dicionários no formato retornado pela API.
+                           No nível 'N6', gerador de blocos nesse mesmo formato, a ser consumido por `transformar_dados_pib`.
 
     Dependências:
-        - Biblioteca `requests` para realizar a requisição HTTP.
+        - Classe `CacheHTTP` do módulo `cache_http` e funções do módulo `ibge`.
         - A API do IBGE deve estar acessível e retornar os dados no formato esperado.
 
     Exceções:
         - Certifique-se de que a API está disponível e que a resposta contém os campos esperados.
         - Pode gerar exceções relacionadas à conexão ou ao formato da resposta JSON.
     """
-    anos_pipe = '|'.join(map(str, ULTIMOS_ANOS))
-    url_pib = f'https://servicodados.ibge.gov.br/api/v3/agregados/5938/periodos/{anos_pipe}/variaveis/37?localidades=N3[all]'
-    response_pib = requests.get(url_pib)
-    data_pib = response_pib.json()[0]['resultados'][0]['series']
+    if nivel not in NIVEIS_PIB:
+        raise ValueError(f"Nível territorial não suportado: {nivel!r} (use {' ou '.join(NIVEIS_PIB)})")
+    anos = ULTIMOS_ANOS if anos is None else list(anos)
+    if not anos:
+        return []
+    cache = cache or CacheHTTP()
+    if nivel == 'N6':
+        return obter_series_pib(cache, anos, [f'N6[N3[{codigo}]]' for codigo in CODIGOS_UF])
+    url_pib = montar_url_pib(anos, 'N3[all]')
+    data_pib = cache.obter_json(url_pib)[0]['resultados'][0]['series']
     return data_pib
 
 
-def carregar_dados_pib(df_pib):
+def carregar_dados_pib(df_pib, cursor):
     """
-    Carrega os dados de PIB em uma tabela no banco de dados PostgreSQL.
+    Carrega os dados de PIB no indicador 'pib' de `fato_indicador` do banco de dados PostgreSQL.
 
     Parâmetros:
         df_pib (pd.DataFrame): DataFrame contendo as colunas 'SIGLA', 'ANO' e 'VALOR',
                                representando a sigla do estado, o ano e o valor do PIB.
+        cursor (psycopg2.extensions.cursor): Cursor da transação aberta pela `SessaoBanco`.
 
     Funcionalidade:
-        - Conecta-se ao banco de dados PostgreSQL utilizando as credenciais configuradas.
-        - Cria a tabela `tabela_pib` caso ela não exista.
-        - Insere os dados do DataFrame na tabela, atualizando os valores em caso de conflito.
+        - Envia os dados do DataFrame com `COPY` para uma tabela de staging e os mescla na tabela
+          em um único comando, atualizando os valores em caso de conflito.
+        - Exibe a quantidade de linhas inseridas e atualizadas.
 
     Dependências:
-        - Biblioteca `psycopg2` para conexão com o banco de dados.
-        - As variáveis globais `db_name`, `db_user`, `db_password`, `db_host` e `db_port` devem estar configuradas.
+        - Função `carregar_indicador` do módulo `carga` para a carga em massa.
+        - A tabela `fato_indicador` é criada pela `SessaoBanco` (módulo `banco`); `tabela_pib` é a visão
+          de compatibilidade do indicador no nível estadual.
 
     Exceções:
-        - Gera uma mensagem de erro caso ocorra algum problema na conexão ou na execução das operações no banco.
+        - Erros do banco são propagados para que a transação seja desfeita por quem chama.
 
-    Saída:
-        - Dados inseridos ou atualizados na tabela `tabela_pib` no banco de dados PostgreSQL.
-    """
-    try:
-        # Conexão com o banco de dados PostgreSQL
-        conn = psycopg2.connect(
-            dbname=db_name,
-            user=db_user,
-            password=db_password,
-            host=db_host,
-            port=db_port
-        )
-        cursor = conn.cursor()
-
-        # Criação da tabela se não existir
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS tabela_pib (
-                sigla VARCHAR(2),
-                ano INT,
-                valor NUMERIC,
-                PRIMARY KEY (sigla, ano)
-            );
-        """)
-
-        # Inserção dos dados no banco
-        for _, row in df_pib.iterrows():
-            cursor.execute("""
-                INSERT INTO tabela_pib (sigla, ano, valor)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (sigla, ano) DO UPDATE
-                SET valor = EXCLUDED.valor;
-            """, (row['SIGLA'], row['ANO'], row['VALOR']))
-
-        # Commit e fechamento da conexão
-        conn.commit()
-        cursor.close()
-        conn.close()
-    except Exception as e:
-        print(f"Erro ao carregar dados no PostgreSQL: {e}")
-
-
-def carrega_dados_populacao(df_pop):
-    """
-    Carrega os dados de população em uma tabela no banco de dados PostgreSQL.
+    Retorno:
+        ResultadoCarga: Quantidade de linhas inseridas e atualizadas.
+    """
+    # Inserção dos dados no banco via COPY e merge em lote
+    resultado = carregar_indicador(cursor, 'pib', df_pib)
+    print(f"fato_indicador (pib): {resultado.inseridos} linhas inseridas, {resultado.atualizados} atualizadas")
+    return resultado
+
+
+def carregar_dados_pib_municipios(df_pib, cursor):
+    """
+    Carrega o PIB municipal no indicador 'pib' de `fato_indicador`, no nível territorial `NIVEL_MUNICIPIO`.
+
+    Parâmetros:
+        df_pib (pd.DataFrame): Resultado de `transformar_dados_pib(..., nivel='N6')`, com as colunas
+                               'LOCALIDADE' (código IBGE do município), 'ANO' e 'VALOR'.
+        cursor (psycopg2.extensions.cursor): Cursor da transação aberta pela `SessaoBanco`.
+
+    Funcionalidade:
+        - Usa a mesma carga em massa dos estados, com o código do município como localidade; as linhas
+          municipais não aparecem em `tabela_pib`, que é a visão do nível estadual.
+
+    Retorno:
+        ResultadoCarga: Quantidade de linhas inseridas e atualizadas.
+    """
+    resultado = carregar_indicador(cursor, 'pib', df_pib, nivel_territorial=NIVEL_MUNICIPIO,
+                                   coluna_localidade='LOCALIDADE')
+    print(f"fato_indicador (pib, municípios): {resultado.inseridos} linhas inseridas, "
+          f"{resultado.atualizados} atualizadas")
+    return resultado
+
+
+def carrega_dados_populacao(df_pop, cursor):
+    """
+    Carrega os dados de população no indicador 'populacao' de `fato_indicador` do banco de dados PostgreSQL.
 
     Parâmetros:
         df_pop (pd.DataFrame): DataFrame contendo as colunas 'SIGLA', 'ANO' e 'VALOR',
                                representando a sigla do estado, o ano e o número de pessoas.
+        cursor (psycopg2.extensions.cursor): Cursor da transação aberta pela `SessaoBanco`.
 
     Funcionalidade:
-        - Conecta-se ao banco de dados PostgreSQL utilizando as credenciais configuradas.
-        - Cria a tabela `tabela_pop` caso ela não exista.
-        - Insere os dados do DataFrame na tabela, atualizando os valores em caso de conflito.
+        - Envia os dados do DataFrame com `COPY` para uma tabela de staging e os mescla na tabela
+          em um único comando, atualizando os valores em caso de conflito.
+        - Exibe a quantidade de linhas inseridas e atualizadas.
 
     Dependências:
-        - Biblioteca `psycopg2` para conexão com o banco de dados.
-        - As variáveis globais `db_name`, `db_user`, `db_password`, `db_host` e `db_port` devem estar configuradas.
+        - Função `carregar_indicador` do módulo `carga` para a carga em massa.
+        - A tabela `fato_indicador` é criada pela `SessaoBanco` (módulo `banco`); `tabela_pop` é a visão
+          de compatibilidade do indicador no nível estadual.
 
     Exceções:
-        - Gera uma mensagem de erro caso ocorra algum problema na conexão ou na execução das operações no banco.
+        - Erros do banco são propagados para que a transação seja desfeita por quem chama.
 
-    Saída:
-        - Dados inseridos ou atualizados na tabela `tabela_pop` no banco de dados PostgreSQL.
-    """
-    try:
-        # Conexão com o banco de dados PostgreSQL
-        conn = psycopg2.connect(
-            dbname=db_name,
-            user=db_user,
-            password=db_password,
-            host=db_host,
-            port=db_port
-        )
-        cursor = conn.cursor()
-
-        # Criação da tabela se não existir
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS tabela_pop (
-                sigla VARCHAR(2),
-                ano INT,
-                valor NUMERIC,
-                PRIMARY KEY (sigla, ano)
-            );
-        """)
-
-        # Inserção dos dados no banco
-        for _, row in df_pop.iterrows():
-            cursor.execute("""
-                INSERT INTO tabela_pop (sigla, ano, valor)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (sigla, ano) DO UPDATE
-                SET valor = EXCLUDED.valor;
-            """, (row['SIGLA'], row['ANO'], row['VALOR']))
-
-        # Commit e fechamento da conexão
-        conn.commit()
-        cursor.close()
-        conn.close()
-    except Exception as e:
-        print(f"Erro ao carregar dados no PostgreSQL: {e}")
-
-
-def carrega_dados_pib_per_capta(tabela_pib_per_capta):
-    """
-    Carrega os dados de PIB per capita em uma tabela no banco de dados PostgreSQL.
+    Retorno:
+        ResultadoCarga: Quantidade de linhas inseridas e atualizadas.
+    """
+    # Inserção dos dados no banco via COPY e merge em lote
+    resultado = carregar_indicador(cursor, 'populacao', df_pop)
+    print(f"fato_indicador (populacao): {resultado.inseridos} linhas inseridas, {resultado.atualizados} atualizadas")
+    return resultado
+
+
+def carrega_dados_pib_per_capta(tabela_pib_per_capta, cursor):
+    """
+    Carrega os dados de PIB per capita no indicador 'pib_per_capta' de `fato_indicador` (PostgreSQL).
 
     Parâmetros:
         tabela_pib_per_capta (pd.DataFrame): DataFrame contendo as colunas 'SIGLA', 'ANO' e 'PIB_PER_CAPTA',
                                              representando a sigla do estado, o ano e o valor do PIB per capita.
+        cursor (psycopg2.extensions.cursor): Cursor da transação aberta pela `SessaoBanco`.
 
     Funcionalidade:
-        - Conecta-se ao banco de dados PostgreSQL utilizando as credenciais configuradas.
-        - Cria a tabela `tabela_pib_per_capta` caso ela não exista.
-        - Insere os dados do DataFrame na tabela, atualizando os valores em caso de conflito.
+        - Envia os dados do DataFrame com `COPY` para uma tabela de staging e os mescla na tabela
+          em um único comando, atualizando os valores em caso de conflito.
+        - Exibe a quantidade de linhas inseridas e atualizadas.
 
     Dependências:
-        - Biblioteca `psycopg2` para conexão com o banco de dados.
-        - As variáveis globais `db_name`, `db_user`, `db_password`, `db_host` e `db_port` devem estar configuradas.
+        - Função `carregar_indicador` do módulo `carga` para a carga em massa.
+        - A tabela `fato_indicador` é criada pela `SessaoBanco` (módulo `banco`); `tabela_pib_per_capta` é a visão
+          de compatibilidade do indicador no nível estadual.
 
     Exceções:
-        - Gera uma mensagem de erro caso ocorra algum problema na conexão ou na execução das operações no banco.
+        - Erros do banco são propagados para que a transação seja desfeita por quem chama.
 
-    Saída:
-        - Dados inseridos ou atualizados na tabela `tabela_pib_per_capta` no banco de dados PostgreSQL.
-    """
-    try:
-        # Conexão com o banco de dados PostgreSQL
-        conn = psycopg2.connect(
-            dbname=db_name,
-            user=db_user,
-            password=db_password,
-            host=db_host,
-            port=db_port
-        )
-        cursor = conn.cursor()
-
-        # Criação da tabela se não existir
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS tabela_pib_per_capta (
-                sigla VARCHAR(2),
-                ano INT,
-                valor NUMERIC,
-                PRIMARY KEY (sigla, ano)
-            );
-        """)
-
-        # Inserção dos dados no banco
-        for _, row in tabela_pib_per_capta.iterrows():
-            cursor.execute("""
-                INSERT INTO tabela_pib_per_capta (sigla, ano, valor)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (sigla, ano) DO UPDATE
-                SET valor = EXCLUDED.valor;
-            """, (row['SIGLA'], row['ANO'], row['PIB_PER_CAPTA']))
-
-        # Commit e fechamento da conexão
-        conn.commit()
-        cursor.close()
-        conn.close()
-    except Exception as e:
-        print(f"Erro ao carregar dados no PostgreSQL: {e}")
+    Retorno:
+        ResultadoCarga: Quantidade de linhas inseridas e atualizadas.
+    """
+    # Inserção dos dados no banco via COPY e merge em lote
+    resultado = carregar_indicador(cursor, 'pib_per_capta', tabela_pib_per_capta, coluna_valor='PIB_PER_CAPTA')
+    print(f"fato_indicador (pib_per_capta): {resultado.inseridos} linhas inseridas, {resultado.atualizados} atualizadas")
+    return resultado
+
+
+def carrega_previsao_pib_per_capta(previsoes, cursor):
+    """
+    Carrega as previsões de PIB per capita na tabela `tabela_previsao_pib_per_capta` do banco de dados PostgreSQL.
+
+    Parâmetros:
+        previsoes (pd.DataFrame): DataFrame contendo as colunas 'SIGLA', 'ANO', 'MODELO' e 'VALOR',
+                                  representando a sigla do estado, o ano previsto, o modelo e o valor previsto.
+        cursor (psycopg2.extensions.cursor): Cursor da transação aberta pela `SessaoBanco`.
+
+    Funcionalidade:
+        - Envia os dados do DataFrame com `COPY` para uma tabela de staging e os mescla na tabela
+          em um único comando, atualizando os valores em caso de conflito.
+        - Exibe a quantidade de linhas inseridas e atualizadas.
+
+    Dependências:
+        - Função `carregar_dataframe` do módulo `carga` para a carga em massa.
+        - A tabela `tabela_previsao_pib_per_capta` é criada pela `SessaoBanco` (módulo `banco`).
+
+    Exceções:
+        - Erros do banco são propagados para que a transação seja desfeita por quem chama.
+
+    Retorno:
+        ResultadoCarga: Quantidade de linhas inseridas e atualizadas.
+    """
+    # Inserção dos dados no banco via COPY e merge em lote
+    resultado = carregar_dataframe(
+        cursor, 'tabela_previsao_pib_per_capta', previsoes,
+        colunas={'SIGLA': 'sigla', 'ANO': 'ano', 'MODELO': 'modelo', 'VALOR': 'valor'},
+        chave=('sigla', 'ano', 'modelo')
+    )
+    print(f"tabela_previsao_pib_per_capta: {resultado.inseridos} linhas inseridas, {resultado.atualizados} atualizadas")
+    return resultado
 
 
 if __name__ == '__main__':
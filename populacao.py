@@ -0,0 +1,255 @@
+"""
+Conversão colunar do arquivo de projeção da população do IBGE.
+
+O Excel é lido uma única vez em modo somente leitura, em fluxo, guardando apenas
+as colunas usadas pelo pipeline (SIGLA, SEXO e os anos). O resultado é salvo em
+Parquet com o hash do arquivo no nome, de modo que as execuções seguintes leem
+o Parquet em milissegundos em vez de interpretar a planilha de novo.
+
+No modo em fluxo (`POPULACAO_MODO=fluxo`), pensado para arquivos municipais ou
+com várias planilhas, nada é convertido: as linhas são lidas em blocos de tamanho
+limitado, cada bloco é filtrado e somado por sigla e as somas parciais são
+acumuladas, de modo que o pico de memória não depende do tamanho da entrada.
+Vários arquivos ou planilhas podem ser somados em paralelo, um por processo.
+"""
+import glob
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+COLUNAR_DIR = os.getenv('COLUNAR_DIR', 'data/colunar')
+# Equivale a `pd.read_excel(..., header=1, skiprows=4)`: o cabeçalho está na 6ª linha da planilha
+LINHA_CABECALHO = 6
+COLUNAS_TEXTO = ('SIGLA', 'SEXO')
+TAMANHO_BLOCO = 1 << 20
+# 'colunar' converte o Excel para Parquet e soma em memória; 'fluxo' soma em blocos, sem conversão
+POPULACAO_MODO = os.getenv('POPULACAO_MODO', 'colunar')
+MODOS_POPULACAO = ('colunar', 'fluxo')
+POPULACAO_LINHAS_POR_BLOCO = int(os.getenv('POPULACAO_LINHAS_POR_BLOCO', '50000'))
+POPULACAO_WORKERS = int(os.getenv('POPULACAO_WORKERS', '1'))
+# Planilhas lidas de cada arquivo no modo em fluxo, separadas por vírgula (padrão: a planilha ativa)
+POPULACAO_ABAS = [aba.strip() for aba in os.getenv('POPULACAO_ABAS', '').split(',') if aba.strip()]
+
+
+def hash_arquivo(path):
+    """Calcula o SHA-256 (hexadecimal) do arquivo, lendo em blocos."""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b''):
+            sha256.update(bloco)
+    return sha256.hexdigest()
+
+
+def ler_populacao_colunar(path, diretorio=COLUNAR_DIR):
+    """
+    Lê o arquivo de população no formato colunar, convertendo o Excel apenas na primeira vez.
+
+    Parâmetros:
+        path (str): Caminho para o arquivo Excel de população.
+        diretorio (str): Diretório dos arquivos Parquet convertidos (padrão `data/colunar`).
+
+    Funcionalidade:
+        - Procura `populacao_<sha256>.parquet`; se existir, apenas o lê.
+        - Caso contrário, converte o Excel com `converter_excel_populacao` e salva o Parquet de forma atômica.
+
+    Retorno:
+        pd.DataFrame: Colunas 'SIGLA', 'SEXO' e uma coluna por ano (nome em texto), uma linha por idade.
+    """
+    destino = os.path.join(diretorio, f'populacao_{hash_arquivo(path)}.parquet')
+    if os.path.exists(destino):
+        return pd.read_parquet(destino)
+
+    df_pop = converter_excel_populacao(path)
+    os.makedirs(diretorio, exist_ok=True)
+    temporario = f'{destino}.tmp'
+    df_pop.to_parquet(temporario, index=False)
+    os.replace(temporario, destino)
+    return df_pop
+
+
+def converter_excel_populacao(path):
+    """
+    Converte a planilha de população em um DataFrame apenas com as colunas necessárias.
+
+    Parâmetros:
+        path (str): Caminho para o arquivo Excel de população.
+
+    Funcionalidade:
+        - Abre a planilha com `openpyxl` em modo somente leitura e percorre as linhas em fluxo,
+          sem montar a planilha inteira em memória.
+        - Mantém apenas 'SIGLA', 'SEXO' e as colunas de anos; linhas sem sigla (notas e rodapé) são ignoradas.
+
+    Retorno:
+        pd.DataFrame: Colunas 'SIGLA', 'SEXO' e uma coluna por ano (nome em texto).
+
+    Exceções:
+        - `KeyError` se o cabeçalho não contiver as colunas 'SIGLA' e 'SEXO'.
+    """
+    df_pop, = ler_blocos_populacao(path)
+    return df_pop
+
+
+def ler_blocos_populacao(path, aba=None, linhas_por_bloco=None):
+    """
+    Lê a planilha de população em blocos de linhas, apenas com as colunas necessárias.
+
+    Parâmetros:
+        path (str): Caminho para o arquivo Excel de população.
+        aba (str, opcional): Nome da planilha (padrão: a planilha ativa).
+        linhas_por_bloco (int, opcional): Linhas de dados por bloco; None lê a planilha em um único bloco.
+
+    Funcionalidade:
+        - Abre o arquivo com `openpyxl` em modo somente leitura e percorre as linhas em fluxo.
+        - Mantém apenas 'SIGLA', 'SEXO' e as colunas de anos; linhas sem sigla (notas e rodapé) são ignoradas.
+        - Gera ao menos um bloco, vazio se a planilha não tiver dados.
+
+    Retorno:
+        Iterator[pd.DataFrame]: Blocos com as colunas 'SIGLA', 'SEXO' e uma coluna por ano (nome em texto).
+
+    Exceções:
+        - `KeyError` se o cabeçalho não contiver as colunas 'SIGLA' e 'SEXO' ou se a planilha não existir.
+    """
+    # Importado aqui: só é necessário quando o Excel é lido (no modo colunar, só na conversão)
+    from openpyxl import load_workbook
+
+    # O arquivo é passado aberto: objetos do cache HTTP não têm a extensão que o openpyxl exige em caminhos
+    with open(path, 'rb') as arquivo:
+        livro = load_workbook(arquivo, read_only=True, data_only=True)
+        try:
+            planilha = livro[aba] if aba else livro.active
+            linhas = planilha.iter_rows(min_row=LINHA_CABECALHO, values_only=True)
+            cabecalho = [_nome_coluna(valor) for valor in next(linhas)]
+            indices = {nome: posicao for posicao, nome in enumerate(cabecalho)
+                       if nome in COLUNAS_TEXTO or nome.isdigit()}
+            for coluna in COLUNAS_TEXTO:
+                if coluna not in indices:
+                    raise KeyError(f"Coluna '{coluna}' não encontrada no cabeçalho de {path}")
+
+            colunas = {nome: [] for nome in indices}
+            posicao_sigla = indices['SIGLA']
+            lidas = 0
+            gerados = 0
+            for linha in linhas:
+                if posicao_sigla >= len(linha) or linha[posicao_sigla] is None:
+                    continue
+                for nome, posicao in indices.items():
+                    colunas[nome].append(linha[posicao] if posicao < len(linha) else None)
+                lidas += 1
+                if linhas_por_bloco and lidas == linhas_por_bloco:
+                    yield _montar_bloco(colunas)
+                    gerados += 1
+                    colunas = {nome: [] for nome in indices}
+                    lidas = 0
+            if lidas or not gerados:
+                yield _montar_bloco(colunas)
+        finally:
+            livro.close()
+
+
+def somar_populacao(path, sexo='Ambos', modo=POPULACAO_MODO):
+    """
+    Soma as linhas de idade de cada sigla, para o sexo informado.
+
+    Parâmetros:
+        path (str): Arquivo Excel de população ou, no modo em fluxo, um diretório com arquivos .xlsx.
+        sexo (str): Valor da coluna 'SEXO' considerado (padrão 'Ambos').
+        modo (str): 'colunar' (padrão `POPULACAO_MODO`) lê o Parquet convertido por `ler_populacao_colunar`;
+                    'fluxo' soma em blocos com `agregar_populacao_em_blocos`.
+
+    Retorno:
+        pd.DataFrame: Coluna 'SIGLA' (ordenada) e uma coluna por ano (nome em texto), uma linha por sigla,
+                      incluindo as linhas de agregados regionais e nacional do arquivo.
+
+    Exceções:
+        - `ValueError` se o modo for inválido.
+    """
+    if modo not in MODOS_POPULACAO:
+        raise ValueError(f"Modo de leitura da população inválido: {modo!r} (use {' ou '.join(MODOS_POPULACAO)})")
+    if modo == 'fluxo':
+        return agregar_populacao_em_blocos(fontes_populacao(path), sexo=sexo)
+    df_pop = ler_populacao_colunar(path)
+    df_pop = df_pop[df_pop['SEXO'] == sexo].drop(columns=['SEXO'])
+    return df_pop.groupby('SIGLA', as_index=False).sum()
+
+
+def fontes_populacao(path, abas=POPULACAO_ABAS):
+    """
+    Lista as fontes (arquivo, planilha) do modo em fluxo.
+
+    Parâmetros:
+        path (str): Arquivo Excel ou diretório; de um diretório são usados todos os arquivos .xlsx, em ordem.
+        abas (list): Planilhas lidas de cada arquivo (padrão `POPULACAO_ABAS`); vazia usa a planilha ativa.
+
+    Retorno:
+        list: Pares (caminho, aba), com aba None para a planilha ativa.
+
+    Exceções:
+        - `FileNotFoundError` se o diretório não tiver arquivos .xlsx.
+    """
+    arquivos = sorted(glob.glob(os.path.join(path, '*.xlsx'))) if os.path.isdir(path) else [path]
+    if not arquivos:
+        raise FileNotFoundError(f'Nenhum arquivo .xlsx de população em {path}')
+    return [(arquivo, aba) for arquivo in arquivos for aba in (abas or [None])]
+
+
+def agregar_populacao_em_blocos(fontes, sexo='Ambos', linhas_por_bloco=POPULACAO_LINHAS_POR_BLOCO,
+                                workers=POPULACAO_WORKERS):
+    """
+    Soma a população por sigla e ano lendo as planilhas em blocos de tamanho limitado.
+
+    Parâmetros:
+        fontes (list): Pares (caminho, aba) de `fontes_populacao`.
+        sexo (str): Valor da coluna 'SEXO' considerado.
+        linhas_por_bloco (int): Linhas de dados mantidas em memória por vez, em cada processo
+                                (padrão `POPULACAO_LINHAS_POR_BLOCO`).
+        workers (int): Processos usados quando há mais de uma fonte (padrão `POPULACAO_WORKERS`).
+
+    Funcionalidade:
+        - Em cada fonte, filtra cada bloco pelo sexo e o soma por sigla; a soma parcial é acumulada
+          na soma da fonte e o bloco é descartado.
+        - Com mais de um worker e mais de uma fonte, cada fonte é somada em um processo do pool;
+          os processos devolvem apenas as somas, com uma linha por sigla.
+        - O pico de memória depende de `linhas_por_bloco` e da quantidade de siglas, não do tamanho das planilhas.
+
+    Retorno:
+        pd.DataFrame: Coluna 'SIGLA' (ordenada) e uma coluna por ano (nome em texto), como em `somar_populacao`.
+    """
+    if workers > 1 and len(fontes) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(fontes))) as executor:
+            parciais = executor.map(_somar_fonte, fontes, [sexo] * len(fontes), [linhas_por_bloco] * len(fontes))
+            acumulado = _acumular(parciais)
+    else:
+        acumulado = _acumular(_somar_fonte(fonte, sexo, linhas_por_bloco) for fonte in fontes)
+    return acumulado.sort_index().rename_axis('SIGLA').reset_index()
+
+
+def _somar_fonte(fonte, sexo, linhas_por_bloco):
+    caminho, aba = fonte
+    parciais = (bloco[bloco['SEXO'] == sexo].drop(columns=['SEXO']).groupby('SIGLA').sum()
+                for bloco in ler_blocos_populacao(caminho, aba, linhas_por_bloco))
+    return _acumular(parciais)
+
+
+def _acumular(parciais):
+    # Soma incremental: no máximo duas somas parciais (uma linha por sigla) em memória ao mesmo tempo
+    acumulado = None
+    for parcial in parciais:
+        acumulado = parcial if acumulado is None else pd.concat([acumulado, parcial]).groupby(level=0).sum()
+    return acumulado
+
+
+def _montar_bloco(colunas):
+    df_pop = pd.DataFrame({nome: valores for nome, valores in colunas.items() if nome in COLUNAS_TEXTO})
+    for nome, valores in colunas.items():
+        if nome not in COLUNAS_TEXTO:
+            df_pop[nome] = pd.to_numeric(pd.Series(valores, dtype=object))
+    return df_pop
+
+
+def _nome_coluna(valor):
+    # Anos podem vir como números (inclusive float) no cabeçalho da planilha
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return '' if valor is None else str(valor).strip()
@@ -0,0 +1,112 @@
+"""
+Previsão do PIB per capita de todos os estados de uma só vez.
+
+Os dados são organizados em uma matriz estados × anos e os mínimos quadrados
+(ponderados) são resolvidos em forma fechada com NumPy, em uma única passada
+para todos os estados, em vez de ajustar um modelo por estado.
+"""
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+PREVISAO_HORIZONTE = int(os.getenv('PREVISAO_HORIZONTE', '4'))
+PREVISAO_MODELO = os.getenv('PREVISAO_MODELO', 'linear')
+# Meia-vida, em anos, dos pesos do modelo 'ponderado'
+PREVISAO_MEIA_VIDA = float(os.getenv('PREVISAO_MEIA_VIDA', '3'))
+
+MODELOS = ('linear', 'log_linear', 'ponderado')
+# Legenda da tendência ajustada de cada modelo nos gráficos de previsão
+ROTULOS_MODELOS = {
+    'linear': 'Regressão Linear',
+    'log_linear': 'Regressão Log-Linear',
+    'ponderado': 'Regressão Linear Ponderada',
+}
+
+ResultadoPrevisao = namedtuple('ResultadoPrevisao', ['ajustados', 'previsoes', 'modelo'])
+
+
+def prever(tabela, coluna_valor='PIB_PER_CAPTA', horizonte=PREVISAO_HORIZONTE, modelo=PREVISAO_MODELO,
+           meia_vida=PREVISAO_MEIA_VIDA):
+    """
+    Ajusta uma tendência por estado e prevê os próximos anos, para todos os estados ao mesmo tempo.
+
+    Parâmetros:
+        tabela (pd.DataFrame): DataFrame com as colunas 'SIGLA', 'ANO' e `coluna_valor`.
+        coluna_valor (str): Coluna com a série a ser prevista.
+        horizonte (int): Quantidade de anos previstos após o último ano com dados.
+        modelo (str): 'linear' (reta por mínimos quadrados), 'log_linear' (reta sobre o logaritmo,
+                      isto é, crescimento percentual constante) ou 'ponderado' (reta com pesos que
+                      decaem exponencialmente para os anos mais antigos).
+        meia_vida (float): Meia-vida dos pesos, em anos, usada pelo modelo 'ponderado'.
+
+    Funcionalidade:
+        - Monta a matriz estados × anos; anos sem dado (e, no 'log_linear', valores não positivos) recebem
+          peso zero. Todos os valores observados aparecem em `ajustados`.
+        - Resolve as equações normais dos mínimos quadrados ponderados de forma vetorizada para todas as linhas.
+
+    Retorno:
+        ResultadoPrevisao: `ajustados` com 'SIGLA', 'ANO', `coluna_valor` e 'AJUSTADO' (valor da tendência nos
+                           anos observados), `previsoes` com 'SIGLA', 'ANO', 'MODELO' e 'VALOR' e `modelo`,
+                           o nome do modelo usado.
+
+    Exceções:
+        - `ValueError` para um modelo desconhecido.
+    """
+    if modelo not in MODELOS:
+        raise ValueError(f"Modelo de previsão inválido: {modelo!r} (use {', '.join(MODELOS)})")
+
+    matriz = tabela.pivot_table(index='SIGLA', columns='ANO', values=coluna_valor, aggfunc='mean', observed=True)
+    siglas = matriz.index.to_numpy()
+    anos = matriz.columns.to_numpy(dtype=float)
+    valores = matriz.to_numpy(dtype=float)
+
+    observado = ~np.isnan(valores)
+    # Pontos usados no ajuste; no 'log_linear', valores não positivos (sem logaritmo) ficam com peso
+    # zero, mas continuam em `ajustados`, para que os gráficos mostrem todos os dados reais
+    ajustavel = observado
+    if modelo == 'log_linear':
+        ajustavel = observado & (valores > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            y = np.log(valores)
+    else:
+        y = valores
+    y = np.where(ajustavel, y, 0.0)
+
+    pesos = ajustavel.astype(float)
+    if modelo == 'ponderado':
+        pesos *= 0.5 ** ((anos.max() - anos) / meia_vida)
+
+    # Anos centralizados para estabilidade numérica
+    centro = anos.mean()
+    x = anos - centro
+    soma_p = pesos.sum(axis=1)
+    soma_x = pesos @ x
+    soma_xx = pesos @ (x * x)
+    soma_y = (pesos * y).sum(axis=1)
+    soma_xy = (pesos * y) @ x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inclinacao = (soma_p * soma_xy - soma_x * soma_y) / (soma_p * soma_xx - soma_x ** 2)
+        intercepto = (soma_y - inclinacao * soma_x) / soma_p
+
+    anos_futuros = np.arange(anos.max() + 1, anos.max() + 1 + horizonte) if anos.size else np.array([])
+    ajuste = intercepto[:, None] + inclinacao[:, None] * x[None, :]
+    futuro = intercepto[:, None] + inclinacao[:, None] * (anos_futuros - centro)[None, :]
+    if modelo == 'log_linear':
+        ajuste, futuro = np.exp(ajuste), np.exp(futuro)
+
+    ajustados = pd.DataFrame({
+        'SIGLA': np.repeat(siglas, anos.size),
+        'ANO': np.tile(anos, siglas.size).astype(int),
+        coluna_valor: valores.ravel(),
+        'AJUSTADO': ajuste.ravel(),
+    })
+    ajustados = ajustados[observado.ravel()].reset_index(drop=True)
+    previsoes = pd.DataFrame({
+        'SIGLA': np.repeat(siglas, anos_futuros.size),
+        'ANO': np.tile(anos_futuros, siglas.size).astype(int),
+        'MODELO': modelo,
+        'VALOR': futuro.ravel(),
+    })
+    return ResultadoPrevisao(ajustados, previsoes.dropna(subset=['VALOR']).reset_index(drop=True), modelo)
@@ -0,0 +1,190 @@
+"""
+Agregados regionais e nacional (estado → grande região → Brasil).
+
+A dimensão territorial associa cada UF à sua grande região pelo primeiro dígito
+do código IBGE da UF. Os totais de PIB e população e o PIB per capita de cada
+região e do Brasil, por ano, são calculados no PostgreSQL a partir das linhas
+estaduais de `fato_indicador` e gravados na mesma tabela, nos níveis territoriais
+'regiao' e 'pais' (a visão `tabela_agregados` os apresenta lado a lado).
+
+Quando só alguns estados mudam, apenas os pares (região, ano) e (Brasil, ano)
+afetados são recalculados. Os totais de população são conferidos com as linhas
+agregadas oficiais do arquivo de população do IBGE.
+"""
+import os
+
+import pandas as pd
+from psycopg2 import sql
+
+from banco import NIVEL_ESTADO, NIVEL_PAIS, NIVEL_REGIAO
+from ibge import CODIGOS_UF
+from populacao import somar_populacao
+
+# Diferença relativa máxima aceita entre os totais calculados e os agregados oficiais
+AGREGADOS_TOLERANCIA = float(os.getenv('AGREGADOS_TOLERANCIA', '0.001'))
+
+# Siglas das grandes regiões como no arquivo de população do IBGE
+REGIOES = {
+    'NO': 'Norte',
+    'ND': 'Nordeste',
+    'SD': 'Sudeste',
+    'SU': 'Sul',
+    'CO': 'Centro-Oeste',
+}
+SIGLA_BRASIL = 'BR'
+SIGLAS_AGREGADOS = (*REGIOES, SIGLA_BRASIL)
+# O primeiro dígito do código IBGE da UF identifica a grande região
+_REGIAO_POR_DIGITO = {'1': 'NO', '2': 'ND', '3': 'SD', '4': 'SU', '5': 'CO'}
+REGIAO_UF = {sigla: _REGIAO_POR_DIGITO[codigo[0]] for codigo, sigla in CODIGOS_UF.items()}
+# Indicadores somados das UFs; o PIB per capita é a razão entre as somas
+INDICADORES_SOMADOS = ('pib', 'populacao')
+
+
+def atualizar_agregados(chaves, cursor):
+    """
+    Recalcula os agregados regionais e nacional em `fato_indicador`.
+
+    Parâmetros:
+        chaves (pd.DataFrame ou None): Pares 'SIGLA' e 'ANO' estaduais cujo PIB ou população mudou;
+                                       None recalcula todos os anos carregados.
+        cursor (psycopg2.extensions.cursor): Cursor da transação em andamento, que já contém
+                                             as cargas de PIB e população.
+
+    Funcionalidade:
+        - Remove e recalcula apenas os pares (região, ano) das UFs alteradas e (Brasil, ano) dos anos alterados.
+        - Soma PIB e população das UFs com `GROUPING SETS` (região e Brasil em uma única passada) e
+          calcula o PIB per capita a partir das somas.
+        - Um total só é gravado se todas as UFs da região (ou do país) tiverem valor naquele ano,
+          para que um estado ausente não produza um total parcial.
+
+    Retorno:
+        int: Quantidade de linhas de agregados gravadas.
+    """
+    if chaves is not None and chaves.empty:
+        return 0
+    dimensao = (list(REGIAO_UF), list(REGIAO_UF.values()))
+    if chaves is None:
+        origem = sql.SQL("""
+            SELECT DISTINCT localidade AS sigla, ano FROM fato_indicador
+            WHERE nivel_territorial = {estado} AND indicador = ANY({somados})
+        """).format(estado=sql.Literal(NIVEL_ESTADO), somados=sql.Literal(list(INDICADORES_SOMADOS)))
+    else:
+        origem = sql.SQL("SELECT * FROM unnest({}::varchar[], {}::int[]) AS c(sigla, ano)").format(
+            sql.Literal(chaves['SIGLA'].astype(str).tolist()), sql.Literal(chaves['ANO'].astype(int).tolist()))
+    # NULL na região representa o Brasil, como nas linhas de total do GROUPING SETS
+    afetados = sql.SQL("""
+        WITH dimensao AS (
+            SELECT * FROM unnest(%s::varchar[], %s::varchar[]) AS d(sigla, regiao)
+        ),
+        chaves AS ({origem})
+        SELECT DISTINCT d.regiao, c.ano FROM chaves c JOIN dimensao d ON d.sigla = c.sigla
+        UNION
+        SELECT DISTINCT NULL::varchar, c.ano FROM chaves c
+    """).format(origem=origem)
+
+    cursor.execute(sql.SQL("CREATE TEMP TABLE _agregados_afetados AS {}").format(afetados), dimensao)
+    cursor.execute("""
+        DELETE FROM fato_indicador f
+        USING _agregados_afetados a
+        WHERE f.nivel_territorial IN (%s, %s)
+          AND f.localidade = COALESCE(a.regiao, %s) AND f.ano = a.ano;
+    """, (NIVEL_REGIAO, NIVEL_PAIS, SIGLA_BRASIL))
+    cursor.execute("""
+        WITH dimensao AS (
+            SELECT * FROM unnest(%(siglas)s::varchar[], %(regioes)s::varchar[]) AS d(sigla, regiao)
+        ),
+        esperados AS (
+            SELECT regiao, count(*) AS estados FROM dimensao GROUP BY ROLLUP (regiao)
+        ),
+        somas AS (
+            SELECT f.indicador, d.regiao, f.ano, sum(f.valor) AS valor, count(*) AS estados
+            FROM fato_indicador f
+            JOIN dimensao d ON d.sigla = f.localidade
+            WHERE f.nivel_territorial = %(estado)s
+              AND f.indicador = ANY(%(somados)s)
+              AND f.ano IN (SELECT ano FROM _agregados_afetados)
+            GROUP BY GROUPING SETS ((f.indicador, d.regiao, f.ano), (f.indicador, f.ano))
+        ),
+        completos AS (
+            SELECT s.indicador, s.regiao, s.ano, s.valor
+            FROM somas s
+            JOIN esperados e ON e.regiao IS NOT DISTINCT FROM s.regiao AND e.estados = s.estados
+            JOIN _agregados_afetados a ON a.regiao IS NOT DISTINCT FROM s.regiao AND a.ano = s.ano
+        ),
+        linhas AS (
+            SELECT indicador, regiao, ano, valor FROM completos
+            UNION ALL
+            SELECT 'pib_per_capta', pib.regiao, pib.ano, pib.valor / NULLIF(pop.valor, 0)
+            FROM completos pib
+            JOIN completos pop ON pop.regiao IS NOT DISTINCT FROM pib.regiao AND pop.ano = pib.ano
+            WHERE pib.indicador = 'pib' AND pop.indicador = 'populacao'
+        )
+        INSERT INTO fato_indicador (indicador, nivel_territorial, localidade, ano, valor)
+        SELECT indicador,
+               CASE WHEN regiao IS NULL THEN %(pais)s ELSE %(regiao)s END,
+               COALESCE(regiao, %(brasil)s),
+               ano,
+               valor
+        FROM linhas
+        ORDER BY ano;
+    """, {
+        'siglas': dimensao[0], 'regioes': dimensao[1], 'estado': NIVEL_ESTADO, 'somados': list(INDICADORES_SOMADOS),
+        'pais': NIVEL_PAIS, 'regiao': NIVEL_REGIAO, 'brasil': SIGLA_BRASIL,
+    })
+    gravados = cursor.rowcount
+    cursor.execute("DROP TABLE _agregados_afetados")
+    print(f"Agregados regionais e nacional: {gravados} linhas gravadas")
+    return gravados
+
+
+def agregados_oficiais_populacao(path):
+    """
+    Lê as linhas agregadas oficiais (regiões e Brasil) do arquivo de população.
+
+    Parâmetros:
+        path (str): Caminho para o arquivo Excel de população.
+
+    Retorno:
+        pd.DataFrame: Colunas 'SIGLA' (de `SIGLAS_AGREGADOS`), 'ANO' e 'VALOR', somando as linhas de idade
+                      com o sexo 'Ambos', como `main.transformar_dados_populacao` faz com os estados.
+    """
+    df_pop = somar_populacao(path)
+    df_pop = df_pop[df_pop['SIGLA'].isin(SIGLAS_AGREGADOS)]
+    df_pop = df_pop.melt(id_vars=['SIGLA'], var_name='ANO', value_name='VALOR')
+    df_pop['ANO'] = df_pop['ANO'].astype(int)
+    return df_pop
+
+
+def conferir_populacao(oficiais, cursor, tolerancia=AGREGADOS_TOLERANCIA):
+    """
+    Confere os totais de população calculados com os agregados oficiais do arquivo de população.
+
+    Parâmetros:
+        oficiais (pd.DataFrame): Resultado de `agregados_oficiais_populacao`, lido fora da transação
+                                 (o arquivo não é lido na thread do gravador, que seguraria as cargas seguintes).
+        cursor (psycopg2.extensions.cursor): Cursor da transação em que os agregados foram atualizados.
+        tolerancia (float): Diferença relativa máxima aceita.
+
+    Funcionalidade:
+        - Compara apenas os anos presentes nos dois lados; anos sem total calculado (UF ausente) são ignorados.
+        - Exibe as divergências acima da tolerância, sem interromper a carga: o arquivo oficial pode ter
+          sido revisado apenas em parte.
+
+    Retorno:
+        pd.DataFrame: Divergências, com as colunas 'SIGLA', 'ANO', 'CALCULADO', 'OFICIAL' e 'DIFERENCA_RELATIVA'.
+    """
+    oficiais = oficiais.rename(columns={'VALOR': 'OFICIAL'})
+    cursor.execute("""
+        SELECT localidade, ano, valor::float8 FROM fato_indicador
+        WHERE indicador = 'populacao' AND nivel_territorial IN (%s, %s)
+    """, (NIVEL_REGIAO, NIVEL_PAIS))
+    calculados = pd.DataFrame(cursor.fetchall(), columns=['SIGLA', 'ANO', 'CALCULADO'])
+    comparacao = calculados.merge(oficiais, on=['SIGLA', 'ANO'], how='inner')
+    comparacao['DIFERENCA_RELATIVA'] = (comparacao['CALCULADO'] - comparacao['OFICIAL']).abs() / comparacao['OFICIAL']
+    divergentes = comparacao[comparacao['DIFERENCA_RELATIVA'] > tolerancia].reset_index(drop=True)
+    if divergentes.empty:
+        print(f"Agregados de população conferidos com o arquivo oficial: {len(comparacao)} totais")
+    else:
+        print(f"Aviso: {len(divergentes)} de {len(comparacao)} totais de população divergem do arquivo oficial:")
+        print(divergentes.sort_values('DIFERENCA_RELATIVA', ascending=False).head(10).to_string(index=False))
+    return divergentes
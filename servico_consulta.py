@@ -0,0 +1,421 @@
+"""
+Serviço HTTP somente leitura sobre as tabelas carregadas pelo ETL.
+
+Os painéis consultam este serviço em vez de consultar o PostgreSQL diretamente.
+As consultas usam o pool de conexões de `banco.SessaoBanco` e os resultados já
+codificados ficam em um cache LRU em memória. O cache é esvaziado quando o ETL
+confirma novos dados: cada commit que altera tabelas emite um `NOTIFY` no canal
+`banco.CANAL_ATUALIZACAO`, que uma thread do serviço escuta com `LISTEN`.
+
+Rotas:
+    GET /indicadores
+    GET /indicadores/<indicador>?siglas=SP,RJ&ano_inicio=2010&ano_fim=2020&formato=json|arrow
+    GET /estados/<sigla>?indicadores=pib,populacao&ano_inicio=2010&ano_fim=2020&formato=json|arrow
+
+As respostas são colunares: em JSON, um objeto com uma lista por coluna; em Arrow,
+um fluxo IPC (`application/vnd.apache.arrow.stream`).
+"""
+import gzip
+import hashlib
+import json
+import os
+import select
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import psycopg2
+import pyarrow as pa
+from psycopg2 import sql
+
+from banco import CANAL_ATUALIZACAO, SessaoBanco, conectar, pib_per_capta_modo
+
+SERVICO_HOST = os.getenv('SERVICO_HOST', '0.0.0.0')
+SERVICO_PORTA = int(os.getenv('SERVICO_PORTA', '8000'))
+SERVICO_CACHE_ITENS = int(os.getenv('SERVICO_CACHE_ITENS', '1024'))
+
+# Indicador exposto -> (tabela ou visão, coluna do valor, colunas além de sigla/ano/valor)
+INDICADORES = {
+    'pib': ('tabela_pib', 'valor', ()),
+    'populacao': ('tabela_pop', 'valor', ()),
+    # Com PIB_PER_CAPTA_MODO=banco, tabela_pib_per_capta não é mais carregada
+    'pib_per_capta': (('mv_indicadores_derivados', 'pib_per_capta', ()) if pib_per_capta_modo == 'banco'
+                      else ('tabela_pib_per_capta', 'valor', ())),
+    'participacao_pib': ('mv_indicadores_derivados', 'participacao_pib', ()),
+    'participacao_populacao': ('mv_indicadores_derivados', 'participacao_populacao', ()),
+    'crescimento_pib': ('mv_indicadores_derivados', 'crescimento_pib', ()),
+    'previsao_pib_per_capta': ('tabela_previsao_pib_per_capta', 'valor', ('modelo',)),
+}
+# Indicadores com o formato (sigla, ano, valor), que podem ser combinados em /estados/<sigla>
+INDICADORES_ESTADO = tuple(nome for nome, (_, _, extras) in INDICADORES.items() if not extras)
+
+TIPOS_ARROW = {
+    'indicador': pa.string(),
+    'sigla': pa.string(),
+    'ano': pa.int32(),
+    'modelo': pa.string(),
+    'valor': pa.float64(),
+}
+TIPO_JSON = 'application/json'
+TIPO_ARROW = 'application/vnd.apache.arrow.stream'
+# Respostas menores que isso não compensam a compressão
+TAMANHO_MINIMO_GZIP = 1024
+INTERVALO_RECONEXAO = 5.0
+
+
+class ErroRequisicao(Exception):
+    """Requisição inválida; `status` é o código HTTP devolvido ao cliente."""
+
+    def __init__(self, status, mensagem):
+        self.status = status
+        super().__init__(mensagem)
+
+
+class CacheLRU:
+    """
+    Cache LRU de respostas, seguro para várias threads.
+
+    Parâmetros:
+        capacidade (int): Quantidade máxima de respostas guardadas.
+
+    Funcionalidade:
+        - `geracao` é incrementada a cada `limpar()`. Uma consulta iniciada antes de uma invalidação
+          informa a geração que observou em `guardar`, e o resultado (possivelmente desatualizado)
+          é descartado em vez de voltar ao cache.
+    """
+
+    def __init__(self, capacidade=SERVICO_CACHE_ITENS):
+        self.capacidade = capacidade
+        self.geracao = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave):
+        with self._trava:
+            valor = self._itens.get(chave)
+            if valor is not None:
+                self._itens.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor, geracao):
+        with self._trava:
+            if geracao != self.geracao or self.capacidade <= 0:
+                return
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+            self.geracao += 1
+
+    def __len__(self):
+        return len(self._itens)
+
+
+class OuvinteAtualizacoes(threading.Thread):
+    """
+    Thread que escuta o canal `CANAL_ATUALIZACAO` e esvazia o cache a cada aviso do ETL.
+
+    Funcionalidade:
+        - Usa uma conexão própria, fora do pool, em modo autocommit.
+        - Se a conexão cair, esvazia o cache (avisos podem ter sido perdidos) e tenta reconectar
+          a cada `INTERVALO_RECONEXAO` segundos.
+    """
+
+    def __init__(self, cache, canal=CANAL_ATUALIZACAO):
+        super().__init__(name='ouvinte-atualizacoes', daemon=True)
+        self.cache = cache
+        self.canal = canal
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.is_set():
+            try:
+                self._escutar()
+            except psycopg2.Error as e:
+                print(f"Conexão de LISTEN perdida: {e}")
+                self.cache.limpar()
+                self._parar.wait(INTERVALO_RECONEXAO)
+
+    def _escutar(self):
+        conn = conectar()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.canal)))
+            while not self._parar.is_set():
+                if select.select([conn], [], [], 1.0)[0]:
+                    conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        self.cache.limpar()
+        finally:
+            conn.close()
+
+    def parar(self):
+        self._parar.set()
+
+
+class ServicoConsulta(ThreadingHTTPServer):
+    """
+    Servidor HTTP de consultas, com uma thread por requisição.
+
+    Parâmetros:
+        endereco (tuple): (host, porta). Porta 0 escolhe uma porta livre, útil em testes
+                          (a porta real fica em `server_address[1]`).
+        sessao (SessaoBanco): Pool de conexões usado nas consultas.
+        cache (CacheLRU): Cache de respostas.
+
+    Funcionalidade:
+        - Limita as consultas simultâneas ao tamanho do pool; as demais requisições aguardam uma conexão livre.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, endereco, sessao, cache):
+        super().__init__(endereco, ManipuladorConsulta)
+        self.sessao = sessao
+        self.cache = cache
+        self._vagas = threading.BoundedSemaphore(sessao.maximo)
+
+    def consultar(self, consulta, parametros):
+        """Executa `consulta` em uma conexão do pool e retorna (nomes das colunas, linhas)."""
+        with self._vagas, self.sessao.conexao() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(consulta, parametros)
+                    colunas = [descricao[0] for descricao in cursor.description]
+                    return colunas, cursor.fetchall()
+            finally:
+                # Encerra a transação de leitura para não deixar a conexão "idle in transaction"
+                conn.rollback()
+
+
+class ManipuladorConsulta(BaseHTTPRequestHandler):
+    """Trata as requisições GET de `ServicoConsulta`."""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ServicoConsulta/1.0'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        partes = [parte for parte in url.path.split('/') if parte]
+        parametros = parse_qs(url.query)
+        try:
+            if partes == ['indicadores']:
+                corpo = json.dumps({'indicadores': list(INDICADORES)}, separators=(',', ':')).encode()
+                self._responder(200, TIPO_JSON, corpo)
+                return
+            if len(partes) == 2 and partes[0] == 'indicadores':
+                chave = ('indicador', partes[1], _siglas(parametros), *_anos(parametros),
+                         _formato(parametros, self.headers))
+                montar = _consulta_indicador
+            elif len(partes) == 2 and partes[0] == 'estados':
+                chave = ('estado', _sigla(partes[1]), _indicadores_estado(parametros), *_anos(parametros),
+                         _formato(parametros, self.headers))
+                montar = _consulta_estado
+            else:
+                raise ErroRequisicao(404, f'Rota não encontrada: {url.path}')
+            self._responder_consulta(chave, montar)
+        except ErroRequisicao as e:
+            corpo = json.dumps({'erro': str(e)}, separators=(',', ':')).encode()
+            self._responder(e.status, TIPO_JSON, corpo)
+        except psycopg2.Error as e:
+            # Banco indisponível (por exemplo, reiniciando): o cliente recebe a resposta e pode tentar de novo
+            self.log_error('Erro no banco: %s', e)
+            corpo = json.dumps({'erro': 'Banco de dados indisponível'}, separators=(',', ':')).encode()
+            self._responder(503, TIPO_JSON, corpo)
+
+    def _responder_consulta(self, chave, montar):
+        cache = self.server.cache
+        resposta = cache.obter(chave)
+        if resposta is None:
+            geracao = cache.geracao
+            consulta, valores = montar(*chave[1:-1])
+            colunas, linhas = self.server.consultar(consulta, valores)
+            resposta = _codificar(chave, colunas, linhas)
+            cache.guardar(chave, resposta, geracao)
+
+        tipo, corpo, corpo_gzip, etag = resposta
+        if etag in self.headers.get('If-None-Match', ''):
+            self._responder(304, tipo, b'', etag=etag)
+        elif corpo_gzip is not None and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            self._responder(200, tipo, corpo_gzip, etag=etag, codificacao='gzip')
+        else:
+            self._responder(200, tipo, corpo, etag=etag)
+
+    def _responder(self, status, tipo, corpo, etag=None, codificacao=None):
+        self.send_response(status)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(corpo)))
+        self.send_header('Vary', 'Accept, Accept-Encoding')
+        if etag:
+            self.send_header('ETag', etag)
+        if codificacao:
+            self.send_header('Content-Encoding', codificacao)
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(corpo)
+
+
+def criar_servico(host=SERVICO_HOST, porta=SERVICO_PORTA, sessao=None, capacidade_cache=SERVICO_CACHE_ITENS,
+                  ouvir_atualizacoes=True):
+    """
+    Cria o servidor de consultas, sem iniciá-lo.
+
+    Parâmetros:
+        host (str): Endereço de escuta (variável `SERVICO_HOST`, padrão '0.0.0.0').
+        porta (int): Porta de escuta (variável `SERVICO_PORTA`, padrão 8000); 0 escolhe uma porta livre.
+        sessao (SessaoBanco, opcional): Pool de conexões. Se omitido, cria um com as variáveis `DB_*`,
+                                        sem executar o DDL do esquema (o serviço apenas lê as tabelas).
+        capacidade_cache (int): Quantidade máxima de respostas no cache (variável `SERVICO_CACHE_ITENS`).
+        ouvir_atualizacoes (bool): Se True, inicia a thread que esvazia o cache a cada commit do ETL.
+
+    Retorno:
+        ServicoConsulta: Servidor pronto para `serve_forever()`; o ouvinte, se houver, fica em `ouvinte`.
+    """
+    servico = ServicoConsulta((host, porta), sessao or SessaoBanco(criar_esquema=False), CacheLRU(capacidade_cache))
+    servico.ouvinte = None
+    if ouvir_atualizacoes:
+        servico.ouvinte = OuvinteAtualizacoes(servico.cache)
+        servico.ouvinte.start()
+    return servico
+
+
+def _consulta_indicador(indicador, siglas, ano_inicio, ano_fim):
+    if indicador not in INDICADORES:
+        raise ErroRequisicao(404, f'Indicador desconhecido: {indicador}')
+    tabela, coluna, extras = INDICADORES[indicador]
+    colunas = [sql.Identifier('sigla'), sql.Identifier('ano'), *map(sql.Identifier, extras),
+               sql.SQL('{}::float8 AS valor').format(sql.Identifier(coluna))]
+    filtros, valores = _filtros(siglas, ano_inicio, ano_fim)
+    consulta = sql.SQL("SELECT {} FROM {} WHERE {} ORDER BY sigla, ano").format(
+        sql.SQL(', ').join(colunas), sql.Identifier(tabela), filtros)
+    return consulta, valores
+
+
+def _consulta_estado(sigla, indicadores, ano_inicio, ano_fim):
+    # O PostgreSQL empurra os filtros externos para dentro de cada ramo do UNION ALL
+    ramos = sql.SQL(' UNION ALL ').join(
+        sql.SQL("SELECT {} AS indicador, sigla, ano, {} AS valor FROM {}").format(
+            sql.Literal(indicador), sql.Identifier(coluna), sql.Identifier(tabela))
+        for indicador, (tabela, coluna, _) in ((nome, INDICADORES[nome]) for nome in indicadores)
+    )
+    filtros, valores = _filtros((sigla,), ano_inicio, ano_fim)
+    consulta = sql.SQL("SELECT indicador, ano, valor::float8 AS valor FROM ({}) AS t WHERE {} "
+                       "ORDER BY indicador, ano").format(ramos, filtros)
+    return consulta, valores
+
+
+def _filtros(siglas, ano_inicio, ano_fim):
+    filtros, valores = [sql.SQL('TRUE')], []
+    if siglas:
+        filtros.append(sql.SQL('sigla = ANY(%s)'))
+        valores.append(list(siglas))
+    if ano_inicio is not None:
+        filtros.append(sql.SQL('ano >= %s'))
+        valores.append(ano_inicio)
+    if ano_fim is not None:
+        filtros.append(sql.SQL('ano <= %s'))
+        valores.append(ano_fim)
+    return sql.SQL(' AND ').join(filtros), valores
+
+
+def _codificar(chave, colunas, linhas):
+    """Codifica o resultado no formato pedido e retorna (tipo, corpo, corpo gzip ou None, etag)."""
+    dados = {coluna: [linha[posicao] for linha in linhas] for posicao, coluna in enumerate(colunas)}
+    if chave[-1] == 'arrow':
+        esquema = pa.schema([(coluna, TIPOS_ARROW[coluna]) for coluna in colunas],
+                            metadata={'consulta': '/'.join(map(str, chave[:2]))})
+        tabela = pa.Table.from_pydict(dados, schema=esquema)
+        saida = pa.BufferOutputStream()
+        with pa.ipc.new_stream(saida, esquema) as escritor:
+            escritor.write_table(tabela)
+        tipo, corpo = TIPO_ARROW, saida.getvalue().to_pybytes()
+    else:
+        tipo = TIPO_JSON
+        corpo = json.dumps({chave[0]: chave[1], 'linhas': len(linhas), 'colunas': dados},
+                           separators=(',', ':')).encode()
+    corpo_gzip = gzip.compress(corpo, compresslevel=5) if len(corpo) >= TAMANHO_MINIMO_GZIP else None
+    etag = f'"{hashlib.sha1(corpo).hexdigest()}"'
+    return tipo, corpo, corpo_gzip, etag
+
+
+def _parametro(parametros, nome):
+    valores = parametros.get(nome)
+    return valores[-1].strip() if valores else None
+
+
+def _sigla(valor):
+    sigla = valor.strip().upper()
+    if len(sigla) != 2 or not sigla.isalpha():
+        raise ErroRequisicao(400, f'Sigla inválida: {valor!r}')
+    return sigla
+
+
+def _siglas(parametros):
+    valor = _parametro(parametros, 'siglas')
+    if not valor:
+        return ()
+    return tuple(sorted({_sigla(sigla) for sigla in valor.split(',') if sigla.strip()}))
+
+
+def _anos(parametros):
+    anos = []
+    for nome in ('ano_inicio', 'ano_fim'):
+        valor = _parametro(parametros, nome)
+        if not valor:
+            anos.append(None)
+        elif not valor.isdigit():
+            raise ErroRequisicao(400, f'{nome} inválido: {valor!r}')
+        else:
+            anos.append(int(valor))
+    if None not in anos and anos[0] > anos[1]:
+        raise ErroRequisicao(400, 'ano_inicio maior que ano_fim')
+    return tuple(anos)
+
+
+def _indicadores_estado(parametros):
+    valor = _parametro(parametros, 'indicadores')
+    if not valor:
+        return INDICADORES_ESTADO
+    indicadores = tuple(dict.fromkeys(nome.strip() for nome in valor.split(',') if nome.strip()))
+    invalidos = [nome for nome in indicadores if nome not in INDICADORES_ESTADO]
+    if invalidos or not indicadores:
+        raise ErroRequisicao(400, f"Indicadores inválidos para /estados: {', '.join(invalidos) or valor!r} "
+                                  f"(use {', '.join(INDICADORES_ESTADO)})")
+    return indicadores
+
+
+def _formato(parametros, cabecalhos):
+    formato = _parametro(parametros, 'formato')
+    if formato is None:
+        formato = 'arrow' if TIPO_ARROW in cabecalhos.get('Accept', '') else 'json'
+    if formato not in ('json', 'arrow'):
+        raise ErroRequisicao(400, f"Formato inválido: {formato!r} (use json ou arrow)")
+    return formato
+
+
+def main():
+    servico = criar_servico()
+    host, porta = servico.server_address[:2]
+    print(f"Serviço de consulta em http://{host}:{porta}")
+    try:
+        servico.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if servico.ouvinte is not None:
+            servico.ouvinte.parar()
+        servico.server_close()
+        if servico.ouvinte is not None:
+            servico.ouvinte.join(timeout=2 * INTERVALO_RECONEXAO)
+        servico.sessao.fechar()
+
+
+if __name__ == "__main__":
+    main()
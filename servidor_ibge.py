@@ -0,0 +1,399 @@
+"""
+Gravação das respostas das fontes e servidor HTTP local que as substitui.
+
+    python servidor_ibge.py gravar    [--municipios]            # respostas reais, uma única vez
+    python servidor_ibge.py sintetico [--municipios N] [--localidades N] [--idades N]
+    python servidor_ibge.py servir    [--latencia S] [--bytes-por-segundo B] [--porta P]
+
+`gravar` guarda em `FIXTURES_DIR` as séries de PIB da API do IBGE (estados e, com
+`--municipios`, municípios) e o arquivo de população; `sintetico` grava no mesmo
+formato dados gerados em escala configurável (`benchmarks/dados_sinteticos.py`).
+
+`servir` publica esses arquivos imitando as rotas usadas pelo pipeline: a rota de
+agregados da API (qualquer subconjunto de anos e os filtros de localidade 'N3[all]',
+'N6[all]' e 'N6[N3[xx]]') e o download da população, com `ETag`, respostas 304 e
+`Range`. Latência por requisição e vazão por conexão são configuráveis, de modo que
+o pipeline inteiro pode ser executado e medido sem rede, com E/S reproduzível:
+
+    IBGE_API_URL=http://127.0.0.1:8765/api/v3/agregados \\
+    POPULACAO_URL=http://127.0.0.1:8765/populacao.xlsx \\
+    CACHE_HTTP_DIR=/tmp/cache_offline python main.py
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+FIXTURES_DIR = os.getenv('FIXTURES_DIR', 'data/fixtures')
+SERVIDOR_IBGE_HOST = os.getenv('SERVIDOR_IBGE_HOST', '127.0.0.1')
+SERVIDOR_IBGE_PORTA = int(os.getenv('SERVIDOR_IBGE_PORTA', '8765'))
+# Atraso, em segundos, antes de cada resposta
+SERVIDOR_IBGE_LATENCIA = float(os.getenv('SERVIDOR_IBGE_LATENCIA', '0'))
+# Vazão máxima por conexão, em bytes por segundo (0: sem limite)
+SERVIDOR_IBGE_BYTES_POR_SEGUNDO = int(os.getenv('SERVIDOR_IBGE_BYTES_POR_SEGUNDO', '0'))
+
+ARQUIVOS_PIB = {'N3': 'pib_N3.json', 'N6': 'pib_N6.json'}
+ARQUIVO_POPULACAO = 'populacao.xlsx'
+MANIFESTO = 'manifesto.json'
+ROTA_AGREGADOS = '/api/v3/agregados'
+ROTA_POPULACAO = '/populacao.xlsx'
+# Agregado e variável do PIB a preços correntes (ver `ibge.montar_url_pib`)
+AGREGADO_PIB, VARIAVEL_PIB = '5938', '37'
+
+TIPO_JSON = 'application/json'
+TIPO_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+BLOCO_ENVIO = 64 * 1024
+_FILTRO_LOCALIDADES = re.compile(r'^(N3|N6)\[(?:all|N3\[([\d,]+)\])\]$')
+
+
+def gravar_fixtures(diretorio=FIXTURES_DIR, anos=None, municipios=False):
+    """
+    Grava em `diretorio` as respostas reais das fontes usadas pelo pipeline.
+
+    Parâmetros:
+        diretorio (str): Diretório das fixtures (variável `FIXTURES_DIR`, padrão `data/fixtures`).
+        anos (list, opcional): Anos consultados. Se omitido, usa `ULTIMOS_ANOS`.
+        municipios (bool): Se True, grava também as séries municipais (nível N6).
+
+    Funcionalidade:
+        - Obtém os dados pelas mesmas funções do pipeline (`obter_dados_pib` e `obtem_dados_populacao`),
+          através do cache HTTP, e grava as séries de PIB em JSON e o arquivo de população como baixado.
+        - Registra no manifesto as URLs de origem, os anos e o horário da gravação.
+
+    Retorno:
+        dict: Manifesto gravado.
+    """
+    from cache_http import CacheHTTP
+    from ibge import IBGE_API_URL
+    from main import POPULACAO_URL, ULTIMOS_ANOS, obtem_dados_populacao, obter_dados_pib
+
+    anos = anos or ULTIMOS_ANOS
+    cache = CacheHTTP()
+    os.makedirs(diretorio, exist_ok=True)
+    _salvar_json(os.path.join(diretorio, ARQUIVOS_PIB['N3']), obter_dados_pib(cache, anos))
+    if municipios:
+        series = [serie for bloco in obter_dados_pib(cache, anos, nivel='N6') for serie in bloco]
+        _salvar_json(os.path.join(diretorio, ARQUIVOS_PIB['N6']), series)
+    _copiar(obtem_dados_populacao(cache), os.path.join(diretorio, ARQUIVO_POPULACAO))
+    return _salvar_manifesto(diretorio, {'sintetico': False, 'anos': list(anos),
+                                         'origem': {'ibge': IBGE_API_URL, 'populacao': POPULACAO_URL}})
+
+
+def gerar_fixtures_sinteticas(diretorio=FIXTURES_DIR, municipios=5_570, localidades=27, idades=91, anos=None,
+                              semente=0):
+    """
+    Grava em `diretorio` fixtures sintéticas no formato das respostas reais, em escala configurável.
+
+    Parâmetros:
+        diretorio (str): Diretório das fixtures.
+        municipios (int): Quantidade de séries municipais de PIB (nível N6).
+        localidades (int): Localidades do arquivo de população, distribuídas entre as UFs.
+        idades (int): Linhas de idade por localidade e sexo no arquivo de população.
+        anos (list, opcional): Anos das séries. Se omitido, usa `ULTIMOS_ANOS`.
+        semente (int): Semente dos geradores aleatórios.
+
+    Retorno:
+        dict: Manifesto gravado.
+    """
+    from benchmarks.dados_sinteticos import gerar_blocos_pib_municipios, gerar_planilha_populacao, gerar_series_pib
+    from main import SIGLAS_ESTADOS, ULTIMOS_ANOS
+
+    anos = anos or ULTIMOS_ANOS
+    os.makedirs(diretorio, exist_ok=True)
+    _salvar_json(os.path.join(diretorio, ARQUIVOS_PIB['N3']), gerar_series_pib(len(SIGLAS_ESTADOS), anos, semente))
+    blocos = gerar_blocos_pib_municipios(municipios, anos, semente)
+    _salvar_json(os.path.join(diretorio, ARQUIVOS_PIB['N6']), [serie for bloco in blocos for serie in bloco])
+    planilha = os.path.join(diretorio, ARQUIVO_POPULACAO)
+    gerar_planilha_populacao(f'{planilha}.tmp.xlsx', localidades, anos, idades, semente)
+    os.replace(f'{planilha}.tmp.xlsx', planilha)
+    return _salvar_manifesto(diretorio, {'sintetico': True, 'anos': list(anos), 'municipios': municipios,
+                                         'localidades': localidades, 'idades': idades, 'semente': semente})
+
+
+class Fixtures:
+    """
+    Conteúdo de um diretório de fixtures, carregado uma vez em memória.
+
+    Parâmetros:
+        diretorio (str): Diretório gravado por `gravar_fixtures` ou `gerar_fixtures_sinteticas`.
+
+    Funcionalidade:
+        - Indexa as séries municipais pelos dois primeiros dígitos do código (a UF), para atender
+          os filtros 'N6[N3[xx]]' sem percorrer todas as séries.
+        - O arquivo de população é servido do disco; o `ETag` é o seu SHA-256.
+
+    Exceções:
+        - `FileNotFoundError` se o diretório não tiver as séries estaduais nem o arquivo de população.
+    """
+
+    def __init__(self, diretorio=FIXTURES_DIR):
+        self.diretorio = diretorio
+        self.series = {}
+        for nivel, nome in ARQUIVOS_PIB.items():
+            caminho = os.path.join(diretorio, nome)
+            if os.path.exists(caminho):
+                with open(caminho, encoding='utf-8') as f:
+                    self.series[nivel] = json.load(f)
+        if 'N3' not in self.series:
+            raise FileNotFoundError(f"Séries de PIB não encontradas em {diretorio!r}; execute `gravar` ou `sintetico`")
+        self.por_uf = {}
+        for serie in self.series.get('N6', []):
+            self.por_uf.setdefault(serie['localidade']['id'][:2], []).append(serie)
+
+        self.caminho_populacao = os.path.join(diretorio, ARQUIVO_POPULACAO)
+        sha256 = hashlib.sha256()
+        with open(self.caminho_populacao, 'rb') as f:
+            for bloco in iter(lambda: f.read(1 << 20), b''):
+                sha256.update(bloco)
+        self.etag_populacao = f'"{sha256.hexdigest()}"'
+        self.modificado_populacao = formatdate(os.path.getmtime(self.caminho_populacao), usegmt=True)
+
+    def series_pib(self, anos, localidades):
+        """
+        Séries de PIB de `localidades` restritas a `anos`, como em `resultados[0]['series']` da API.
+
+        Exceções:
+            - `ValueError` para filtros de localidade não suportados ou nível sem fixture.
+        """
+        filtro = _FILTRO_LOCALIDADES.match(localidades)
+        if filtro is None:
+            raise ValueError(f'Filtro de localidades não suportado: {localidades!r}')
+        nivel, ufs = filtro.groups()
+        if nivel not in self.series:
+            raise ValueError(f"Sem fixture para o nível {nivel}; grave com `--municipios`")
+        if nivel == 'N3' and ufs:
+            raise ValueError(f'Filtro de localidades não suportado: {localidades!r}')
+        series = ([serie for uf in ufs.split(',') for serie in self.por_uf.get(uf, [])] if ufs
+                  else self.series[nivel])
+        return [
+            {**serie, 'serie': {ano: serie['serie'][ano] for ano in anos if ano in serie['serie']}}
+            for serie in series
+        ]
+
+
+class ServidorIBGE(ThreadingHTTPServer):
+    """
+    Servidor HTTP local que substitui a API do IBGE e o download da população.
+
+    Parâmetros:
+        endereco (tuple): (host, porta) de escuta.
+        fixtures (Fixtures): Conteúdo servido.
+        latencia (float): Segundos de espera antes de cada resposta.
+        bytes_por_segundo (int): Vazão máxima por conexão (0: sem limite).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, endereco, fixtures, latencia=SERVIDOR_IBGE_LATENCIA,
+                 bytes_por_segundo=SERVIDOR_IBGE_BYTES_POR_SEGUNDO):
+        super().__init__(endereco, ManipuladorIBGE)
+        self.fixtures = fixtures
+        self.latencia = latencia
+        self.bytes_por_segundo = bytes_por_segundo
+        self.requisicoes = 0
+        self._trava = threading.Lock()
+
+    @property
+    def variaveis_ambiente(self):
+        """Variáveis de ambiente que apontam o pipeline para este servidor."""
+        host, porta = self.server_address[:2]
+        return {
+            'IBGE_API_URL': f'http://{host}:{porta}{ROTA_AGREGADOS}',
+            'POPULACAO_URL': f'http://{host}:{porta}{ROTA_POPULACAO}',
+        }
+
+    def contar_requisicao(self):
+        with self._trava:
+            self.requisicoes += 1
+
+
+class ManipuladorIBGE(BaseHTTPRequestHandler):
+    """Trata as requisições GET de `ServidorIBGE`."""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ServidorIBGE/1.0'
+
+    def do_GET(self):
+        self.server.contar_requisicao()
+        if self.server.latencia > 0:
+            time.sleep(self.server.latencia)
+        url = urlsplit(self.path)
+        # O `requests` codifica o '|' entre os anos como '%7C'
+        caminho = unquote(url.path)
+        if caminho == ROTA_POPULACAO:
+            self._responder_populacao()
+        elif caminho.startswith(ROTA_AGREGADOS + '/'):
+            self._responder_agregados(caminho[len(ROTA_AGREGADOS) + 1:].split('/'), parse_qs(url.query))
+        else:
+            self._responder_erro(404, f'Rota não encontrada: {caminho}')
+
+    def log_message(self, formato, *args):
+        # Uma linha por requisição atrapalharia a saída do pipeline
+        pass
+
+    def _responder_agregados(self, partes, parametros):
+        # <agregado>/periodos/<anos separados por |>/variaveis/<variável>
+        if (len(partes) != 5 or partes[1] != 'periodos' or partes[3] != 'variaveis'
+                or (partes[0], partes[4]) != (AGREGADO_PIB, VARIAVEL_PIB)):
+            self._responder_erro(404, f"Agregado não disponível: {'/'.join(partes)}")
+            return
+        try:
+            series = self.server.fixtures.series_pib(partes[2].split('|'), parametros.get('localidades', [''])[-1])
+        except ValueError as e:
+            self._responder_erro(400, str(e))
+            return
+        corpo = json.dumps([{'id': VARIAVEL_PIB, 'resultados': [{'classificacoes': [], 'series': series}]}],
+                           ensure_ascii=False, separators=(',', ':')).encode()
+        etag = f'"{hashlib.sha256(corpo).hexdigest()}"'
+        if etag in self.headers.get('If-None-Match', ''):
+            self._cabecalhos(304, TIPO_JSON, 0, {'ETag': etag})
+            return
+        self._cabecalhos(200, TIPO_JSON, len(corpo), {'ETag': etag})
+        self._enviar(corpo)
+
+    def _responder_populacao(self):
+        fixtures = self.server.fixtures
+        etag = fixtures.etag_populacao
+        validadores = {'ETag': etag, 'Last-Modified': fixtures.modificado_populacao, 'Accept-Ranges': 'bytes'}
+        if etag in self.headers.get('If-None-Match', ''):
+            self._cabecalhos(304, TIPO_XLSX, 0, validadores)
+            return
+        tamanho = os.path.getsize(fixtures.caminho_populacao)
+        inicio = 0
+        faixa = re.match(r'^bytes=(\d+)-$', self.headers.get('Range', ''))
+        # Com `If-Range` divergente, o arquivo inteiro é enviado, como em um servidor real
+        if faixa and self.headers.get('If-Range', etag) == etag and int(faixa.group(1)) < tamanho:
+            inicio = int(faixa.group(1))
+            validadores['Content-Range'] = f'bytes {inicio}-{tamanho - 1}/{tamanho}'
+        self._cabecalhos(206 if inicio else 200, TIPO_XLSX, tamanho - inicio, validadores)
+        with open(fixtures.caminho_populacao, 'rb') as f:
+            f.seek(inicio)
+            self._enviar(iter(lambda: f.read(BLOCO_ENVIO), b''))
+
+    def _responder_erro(self, status, mensagem):
+        corpo = json.dumps({'erro': mensagem}, ensure_ascii=False).encode()
+        self._cabecalhos(status, TIPO_JSON, len(corpo))
+        self._enviar(corpo)
+
+    def _cabecalhos(self, status, tipo, tamanho, extras=None):
+        self.send_response(status)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(tamanho))
+        for nome, valor in (extras or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+
+    def _enviar(self, corpo):
+        # `corpo` é bytes ou um iterável de blocos; com limite de vazão, cada bloco espera a sua vez
+        blocos = (corpo[inicio:inicio + BLOCO_ENVIO] for inicio in range(0, len(corpo), BLOCO_ENVIO)) \
+            if isinstance(corpo, bytes) else corpo
+        taxa = self.server.bytes_por_segundo
+        inicio, enviados = time.monotonic(), 0
+        for bloco in blocos:
+            self.wfile.write(bloco)
+            enviados += len(bloco)
+            if taxa > 0:
+                espera = enviados / taxa - (time.monotonic() - inicio)
+                if espera > 0:
+                    time.sleep(espera)
+
+
+def criar_servidor(diretorio=FIXTURES_DIR, host=SERVIDOR_IBGE_HOST, porta=SERVIDOR_IBGE_PORTA,
+                   latencia=SERVIDOR_IBGE_LATENCIA, bytes_por_segundo=SERVIDOR_IBGE_BYTES_POR_SEGUNDO):
+    """
+    Cria o servidor local a partir de um diretório de fixtures, sem iniciá-lo.
+
+    Parâmetros:
+        diretorio (str): Diretório das fixtures.
+        host (str): Endereço de escuta (variável `SERVIDOR_IBGE_HOST`, padrão '127.0.0.1').
+        porta (int): Porta de escuta (variável `SERVIDOR_IBGE_PORTA`, padrão 8765); 0 escolhe uma porta livre.
+        latencia (float): Segundos de espera antes de cada resposta.
+        bytes_por_segundo (int): Vazão máxima por conexão (0: sem limite).
+
+    Retorno:
+        ServidorIBGE: Servidor pronto para `serve_forever()`; `variaveis_ambiente` traz as URLs a configurar.
+    """
+    return ServidorIBGE((host, porta), Fixtures(diretorio), latencia, bytes_por_segundo)
+
+
+def _salvar_json(caminho, dados):
+    temporario = f'{caminho}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(dados, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temporario, caminho)
+
+
+def _copiar(origem, destino):
+    shutil.copyfile(origem, f'{destino}.tmp')
+    os.replace(f'{destino}.tmp', destino)
+
+
+def _salvar_manifesto(diretorio, manifesto):
+    manifesto = {**manifesto, 'gravado_em': datetime.now(timezone.utc).isoformat(timespec='seconds')}
+    _salvar_json(os.path.join(diretorio, MANIFESTO), manifesto)
+    return manifesto
+
+
+def _argumentos(argv):
+    parser = argparse.ArgumentParser(prog='servidor_ibge.py', description='Fixtures e servidor local das fontes.')
+    parser.add_argument('--diretorio', default=FIXTURES_DIR, help='Diretório das fixtures (padrão: FIXTURES_DIR).')
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    gravar = subcomandos.add_parser('gravar', help='Grava as respostas reais das fontes.')
+    gravar.add_argument('--municipios', action='store_true', help='Grava também o PIB municipal (N6).')
+
+    sintetico = subcomandos.add_parser('sintetico', help='Grava fixtures sintéticas.')
+    sintetico.add_argument('--municipios', type=int, default=5_570, help='Séries municipais de PIB.')
+    sintetico.add_argument('--localidades', type=int, default=27, help='Localidades do arquivo de população.')
+    sintetico.add_argument('--idades', type=int, default=91, help='Linhas de idade por localidade e sexo.')
+    sintetico.add_argument('--semente', type=int, default=0)
+
+    servir = subcomandos.add_parser('servir', help='Serve as fixtures.')
+    servir.add_argument('--host', default=SERVIDOR_IBGE_HOST)
+    servir.add_argument('--porta', type=int, default=SERVIDOR_IBGE_PORTA)
+    servir.add_argument('--latencia', type=float, default=SERVIDOR_IBGE_LATENCIA, help='Segundos por resposta.')
+    servir.add_argument('--bytes-por-segundo', type=int, default=SERVIDOR_IBGE_BYTES_POR_SEGUNDO,
+                        help='Vazão máxima por conexão (0: sem limite).')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _argumentos(argv)
+    if args.comando == 'gravar':
+        manifesto = gravar_fixtures(args.diretorio, municipios=args.municipios)
+        print(f"Fixtures gravadas em {args.diretorio} ({manifesto['anos'][0]} a {manifesto['anos'][-1]})")
+        return 0
+    if args.comando == 'sintetico':
+        gerar_fixtures_sinteticas(args.diretorio, args.municipios, args.localidades, args.idades,
+                                  semente=args.semente)
+        print(f'Fixtures sintéticas gravadas em {args.diretorio}')
+        return 0
+
+    try:
+        servidor = criar_servidor(args.diretorio, args.host, args.porta, args.latencia, args.bytes_por_segundo)
+    except FileNotFoundError as e:
+        print(e, file=sys.stderr)
+        return 2
+    print(f"Servidor IBGE local em http://{args.host}:{servidor.server_address[1]}; configure:")
+    for nome, valor in servidor.variaveis_ambiente.items():
+        print(f'    {nome}={valor}')
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())